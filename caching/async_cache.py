@@ -0,0 +1,99 @@
+import asyncio
+from cache import FetchedMemory
+
+# Result handed to the coroutines waiting on a fetch whose leader was
+# cancelled, telling them to look the address up again.
+_RETRY = object()
+
+
+# Async front end for a Memory. Any object with an awaitable
+# lookup(address) and a get_request_count() can be used in its place.
+class AsyncMemory:
+    def __init__(self, memory):
+        self.memory = memory
+
+    def name(self):
+        return "AsyncMemory"
+
+    def get_request_count(self):
+        return self.memory.get_request_count()
+
+    async def lookup(self, address):
+        return self.memory.lookup(address)
+
+
+# Awaitable wrapper around any Cache strategy, e.g.
+#
+#   cache = AsyncCache(LRUCache(data), memory=some_async_memory)
+#   value = await cache.lookup(address)
+#
+# Hits are served straight from the strategy. On a miss the first
+# coroutine fetches from the async memory and every other coroutine
+# missing on the same address awaits that same fetch (single flight).
+# Only the first one inserts the value into the strategy. If that
+# first coroutine is cancelled, the others aren't: one of them makes
+# the fetch instead.
+class AsyncCache:
+    def __init__(self, cache, memory=None):
+        if memory is None:
+            memory = AsyncMemory(cache.memory)
+        self.cache = cache
+        self.async_memory = memory
+        self.in_flight = {}
+        self.coalesced_count = 0
+        self.fetched = FetchedMemory(cache.memory)
+        cache.memory = self.fetched
+
+    def name(self):
+        return "Async" + self.cache.name()
+
+    def get_cache_hit_count(self):
+        return self.cache.get_cache_hit_count()
+
+    def get_cache_hit_flag(self):
+        return self.cache.get_cache_hit_flag()
+
+    def get_memory_request_count(self):
+        return self.async_memory.get_request_count()
+
+    # Number of lookups that joined a fetch already in flight rather
+    # than making their own request.
+    def get_coalesced_count(self):
+        return self.coalesced_count
+
+    async def lookup(self, address):
+        while True:
+            if self.cache.contains(address):
+                return self.cache.lookup(address)
+            future = self.in_flight.get(address)
+            if future is None:
+                return await self._fetch(address)
+            self.coalesced_count += 1
+            data = await asyncio.shield(future)
+            if data is not _RETRY:
+                return data
+            # The leader was cancelled: start over, so one of the
+            # waiters takes over the fetch and the rest join it.
+            self.coalesced_count -= 1
+
+    async def _fetch(self, address):
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[address] = future
+        try:
+            data = await self.async_memory.lookup(address)
+        except asyncio.CancelledError:
+            del self.in_flight[address]
+            future.set_result(_RETRY)
+            raise
+        except Exception as error:
+            del self.in_flight[address]
+            future.set_exception(error)
+            # Mark retrieved so an unawaited failure isn't logged
+            future.exception()
+            raise
+        del self.in_flight[address]
+        self.fetched.value = data
+        self.cache.lookup(address)
+        self.fetched.value = None
+        future.set_result(data)
+        return data
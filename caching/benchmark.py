@@ -0,0 +1,652 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import functools
+import platform
+import tracemalloc
+import traces
+import utilities
+import simulate
+from cache import Cache, CyclicCache, LRUCache, MRUCache, LFUCache
+from cache import CompactLRUCache, CompactMRUCache, ARCCache
+from cache import SLRUCache, TwoQCache, ClockCache, ClockProCache
+from cache import OPTCache
+from tinylfu import TinyLFUCache
+from metrics import InstrumentedCache
+from hierarchy import HierarchyCache
+from disk_cache import DiskLRUCache, snapshot, restore
+from prefetch import PrefetchingCache
+from memoize import cached
+
+STRATEGIES = {
+    "None": Cache,
+    "Cyclic": CyclicCache,
+    "LRU": LRUCache,
+    "MRU": MRUCache,
+    "LFU": LFUCache,
+    "ARC": ARCCache,
+    "SLRU": SLRUCache,
+    "2Q": TwoQCache,
+    "CLOCK": ClockCache,
+    "CLOCK-Pro": ClockProCache,
+    "TinyLFU": TinyLFUCache,
+    "OPT": OPTCache,
+}
+
+
+# A fresh cache of the given strategy for replaying trace. OPT is the
+# only one that has to see the trace up front.
+def build(cls, data, size, trace):
+    if cls is OPTCache:
+        return cls(data, size, trace)
+    return cls(data, size)
+
+
+# Average time per lookup, in nanoseconds, for replaying trace
+# through an already constructed cache.
+def time_lookups(cache, trace):
+    lookup = cache.lookup
+    start = time.perf_counter_ns()
+    for address in trace:
+        lookup(address)
+    return (time.perf_counter_ns() - start) / max(len(trace), 1)
+
+
+# Hit and miss latency of CyclicCache as the number of slots grows.
+# Hits replay addresses that are all resident; misses replay
+# addresses above the largest size, so every lookup evicts a slot.
+def cyclic_scaling(sizes, lookups=100000):
+    top = max(sizes)
+    data = utilities.sample_data(size=top + lookups)
+    results = []
+    for size in sizes:
+        cache = CyclicCache(data, size)
+        resident = list(range(size))
+        for address in resident:
+            cache.lookup(address)
+        hits = [resident[i % size] for i in range(lookups)]
+        misses = list(range(top, top + lookups))
+        results.append({"size": size,
+                        "hit_ns": time_lookups(cache, hits),
+                        "miss_ns": time_lookups(cache, misses)})
+    return results
+
+
+# Bytes allocated per resident entry once a cache of the given size is
+# full, then again after a further size misses have been evicted. The
+# backing data and addresses are built first so that only the cache's
+# own structures are counted.
+def bytes_per_entry(cls, size):
+    data = utilities.sample_data(size=2 * size)
+    addresses = list(range(2 * size))
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cache = cls(data, size)
+    for address in addresses[:size]:
+        cache.lookup(address)
+    full = tracemalloc.get_traced_memory()[0]
+    for address in addresses[size:]:
+        cache.lookup(address)
+    churned = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {"strategy": cache.name(),
+            "size": size,
+            "full_bytes": (full - before) / size,
+            "churned_bytes": (churned - before) / size}
+
+
+def memory_comparison(size=100000):
+    return [bytes_per_entry(cls, size)
+            for cls in (LRUCache, CompactLRUCache,
+                        MRUCache, CompactMRUCache)]
+
+
+def percentile(ordered, fraction):
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+# Replay trace through a fresh instance of cls. Latencies come from a
+# pass that times every lookup individually; throughput comes from a
+# second, untimed-per-lookup pass on another fresh instance so that the
+# timer calls don't count against it.
+def replay(cls, data, size, trace):
+    cache = build(cls, data, size, trace)
+    lookup = cache.lookup
+    clock = time.perf_counter_ns
+    latencies = []
+    record = latencies.append
+    for address in trace:
+        start = clock()
+        lookup(address)
+        record(clock() - start)
+    latencies.sort()
+
+    throughput = build(cls, data, size, trace)
+    elapsed = time_lookups(throughput, trace) * len(trace)
+    return {"strategy": cache.name(),
+            "size": size,
+            "accesses": len(trace),
+            "hits": cache.get_cache_hit_count(),
+            "hit_ratio": cache.get_cache_hit_count() / max(len(trace), 1),
+            "memory_requests": cache.get_memory_request_count(),
+            "ops_per_sec": len(trace) / (elapsed / 1e9) if elapsed else 0.0,
+            "p50_ns": percentile(latencies, 0.50),
+            "p99_ns": percentile(latencies, 0.99)}
+
+
+# Hit ratio of Belady's OPT, the best any strategy could do.
+def opt_hit_ratio(data, size, trace):
+    cache = OPTCache(data, size, trace)
+    cache.lookup_many(trace)
+    return cache.get_cache_hit_count() / max(len(trace), 1)
+
+
+# Replay every trace kind through every strategy at every size. Each
+# row also carries OPT's hit ratio on the same trace and size, and the
+# gap between the two.
+def run_suite(kinds=None, strategies=None, sizes=(10, 100, 1000),
+              length=100000, universe=10000, seed=0):
+    kinds = kinds or sorted(traces.GENERATORS)
+    strategies = strategies or list(STRATEGIES)
+    data = utilities.sample_data(size=universe)
+    results = []
+    for kind in kinds:
+        trace = traces.GENERATORS[kind](length, universe, seed=seed)
+        for size in sizes:
+            optimum = opt_hit_ratio(data, size, trace)
+            for name in strategies:
+                row = replay(STRATEGIES[name], data, size, trace)
+                row["trace"] = kind
+                row["opt_hit_ratio"] = optimum
+                row["opt_gap"] = optimum - row["hit_ratio"]
+                results.append(row)
+    return {"python": platform.python_version(),
+            "length": length,
+            "universe": universe,
+            "seed": seed,
+            "results": results}
+
+
+# Pair up rows from two suite reports by (trace, strategy, size) and
+# give the change in hit ratio and throughput for each.
+def compare(old, new):
+    def key(row):
+        return (row["trace"], row["strategy"], row["size"])
+
+    previous = {key(row): row for row in old["results"]}
+    changes = []
+    for row in new["results"]:
+        before = previous.get(key(row))
+        if before is None:
+            continue
+        changes.append({"trace": row["trace"],
+                        "strategy": row["strategy"],
+                        "size": row["size"],
+                        "hit_ratio_delta":
+                            row["hit_ratio"] - before["hit_ratio"],
+                        "ops_per_sec_ratio":
+                            row["ops_per_sec"] / before["ops_per_sec"]
+                            if before["ops_per_sec"] else None})
+    return changes
+
+
+# Cost of a hit: LRU splices the entry to the front of its list, while
+# CLOCK and CLOCK-Pro only set a reference bit. Every address in the
+# replayed trace is resident.
+def hit_cost(sizes=(100, 10000), lookups=100000):
+    results = []
+    for size in sizes:
+        data = utilities.sample_data(size=size)
+        hits = [i % size for i in range(lookups)]
+        for cls in (LRUCache, ClockCache, ClockProCache):
+            cache = cls(data, size)
+            for address in range(size):
+                cache.lookup(address)
+            results.append({"strategy": cache.name(),
+                            "size": size,
+                            "hit_ns": time_lookups(cache, hits),
+                            "batch_hit_ns":
+                                time_lookups_many(cache, hits)})
+    return results
+
+
+# As time_lookups, but through lookup_many in one batch.
+def time_lookups_many(cache, trace):
+    start = time.perf_counter_ns()
+    cache.lookup_many(trace)
+    return (time.perf_counter_ns() - start) / max(len(trace), 1)
+
+
+# Hit ratios of TinyLFU admission (over LRU and over LFU) against
+# plain LRU and LFU on Zipf traces of varying skew.
+def admission_comparison(skews=(0.6, 0.8, 1.0, 1.2), sizes=(50, 500),
+                         length=100000, universe=10000, seed=0):
+    data = utilities.sample_data(size=universe)
+    makers = [lambda size: LRUCache(data, size),
+              lambda size: LFUCache(data, size),
+              lambda size: TinyLFUCache(data, size),
+              lambda size: TinyLFUCache(data, size, strategy=LFUCache)]
+    results = []
+    for skew in skews:
+        trace = traces.zipf(length, universe, skew=skew, seed=seed)
+        for size in sizes:
+            for make in makers:
+                cache = make(size)
+                for address in trace:
+                    cache.lookup(address)
+                results.append({"trace": "zipf",
+                                "skew": skew,
+                                "strategy": cache.name(),
+                                "size": size,
+                                "hit_ratio":
+                                    cache.get_cache_hit_count() / length})
+    return results
+
+
+# Time for the trace simulators against the object-based caches over
+# the same zipf trace, per access, checking the hit counts agree. The
+# last row per strategy times the LRU hit counts for every size at
+# once against one object-based run per size.
+def simulator_speedup(sizes=(100, 10000), length=1000000, universe=100000,
+                      seed=0):
+    data = utilities.sample_data(size=universe)
+    trace = traces.zipf(length, universe, seed=seed)
+    array = simulate.np.asarray(trace)
+    results = []
+    batch_total = 0.0
+    for name, cls in (("Cyclic", CyclicCache), ("LRU", LRUCache)):
+        for size in sizes:
+            batch = cls(data, size)
+            batch_ns = time_lookups_many(batch, trace)
+            start = time.perf_counter_ns()
+            hits = simulate.SIMULATORS[name](array, size)
+            simulate_ns = (time.perf_counter_ns() - start) / length
+            if simulate.counters(hits)["cache_hits"] != \
+                    batch.get_cache_hit_count():
+                raise AssertionError(f"{name} {size}: hit counts differ")
+            if name == "LRU":
+                batch_total += batch_ns
+            results.append({"strategy": name,
+                            "size": size,
+                            "lookup_ns": time_lookups(cls(data, size),
+                                                      trace),
+                            "batch_ns": batch_ns,
+                            "simulate_ns": simulate_ns})
+    start = time.perf_counter_ns()
+    simulate.lru_hit_counts(array, sizes)
+    results.append({"strategy": "LRU curve",
+                    "size": len(sizes),
+                    "lookup_ns": None,
+                    "batch_ns": batch_total,
+                    "simulate_ns":
+                        (time.perf_counter_ns() - start) / length})
+    return results
+
+
+# Cost of InstrumentedCache: time per access for each strategy on a
+# zipf trace, bare and instrumented, through lookup (timing every
+# lookup, and one in time_every) and through lookup_many.
+def instrumentation_overhead(strategies=("LRU", "LFU", "ARC", "CLOCK"),
+                             size=1000, length=100000, universe=10000,
+                             time_every=16, seed=0):
+    data = utilities.sample_data(size=universe)
+    trace = traces.zipf(length, universe, seed=seed)
+    results = []
+    for name in strategies:
+        cls = STRATEGIES[name]
+        results.append({
+            "strategy": name,
+            "size": size,
+            "lookup_ns": time_lookups(cls(data, size), trace),
+            "instrumented_ns": time_lookups(
+                InstrumentedCache(cls(data, size)), trace),
+            "sampled_ns": time_lookups(
+                InstrumentedCache(cls(data, size), time_every=time_every),
+                trace),
+            "batch_ns": time_lookups_many(cls(data, size), trace),
+            "instrumented_batch_ns": time_lookups_many(
+                InstrumentedCache(cls(data, size)), trace)})
+    return results
+
+
+# Hit ratio of each level, and the mean access cost, as a fixed total
+# capacity is split between an LRU L1 and an LFU L2 in each hierarchy
+# mode. costs are those of reaching L1, L2 and memory.
+def hierarchy_split(total=1000, fractions=(0.02, 0.05, 0.1, 0.25, 0.5),
+                    costs=(1, 10, 100), length=100000, universe=10000,
+                    seed=0):
+    data = utilities.sample_data(size=universe)
+    trace = traces.zipf(length, universe, seed=seed)
+    results = []
+    for mode in ("inclusive", "exclusive"):
+        for fraction in fractions:
+            l1_size = max(int(total * fraction), 1)
+            cache = HierarchyCache(data, l1_size, total - l1_size,
+                                   mode=mode)
+            cache.lookup_many(trace)
+            l1, l2 = cache.level_stats()
+            results.append({"mode": mode,
+                            "l1_size": l1_size,
+                            "l2_size": total - l1_size,
+                            "l1_hit_ratio": l1["hits"] / length,
+                            "l2_hit_ratio": l2["hits"] / length,
+                            "hit_ratio":
+                                cache.get_cache_hit_count() / length,
+                            "access_time":
+                                cache.average_access_time(*costs)})
+    return results
+
+
+# Time to get a warm cache after a restart, and the memory requests made
+# replaying the rest of the trace: starting empty, restoring a snapshot
+# of the cache taken before the restart, or reopening a DiskLRUCache.
+def warm_restart(size=10000, length=100000, universe=100000, seed=0):
+    data = utilities.sample_data(size=universe)
+    trace = traces.zipf(2 * length, universe, seed=seed)
+    before, after = trace[:length], trace[length:]
+    directory = tempfile.mkdtemp()
+    results = []
+
+    def measure(start, open_cache):
+        started = time.perf_counter()
+        cache = open_cache()
+        startup = time.perf_counter() - started
+        requests = cache.get_memory_request_count()
+        started = time.perf_counter()
+        for address in after:
+            cache.lookup(address)
+        results.append({"start": start,
+                        "startup_ms": startup * 1e3,
+                        "replay_ms": (time.perf_counter() - started) * 1e3,
+                        "memory_requests":
+                            cache.get_memory_request_count() - requests})
+        return cache
+
+    measure("cold LRU", lambda: LRUCache(data, size))
+    for cls in (LRUCache, LFUCache):
+        path = os.path.join(directory, cls.__name__)
+        warm = cls(data, size)
+        warm.lookup_many(before)
+        snapshot(warm, path)
+        measure("restored " + warm.name(), lambda: restore(path, data))
+        os.remove(path)
+    path = os.path.join(directory, "disk")
+    disk = DiskLRUCache(data, size, path)
+    for address in before:
+        disk.lookup(address)
+    disk.close()
+    disk = measure("reopened DiskLRU",
+                   lambda: DiskLRUCache(data, size, path))
+    disk.close()
+    disk.unlink()
+    os.rmdir(directory)
+    return results
+
+
+# Demand misses (lookups left waiting on memory) and round trips with
+# and without a prefetcher in front of each strategy. The plain cache
+# is given the prefetch buffer's entries as well, so both hold the
+# same number.
+def prefetch_comparison(kinds=("streams", "scan", "zipf"),
+                        strategies=("LRU", "LFU", "ARC"), size=1000,
+                        length=100000, universe=100000, seed=0):
+    data = utilities.sample_data(size=universe)
+    results = []
+    for kind in kinds:
+        trace = traces.GENERATORS[kind](length, universe, seed=seed)
+        for strategy in strategies:
+            cls = STRATEGIES[strategy]
+            cache = PrefetchingCache(data, size, cls)
+            plain = cls(data, cache.size)
+            plain_ns = time_lookups(plain, trace)
+            prefetch_ns = time_lookups(cache, trace)
+            results.append({
+                "trace": kind,
+                "strategy": strategy,
+                "size": cache.size,
+                "misses": length - plain.get_cache_hit_count(),
+                "prefetch_misses": cache.get_demand_miss_count(),
+                "round_trips": plain.get_memory_round_trip_count(),
+                "prefetch_round_trips":
+                    cache.get_memory_round_trip_count(),
+                "prefetched": cache.get_prefetch_count(),
+                "wasted": cache.get_wasted_prefetch_count(),
+                "accuracy": cache.get_prefetch_accuracy(),
+                "coverage": cache.get_prefetch_coverage(),
+                "lookup_ns": plain_ns,
+                "prefetch_lookup_ns": prefetch_ns})
+    return results
+
+
+# Time per call and hit ratio of functions memoized with @cached, for
+# several strategies, against functools.lru_cache of the same size,
+# called with a zipf trace of arguments. The function itself costs
+# next to nothing, so the times are the memoization overhead.
+def memoize_comparison(strategies=("LRU", "LFU", "ARC", "TinyLFU"),
+                       sizes=(100, 1000), length=100000, universe=10000,
+                       seed=0):
+    trace = traces.zipf(length, universe, seed=seed)
+
+    def square(x):
+        return x * x
+
+    results = []
+    for size in sizes:
+        wrappers = [("functools", functools.lru_cache(size)(square))]
+        wrappers += [(strategy, cached(square, strategy=strategy,
+                                       size=size))
+                     for strategy in strategies]
+        for name, wrapper in wrappers:
+            start = time.perf_counter_ns()
+            for x in trace:
+                wrapper(x)
+            elapsed = time.perf_counter_ns() - start
+            info = wrapper.cache_info()
+            results.append({"strategy": name,
+                            "size": size,
+                            "call_ns": elapsed / length,
+                            "hit_ratio": info.hits / length})
+    return results
+
+
+# Seconds to get size values of data each way: as the list of strings
+# from sample_data (the first call in a process, then again from its
+# memo), as a buffer from generate in one process and over a pool of
+# processes, and as a dataset file written once and then mapped back
+# in. Every method must give the same bytes.
+def data_generation(size=1000000, processes=None):
+    results = []
+    expected = None
+
+    def measure(method, make, encode=bytes):
+        nonlocal expected
+        start = time.perf_counter()
+        made = make()
+        results.append({"method": method,
+                        "seconds": time.perf_counter() - start})
+        if made is None:
+            return
+        made = encode(made)
+        if expected is None:
+            expected = made
+        elif made != expected:
+            raise AssertionError(f"{method}: data differs")
+
+    def joined(values):
+        return "".join(values).encode()
+
+    measure("sample_data", lambda: utilities.sample_data(size), joined)
+    measure("sample_data again", lambda: utilities.sample_data(size),
+            joined)
+    measure("generate", lambda: utilities.generate(size))
+    measure("generate pool",
+            lambda: utilities.generate(size, processes=processes))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "data")
+        measure("write dataset",
+                lambda: utilities.write_dataset(path, size, processes))
+        measure("open dataset", lambda: utilities.open_dataset(path),
+                lambda data: bytes(data.buffer))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('report', nargs='?', default='suite',
+                        choices=['suite', 'cyclic', 'memory', 'admission',
+                                 'hitcost', 'simulate', 'metrics',
+                                 'hierarchy', 'restart', 'prefetch',
+                                 'memoize', 'datagen'],
+                        help='which benchmark to run')
+    parser.add_argument('-n', '--lookups',
+                        help='lookups per measurement',
+                        type=int,
+                        default=100000)
+    parser.add_argument('-u', '--universe',
+                        help='number of distinct addresses in traces',
+                        type=int,
+                        default=10000)
+    parser.add_argument('--sizes',
+                        help='comma separated cache sizes',
+                        default='10,100,1000')
+    parser.add_argument('-t', '--traces',
+                        help='comma separated trace kinds',
+                        default=','.join(sorted(traces.GENERATORS)))
+    parser.add_argument('-s', '--strategies',
+                        help='comma separated strategy names',
+                        default=','.join(STRATEGIES))
+    parser.add_argument('-o', '--output',
+                        help='write the JSON report to this file')
+    parser.add_argument('-c', '--compare',
+                        help='earlier JSON report to compare against')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.report == 'cyclic':
+        print("{:>8} {:>10} {:>10}".format("size", "hit ns", "miss ns"))
+        for row in cyclic_scaling([5, 100, 1000, 10000, 100000],
+                                  lookups=args.lookups):
+            print("{:>8} {:>10.1f} {:>10.1f}".format(row["size"],
+                                                     row["hit_ns"],
+                                                     row["miss_ns"]))
+    elif args.report == 'memory':
+        print("{:>12} {:>12} {:>14}".format("strategy", "bytes/entry",
+                                            "after churn"))
+        for row in memory_comparison():
+            print("{:>12} {:>12.1f} {:>14.1f}".format(row["strategy"],
+                                                      row["full_bytes"],
+                                                      row["churned_bytes"]))
+    elif args.report == 'hitcost':
+        print("{:>10} {:>8} {:>10} {:>14}".format("strategy", "size",
+                                                  "hit ns", "batch hit ns"))
+        for row in hit_cost(lookups=args.lookups):
+            print("{:>10} {:>8} {:>10.1f} {:>14.1f}".format(
+                row["strategy"], row["size"], row["hit_ns"],
+                row["batch_hit_ns"]))
+    elif args.report == 'simulate':
+        if simulate.np is None:
+            print("The simulate report needs NumPy")
+            sys.exit(1)
+        sizes = [int(x) for x in args.sizes.split(',')]
+        print("{:>10} {:>8} {:>10} {:>10} {:>12} {:>8}".format(
+            "strategy", "size", "lookup ns", "batch ns", "simulate ns",
+            "speedup"))
+        for row in simulator_speedup(sizes, length=args.lookups,
+                                     universe=args.universe,
+                                     seed=args.seed):
+            lookup_ns = row["lookup_ns"] or row["batch_ns"]
+            print("{:>10} {:>8} {:>10} {:>10.1f} {:>12.1f} {:>8.2f}".format(
+                row["strategy"], row["size"],
+                "-" if row["lookup_ns"] is None
+                else f"{row['lookup_ns']:.1f}",
+                row["batch_ns"], row["simulate_ns"],
+                lookup_ns / row["simulate_ns"]))
+    elif args.report == 'metrics':
+        size = int(args.sizes.split(',')[-1])
+        print("{:>10} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+            "strategy", "lookup ns", "instr ns", "sampled ns", "batch ns",
+            "instr ns"))
+        for row in instrumentation_overhead(size=size,
+                                            length=args.lookups,
+                                            universe=args.universe,
+                                            seed=args.seed):
+            print("{:>10} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f} "
+                  "{:>10.1f}".format(
+                      row["strategy"], row["lookup_ns"],
+                      row["instrumented_ns"], row["sampled_ns"],
+                      row["batch_ns"], row["instrumented_batch_ns"]))
+    elif args.report == 'hierarchy':
+        total = int(args.sizes.split(',')[-1])
+        print("{:>10} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8}".format(
+            "mode", "L1", "L2", "L1 hits", "L2 hits", "hits", "cost"))
+        for row in hierarchy_split(total, length=args.lookups,
+                                   universe=args.universe, seed=args.seed):
+            print("{:>10} {:>8} {:>8} {:>8.4f} {:>8.4f} {:>8.4f} "
+                  "{:>8.2f}".format(row["mode"], row["l1_size"],
+                                    row["l2_size"], row["l1_hit_ratio"],
+                                    row["l2_hit_ratio"], row["hit_ratio"],
+                                    row["access_time"]))
+    elif args.report == 'restart':
+        size = int(args.sizes.split(',')[-1])
+        print("{:>18} {:>10} {:>10} {:>10}".format(
+            "start", "startup ms", "replay ms", "requests"))
+        for row in warm_restart(size, length=args.lookups,
+                                universe=args.universe, seed=args.seed):
+            print("{:>18} {:>10.2f} {:>10.1f} {:>10}".format(
+                row["start"], row["startup_ms"], row["replay_ms"],
+                row["memory_requests"]))
+    elif args.report == 'prefetch':
+        size = int(args.sizes.split(',')[-1])
+        print("{:>8} {:>6} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} "
+              "{:>8}".format("trace", "cache", "misses", "with pf",
+                             "trips", "with pf", "accuracy", "coverage",
+                             "wasted"))
+        for row in prefetch_comparison(size=size, length=args.lookups,
+                                       universe=args.universe,
+                                       seed=args.seed):
+            print("{:>8} {:>6} {:>8} {:>8} {:>8} {:>8} {:>8.3f} {:>8.3f} "
+                  "{:>8}".format(row["trace"], row["strategy"],
+                                 row["misses"], row["prefetch_misses"],
+                                 row["round_trips"],
+                                 row["prefetch_round_trips"],
+                                 row["accuracy"], row["coverage"],
+                                 row["wasted"]))
+    elif args.report == 'memoize':
+        sizes = [int(x) for x in args.sizes.split(',')]
+        print("{:>10} {:>8} {:>10} {:>10}".format("strategy", "size",
+                                                  "call ns", "hits"))
+        for row in memoize_comparison(sizes=sizes, length=args.lookups,
+                                      universe=args.universe,
+                                      seed=args.seed):
+            print("{:>10} {:>8} {:>10.1f} {:>10.4f}".format(
+                row["strategy"], row["size"], row["call_ns"],
+                row["hit_ratio"]))
+    elif args.report == 'datagen':
+        size = int(args.sizes.split(',')[-1])
+        for row in data_generation(size):
+            print("{:>18} {:>10.4f}".format(row["method"], row["seconds"]))
+    elif args.report == 'admission':
+        json.dump(admission_comparison(length=args.lookups,
+                                       universe=args.universe,
+                                       seed=args.seed),
+                  sys.stdout, indent=2)
+        print()
+    else:
+        report = run_suite(kinds=args.traces.split(','),
+                           strategies=args.strategies.split(','),
+                           sizes=[int(x) for x in args.sizes.split(',')],
+                           length=args.lookups,
+                           universe=args.universe,
+                           seed=args.seed)
+        if args.compare:
+            with open(args.compare) as previous:
+                report["comparison"] = compare(json.load(previous), report)
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                json.dump(report, output_file, indent=2)
+        else:
+            json.dump(report, sys.stdout, indent=2)
+            print()
@@ -1,16 +1,119 @@
+import heapq
+from array import array
 from collections import OrderedDict, defaultdict
 from memory import Memory
 import utilities
 
+# Hit/miss flags from lookup_many are built as one byte per access and
+# packed into a bitmap at the end: bit i (byte i // 8, bit i % 8) is
+# set when access i hit the cache.
+_BIT_CHARS = bytes.maketrans(b"\x00\x01", b"01")
+
+# Placeholder value for entries whose miss is waiting on the bulk
+# memory fetch at the end of lookup_many.
+_PENDING = object()
+
+
+# Stands in for a strategy's Memory while a wrapper inserts a value it
+# has already fetched, so the strategy's own miss path runs unchanged
+# without a second request. Writes go through to memory, if given.
+class FetchedMemory:
+    def __init__(self, memory=None):
+        self.value = None
+        self.memory = memory
+
+    def lookup(self, address):
+        return self.value
+
+    def store(self, address, value):
+        self.memory.store(address, value)
+
+    def store_many(self, addresses, values):
+        self.memory.store_many(addresses, values)
+
+
+# Presents a cache as the Memory behind another cache, so strategies
+# can be stacked:
+#
+#   l1 = LRUCache(data, 4)
+#   l1.memory = CacheMemory(LFUCache(data, 64))
+#
+# Misses in the upper cache become lookups in the lower one, and
+# writes become stores to it. The counts are of requests made to the
+# lower cache, whether or not it hits.
+class CacheMemory(Memory):
+    def __init__(self, cache):
+        super().__init__(None)
+        self.cache = cache
+
+    def name(self):
+        return self.cache.name()
+
+    def lookup(self, address):
+        self.request_count += 1
+        self.round_trip_count += 1
+        return self.cache.lookup(address)
+
+    def lookup_many(self, addresses):
+        addresses = list(addresses)
+        if not addresses:
+            return []
+        self.request_count += len(addresses)
+        self.round_trip_count += 1
+        values, _ = self.cache.lookup_many(addresses)
+        return values
+
+    def store(self, address, value):
+        self.write_count += 1
+        self.write_round_trip_count += 1
+        self.cache.store(address, value)
+
+    def store_many(self, addresses, values):
+        addresses = list(addresses)
+        if not addresses:
+            return
+        self.write_count += len(addresses)
+        self.write_round_trip_count += 1
+        for address, value in zip(addresses, values):
+            self.cache.store(address, value)
+
+
+# The strategy objects making up cache, each of which reports the
+# entries it drops through its own _write_back: the cache itself and
+# whatever it wraps as main (TinyLFUCache, ExpiringCache, ...), or the
+# parts of every shard of a ShardedCache.
+def parts(cache):
+    if hasattr(cache, "shards"):
+        return [part for shard in cache.shards for part in parts(shard)]
+    found = [cache]
+    if hasattr(cache, "main"):
+        found.extend(parts(cache.main))
+    return found
+
+
+def pack_flags(flags):
+    if not flags:
+        return bytearray()
+    bits = int(flags[::-1].translate(_BIT_CHARS), 2)
+    return bytearray(bits.to_bytes((len(flags) + 7) // 8, "little"))
+
+
+def unpack_flags(bitmap, count):
+    return [bool(bitmap[i >> 3] >> (i & 7) & 1) for i in range(count)]
+
 
 class Cache:
     def name(self):
         return "Cache"
 
-    def __init__(self, data, size=5):
+    def __init__(self, data, size=5, write_back=False):
         self.memory = Memory(data)
         self.cache_hit_count = 0
         self.cache_hit_flag = False
+        self.write_back = write_back
+        # address -> value for entries stored in write back mode and
+        # not yet written to memory
+        self.dirty = {}
 
     def get_cache_hit_count(self):
         return self.cache_hit_count
@@ -18,38 +121,270 @@ class Cache:
     def get_memory_request_count(self):
         return self.memory.get_request_count()
 
+    def get_memory_round_trip_count(self):
+        return self.memory.get_round_trip_count()
+
+    def get_memory_write_count(self):
+        return self.memory.get_write_count()
+
+    def get_memory_write_round_trip_count(self):
+        return self.memory.get_write_round_trip_count()
+
     def get_cache_hit_flag(self):
         return self.cache_hit_flag
 
+    # True if address is resident, without counting a hit or changing
+    # any recency or frequency information.
+    def contains(self, address):
+        return False
+
+    # Number of entries currently held.
+    def get_occupancy(self):
+        return 0
+
+    # The address the next miss would evict, or None if there is still
+    # room (or, as here, nothing is cached at all).
+    def victim(self):
+        return None
+
+    # Drop address from the cache if present. Returns True if it was.
+    def remove(self, address):
+        return False
+
+    # Drop the entry the strategy ranks lowest, even if the cache is
+    # not full, and return its address (None if the cache is empty).
+    def evict(self):
+        return None
+
     def lookup(self, address):
         return self.memory.lookup(address)
 
+    # Write value to address. In write through mode (the default) the
+    # write goes straight to memory, and updates the cached value if
+    # address is resident but doesn't allocate an entry for it. In
+    # write back mode the value is cached, allocating an entry if need
+    # be, and only marked dirty; it reaches memory when the entry is
+    # evicted or removed, or on flush(). A store doesn't count as a
+    # hit or change recency or frequency information.
+    def store(self, address, value):
+        if self.contains(address):
+            self._set(address, value)
+        elif self.write_back:
+            self._insert(address, value)
+        if self.write_back and self.contains(address):
+            self.dirty[address] = value
+        else:
+            self.memory.store(address, value)
+
+    # Write every dirty entry to memory in one bulk store. The entries
+    # stay cached, now clean.
+    def flush(self):
+        if not self.dirty:
+            return
+        addresses = list(self.dirty)
+        values = list(self.dirty.values())
+        self.dirty.clear()
+        self.memory.store_many(addresses, values)
+
+    def get_dirty_count(self):
+        return len(self.dirty)
+
+    # Called by strategies with each address they drop, to write the
+    # entry back to memory first if it is dirty.
+    def _write_back(self, address):
+        if address in self.dirty:
+            self.memory.store(address, self.dirty.pop(address))
+
+    # Replace the value held for a resident address.
+    def _set(self, address, value):
+        raise NotImplementedError
+
+    # Allocate an entry for value through the strategy's own miss
+    # path, without a memory request or a change to the hit flag.
+    def _insert(self, address, value):
+        memory = self.memory
+        flag = self.cache_hit_flag
+        self.memory = FetchedMemory(memory)
+        self.memory.value = value
+        try:
+            self.lookup(address)
+        finally:
+            self.memory = memory
+            self.cache_hit_flag = flag
+
+    # Look up every address in turn. Returns the list of values and a
+    # packed hit/miss bitmap (see pack_flags). Counters and the hit
+    # flag end up exactly as if lookup had been called in a loop.
+    #
+    # Misses within a batch are not fetched one by one. The strategy
+    # runs over the whole batch with _PENDING stored for each miss,
+    # then all the missed addresses go to memory in a single
+    # lookup_many call and the placeholders are filled in.
+    def lookup_many(self, addresses):
+        addresses = list(addresses)
+        if not addresses:
+            return [], bytearray()
+        values = self.memory.lookup_many(addresses)
+        return values, pack_flags(bytearray(len(values)))
+
+    # Fallback batch for strategies without their own inner loop: one
+    # lookup per address, so each miss is fetched on its own.
+    def _lookup_each(self, addresses):
+        values = []
+        flags = bytearray()
+        for address in addresses:
+            values.append(self.lookup(address))
+            flags.append(self.cache_hit_flag)
+        return values, pack_flags(flags)
+
+    # Finish a batch: fetch the missed addresses, fill in their
+    # placeholders and only then count the hits. If the fetch fails,
+    # every entry still holding _PENDING is dropped and the counters and
+    # hit flag are left as they were before the batch, so the error
+    # doesn't leave placeholders behind to be returned as hits later.
+    def _resolve(self, addresses, values, flags, missed, hits):
+        if missed:
+            try:
+                fetched = self.memory.lookup_many(missed)
+            except BaseException:
+                # Each missed address was given a _PENDING entry, and
+                # nothing else is written during a batch, so any of
+                # them still resident is still a placeholder.
+                for address in missed:
+                    self.remove(address)
+                raise
+        self.cache_hit_count += hits
+        if flags:
+            self.cache_hit_flag = flags[-1] == 1
+        if not missed:
+            return
+        fetched = dict(zip(missed, fetched))
+        for i, value in enumerate(values):
+            if value is _PENDING:
+                values[i] = fetched[addresses[i]]
+        for address, data in fetched.items():
+            self._fill(address, data)
+
+    # Replace the _PENDING value held for a resident address.
+    def _fill(self, address, data):
+        pass
+
 
 class CyclicCache(Cache):
     def name(self):
         return "Cyclic"
 
-    def __init__(self, data, size=5):
-        super().__init__(data)
+    def __init__(self, data, size=5, write_back=False):
+        super().__init__(data, write_back=write_back)
         self.size = size
         self.cache = [None] * size
         self.index = 0
+        # address -> slot, kept in step with self.cache so hits don't
+        # have to walk every slot
+        self.slot_index = {}
+
+    def contains(self, address):
+        return address in self.slot_index
+
+    def get_occupancy(self):
+        return len(self.slot_index)
+
+    def victim(self):
+        if self.size <= 0 or self.cache[self.index] is None:
+            return None
+        return self.cache[self.index][0]
+
+    def remove(self, address):
+        slot = self.slot_index.pop(address, None)
+        if slot is None:
+            return False
+        self.cache[slot] = None
+        self._write_back(address)
+        return True
+
+    # The oldest entry is the first one found from self.index onwards.
+    # Slots emptied by remove() are skipped, so this is O(size) once
+    # there are holes.
+    def evict(self):
+        for i in range(self.size):
+            item = self.cache[(self.index + i) % self.size]
+            if item is not None:
+                self.remove(item[0])
+                return item[0]
+        return None
 
     def lookup(self, address):
-        for item in self.cache:
-            if item is not None and item[0] == address:
-                self.cache_hit_count += 1
-                self.cache_hit_flag = True
-                return item[1]
+        slot = self.slot_index.get(address)
+        if slot is not None:
+            self.cache_hit_count += 1
+            self.cache_hit_flag = True
+            return self.cache[slot][1]
 
         data = super().lookup(address)
+        self.cache_hit_flag = False
+        if self.size <= 0:
+            return data
+        # Drop the entry being overwritten from the index
+        old = self.cache[self.index]
+        if old is not None:
+            del self.slot_index[old[0]]
+            self._write_back(old[0])
         self.cache[self.index] = (address, data)
+        self.slot_index[address] = self.index
         self.index = (self.index + 1) % self.size
-        self.cache_hit_flag = False
         return data
 
+    def _fill(self, address, data):
+        slot = self.slot_index.get(address)
+        if slot is not None and self.cache[slot][1] is _PENDING:
+            self.cache[slot] = (address, data)
+
+    def _set(self, address, value):
+        self.cache[self.slot_index[address]] = (address, value)
+
+    def lookup_many(self, addresses):
+        addresses = list(addresses)
+        cache = self.cache
+        slot_index = self.slot_index
+        missed = []
+        add_miss = missed.append
+        size = self.size
+        index = self.index
+        write_back = self._write_back
+        values = []
+        flags = bytearray()
+        add_value = values.append
+        add_flag = flags.append
+        hits = 0
+        for address in addresses:
+            slot = slot_index.get(address)
+            if slot is not None:
+                hits += 1
+                add_value(cache[slot][1])
+                add_flag(1)
+                continue
+            data = _PENDING
+            add_miss(address)
+            add_value(data)
+            add_flag(0)
+            if size > 0:
+                old = cache[index]
+                if old is not None:
+                    del slot_index[old[0]]
+                    write_back(old[0])
+                cache[index] = (address, data)
+                slot_index[address] = index
+                index += 1
+                if index == size:
+                    index = 0
+        self.index = index
+        self._resolve(addresses, values, flags, missed, hits)
+        return values, pack_flags(flags)
+
 
 class Node:
+    __slots__ = ("key", "val", "prev", "next")
+
     def __init__(self, key, val):
         self.key = key
         self.val = val
@@ -61,8 +396,8 @@ class LRUCache(Cache):
     def name(self):
         return "LRU"
 
-    def __init__(self, data, size=5):
-        super().__init__(data)
+    def __init__(self, data, size=5, write_back=False):
+        super().__init__(data, write_back=write_back)
         self.size = size
         self.cache = {}
         self.head = Node(0, 0)
@@ -70,6 +405,32 @@ class LRUCache(Cache):
         self.head.next = self.tail
         self.tail.prev = self.head
 
+    def contains(self, address):
+        return address in self.cache
+
+    def get_occupancy(self):
+        return len(self.cache)
+
+    def victim(self):
+        if len(self.cache) < self.size:
+            return None
+        return self.tail.prev.key
+
+    def remove(self, address):
+        node = self.cache.pop(address, None)
+        if node is None:
+            return False
+        self._remove(node)
+        self._write_back(address)
+        return True
+
+    def evict(self):
+        if not self.cache:
+            return None
+        address = self.tail.prev.key
+        self.remove(address)
+        return address
+
     def _remove(self, node):
         prev = node.prev
         next = node.next
@@ -100,16 +461,67 @@ class LRUCache(Cache):
                 node_to_remove = self.tail.prev
                 self._remove(node_to_remove)
                 del self.cache[node_to_remove.key]
+                self._write_back(node_to_remove.key)
             self.cache_hit_flag = False
             return data
 
+    def _fill(self, address, data):
+        node = self.cache.get(address)
+        if node is not None and node.val is _PENDING:
+            node.val = data
+
+    def _set(self, address, value):
+        self.cache[address].val = value
+
+    def lookup_many(self, addresses):
+        addresses = list(addresses)
+        cache = self.cache
+        head = self.head
+        tail = self.tail
+        missed = []
+        add_miss = missed.append
+        size = self.size
+        write_back = self._write_back
+        values = []
+        flags = bytearray()
+        add_value = values.append
+        add_flag = flags.append
+        hits = 0
+        for address in addresses:
+            node = cache.get(address)
+            if node is not None:
+                # Unlink and move to the front
+                node.prev.next = node.next
+                node.next.prev = node.prev
+                hits += 1
+                add_flag(1)
+            else:
+                node = Node(address, _PENDING)
+                add_miss(address)
+                cache[address] = node
+                add_flag(0)
+            first = head.next
+            head.next = node
+            node.prev = head
+            node.next = first
+            first.prev = node
+            if len(cache) > size:
+                last = tail.prev
+                last.prev.next = tail
+                tail.prev = last.prev
+                del cache[last.key]
+                write_back(last.key)
+            add_value(node.val)
+        self._resolve(addresses, values, flags, missed, hits)
+        return values, pack_flags(flags)
+
 
 class MRUCache(Cache):
     def name(self):
         return "MRU"
 
-    def __init__(self, data, size=5):
-        super().__init__(data, size)
+    def __init__(self, data, size=5, write_back=False):
+        super().__init__(data, size, write_back)
         self.size = size
         self.cache = {}
         self.head = Node(None, None)
@@ -117,6 +529,32 @@ class MRUCache(Cache):
         self.head.next = self.tail
         self.tail.prev = self.head
 
+    def contains(self, address):
+        return address in self.cache
+
+    def get_occupancy(self):
+        return len(self.cache)
+
+    def victim(self):
+        if len(self.cache) < self.size or not self.cache:
+            return None
+        return self.head.next.key
+
+    def remove(self, address):
+        node = self.cache.pop(address, None)
+        if node is None:
+            return False
+        self._remove(node)
+        self._write_back(address)
+        return True
+
+    def evict(self):
+        if not self.cache:
+            return None
+        address = self.head.next.key
+        self.remove(address)
+        return address
+
     def _remove(self, node):
         node.prev.next = node.next
         node.next.prev = node.prev
@@ -141,49 +579,1210 @@ class MRUCache(Cache):
                 lru_node = self.head.next
                 self._remove(lru_node)
                 del self.cache[lru_node.key]
+                self._write_back(lru_node.key)
             new_node = Node(key, data)
             self._add_to_front(new_node)
             self.cache[key] = new_node
             self.cache_hit_flag = False
             return data
 
-# My LFU cache is now an array of tuples (address, data)
-# i.e. cache = [(address1, data1), (address2, data2), (None), (None), (None)]
-#                              cache[item] = (item, data1)
+    def _fill(self, address, data):
+        node = self.cache.get(address)
+        if node is not None and node.val is _PENDING:
+            node.val = data
+
+    def _set(self, address, value):
+        self.cache[address].val = value
+
+    def lookup_many(self, keys):
+        keys = list(keys)
+        cache = self.cache
+        head = self.head
+        missed = []
+        add_miss = missed.append
+        size = self.size
+        write_back = self._write_back
+        values = []
+        flags = bytearray()
+        add_value = values.append
+        add_flag = flags.append
+        hits = 0
+        for key in keys:
+            node = cache.get(key)
+            if node is not None:
+                node.prev.next = node.next
+                node.next.prev = node.prev
+                hits += 1
+                add_flag(1)
+            else:
+                data = _PENDING
+                add_miss(key)
+                if len(cache) >= size:
+                    # Evict the most recently used entry at the front
+                    first = head.next
+                    first.prev.next = first.next
+                    first.next.prev = first.prev
+                    del cache[first.key]
+                    write_back(first.key)
+                node = Node(key, data)
+                cache[key] = node
+                add_flag(0)
+            node.next = head.next
+            node.prev = head
+            head.next.prev = node
+            head.next = node
+            add_value(node.val)
+        self._resolve(keys, values, flags, missed, hits)
+        return values, pack_flags(flags)
+
+
+# Compact LRU/MRU storage, for integer addresses that fit in 64 bits.
+# Instead of a Node object per entry, the recency list is a pair of
+# integer arrays indexing into a fixed pool of size slots, with index
+# size used as the list's sentinel, and the address -> slot index is
+# an open addressing table of slot numbers rather than a dict:
+#   prev = array('i', [...]), next = array('i', [...])
+#   keys[slot], vals[slot]    entry held in slot (keys is array('q'))
+#   table[i]                  slot, or _EMPTY; linear probing from
+#                             bucket address * _SPREAD % len(table)
+# The table has a prime number of buckets, at least twice the number of
+# slots. Multiplying first scatters runs of consecutive addresses, which
+# would otherwise fill runs of buckets that other addresses then have
+# to probe all the way through. Removals shift later entries back
+# instead of leaving tombstones.
+# Slots are reused in place when an entry is evicted, so a full cache
+# allocates nothing per miss and holds no per-entry objects besides
+# the values. Slots emptied by remove() are kept on a free list for
+# the next insert. That comes to about 33 bytes per entry, against 116
+# for LRUCache, but probing the table in Python makes each lookup two
+# to three times slower.
+_EMPTY = -1
+_SPREAD = 0x9E3779B1
+
+
+def _prime_at_least(n):
+    n = max(n, 2)
+    while any(n % d == 0 for d in range(2, int(n ** 0.5) + 1)):
+        n += 1
+    return n
+
+
+class CompactListCache(Cache):
+    def __init__(self, data, size=5, write_back=False):
+        super().__init__(data, write_back=write_back)
+        self.size = size
+        self.keys = array("q", bytes(8 * max(size, 0)))
+        self.vals = [None] * size
+        self.prev = array("i", [size]) * (size + 1)
+        self.next = array("i", [size]) * (size + 1)
+        self.buckets = _prime_at_least(2 * size + 1)
+        self.table = array("i", [_EMPTY]) * self.buckets
+        self.count = 0
+        self.used = 0
+        self.free = []
+
+    # Bucket holding address, or the empty bucket where it would go.
+    def _bucket(self, address):
+        table = self.table
+        keys = self.keys
+        buckets = self.buckets
+        i = address * _SPREAD % buckets
+        slot = table[i]
+        while slot != _EMPTY and keys[slot] != address:
+            i += 1
+            if i == buckets:
+                i = 0
+            slot = table[i]
+        return i
+
+    def _find(self, address):
+        return self.table[self._bucket(address)]
+
+    # Empty bucket i, moving back any later entry in its probe run that
+    # can no longer be reached past the gap.
+    def _unindex(self, i):
+        table = self.table
+        keys = self.keys
+        buckets = self.buckets
+        j = i
+        while True:
+            j += 1
+            if j == buckets:
+                j = 0
+            slot = table[j]
+            if slot == _EMPTY:
+                break
+            home = keys[slot] * _SPREAD % buckets
+            if (j - home) % buckets >= (j - i) % buckets:
+                table[i] = slot
+                i = j
+        table[i] = _EMPTY
+
+    def contains(self, address):
+        return self._find(address) != _EMPTY
+
+    def get_occupancy(self):
+        return self.count
+
+    def victim(self):
+        if self.used < self.size or self.free:
+            return None
+        return self.keys[self._victim()]
+
+    def remove(self, address):
+        i = self._bucket(address)
+        slot = self.table[i]
+        if slot == _EMPTY:
+            return False
+        self._unindex(i)
+        self.count -= 1
+        self._unlink(slot)
+        self.vals[slot] = None
+        self.free.append(slot)
+        self._write_back(address)
+        return True
+
+    def evict(self):
+        if not self.count:
+            return None
+        address = self.keys[self._victim()]
+        self.remove(address)
+        return address
+
+    def _unlink(self, slot):
+        prev = self.prev[slot]
+        next = self.next[slot]
+        self.next[prev] = next
+        self.prev[next] = prev
+
+    def _push_front(self, slot):
+        first = self.next[self.size]
+        self.next[self.size] = slot
+        self.prev[slot] = self.size
+        self.next[slot] = first
+        self.prev[first] = slot
+
+    # Slot to evict when the cache is full.
+    def _victim(self):
+        raise NotImplementedError
+
+    # Store a new entry at the front, reusing the victim's slot when
+    # the cache is full.
+    def _place(self, address, data):
+        if self.free:
+            slot = self.free.pop()
+        elif self.used < self.size:
+            slot = self.used
+            self.used += 1
+        else:
+            slot = self._victim()
+            self._unlink(slot)
+            old = self.keys[slot]
+            self._unindex(self._bucket(old))
+            self.count -= 1
+            self._write_back(old)
+        self.keys[slot] = address
+        self.vals[slot] = data
+        self.table[self._bucket(address)] = slot
+        self.count += 1
+        self._push_front(slot)
+
+    def _fill(self, address, data):
+        slot = self._find(address)
+        if slot != _EMPTY and self.vals[slot] is _PENDING:
+            self.vals[slot] = data
+
+    def _set(self, address, value):
+        self.vals[self._find(address)] = value
+
+    def lookup(self, address):
+        table = self.table
+        keys = self.keys
+        buckets = self.buckets
+        i = address * _SPREAD % buckets
+        slot = table[i]
+        while slot != _EMPTY and keys[slot] != address:
+            i += 1
+            if i == buckets:
+                i = 0
+            slot = table[i]
+        if slot != _EMPTY:
+            if self.next[self.size] != slot:
+                self._unlink(slot)
+                self._push_front(slot)
+            self.cache_hit_count += 1
+            self.cache_hit_flag = True
+            return self.vals[slot]
+
+        data = super().lookup(address)
+        self.cache_hit_flag = False
+        if self.size > 0:
+            self._place(address, data)
+        return data
+
+    def lookup_many(self, addresses):
+        addresses = list(addresses)
+        if self.size <= 0:
+            return self._lookup_each(addresses)
+        table = self.table
+        keys = self.keys
+        buckets = self.buckets
+        spread = _SPREAD
+        empty = _EMPTY
+        vals = self.vals
+        prev = self.prev
+        next = self.next
+        head = self.size
+        place = self._place
+        victim = self._victim
+        unindex = self._unindex
+        dirty = self.dirty
+        write_back = self._write_back
+        values = []
+        flags = bytearray()
+        missed = []
+        add_value = values.append
+        add_flag = flags.append
+        add_miss = missed.append
+        hits = 0
+        for address in addresses:
+            i = address * spread % buckets
+            slot = table[i]
+            while slot != empty and keys[slot] != address:
+                i += 1
+                if i == buckets:
+                    i = 0
+                slot = table[i]
+            if slot != empty:
+                first = next[head]
+                if first != slot:
+                    next[prev[slot]] = next[slot]
+                    prev[next[slot]] = prev[slot]
+                    next[head] = slot
+                    prev[slot] = head
+                    next[slot] = first
+                    prev[first] = slot
+                hits += 1
+                add_flag(1)
+                add_value(vals[slot])
+                continue
+            add_flag(0)
+            add_value(_PENDING)
+            add_miss(address)
+            if self.free or self.used < head:
+                place(address, _PENDING)
+                continue
+            # Full: reuse the victim's slot, as in _place
+            slot = victim()
+            next[prev[slot]] = next[slot]
+            prev[next[slot]] = prev[slot]
+            old = keys[slot]
+            j = old * spread % buckets
+            while table[j] != slot:
+                j += 1
+                if j == buckets:
+                    j = 0
+            unindex(j)
+            if old in dirty:
+                write_back(old)
+            keys[slot] = address
+            vals[slot] = _PENDING
+            # The removal may have opened an earlier bucket
+            i = address * spread % buckets
+            while table[i] != empty:
+                i += 1
+                if i == buckets:
+                    i = 0
+            table[i] = slot
+            first = next[head]
+            next[head] = slot
+            prev[slot] = head
+            next[slot] = first
+            prev[first] = slot
+        self._resolve(addresses, values, flags, missed, hits)
+        return values, pack_flags(flags)
+
+
+class CompactLRUCache(CompactListCache):
+    def name(self):
+        return "CompactLRU"
+
+    def _victim(self):
+        return self.prev[self.size]
+
+
+class CompactMRUCache(CompactListCache):
+    def name(self):
+        return "CompactMRU"
+
+    def _victim(self):
+        return self.next[self.size]
+
+
+# LFU cache with O(1) lookups and evictions.
+# self.cache maps address -> data and self.freq_dict maps address ->
+# request count. Each frequency has its own bucket, an OrderedDict of
+# addresses kept in order of their last request, so the least recently
+# used entry of the lowest frequency bucket is always the next victim:
+#   freq_buckets = {1: OrderedDict([(a3, None)]),
+#                   2: OrderedDict([(a1, None), (a2, None)])}
 
 
 class LFUCache(Cache):
     def name(self):
         return "LFU"
 
-    def __init__(self, data, size=5):
-        super().__init__(data)
+    def __init__(self, data, size=5, write_back=False):
+        super().__init__(data, write_back=write_back)
         self.size = size
-        self.cache = [None] * size
+        self.cache = {}
         self.freq_dict = {}
+        self.freq_buckets = defaultdict(OrderedDict)
+        self.min_freq = 0
+
+    def contains(self, address):
+        return address in self.cache
+
+    def get_occupancy(self):
+        return len(self.cache)
+
+    def victim(self):
+        if len(self.cache) < self.size or not self.cache:
+            return None
+        return next(iter(self.freq_buckets[self.min_freq]))
+
+    # Removing the last entry of the lowest bucket means finding the
+    # next lowest, which is O(number of distinct frequencies).
+    def remove(self, address):
+        if address not in self.cache:
+            return False
+        del self.cache[address]
+        freq = self.freq_dict.pop(address)
+        bucket = self.freq_buckets[freq]
+        del bucket[address]
+        if not bucket:
+            del self.freq_buckets[freq]
+            if self.min_freq == freq:
+                self.min_freq = min(self.freq_buckets, default=0)
+        self._write_back(address)
+        return True
+
+    def evict(self):
+        if not self.cache:
+            return None
+        address = next(iter(self.freq_buckets[self.min_freq]))
+        self.remove(address)
+        return address
+
+    def _touch(self, address):
+        # Move address from its current bucket to the next one up,
+        # placing it at the most recently used end.
+        freq = self.freq_dict[address]
+        bucket = self.freq_buckets[freq]
+        del bucket[address]
+        if not bucket:
+            del self.freq_buckets[freq]
+            if self.min_freq == freq:
+                self.min_freq = freq + 1
+        self.freq_dict[address] = freq + 1
+        self.freq_buckets[freq + 1][address] = None
+
+    def _evict(self):
+        # Least frequently used, ties broken by least recently used
+        bucket = self.freq_buckets[self.min_freq]
+        address, _ = bucket.popitem(last=False)
+        if not bucket:
+            del self.freq_buckets[self.min_freq]
+        del self.freq_dict[address]
+        del self.cache[address]
+        self._write_back(address)
 
     def lookup(self, address):
         # If address in Cache, increment frequency and return data
-        for item in self.cache:
-            if item is not None and item[0] == address:
-                self.cache_hit_count += 1
-                self.cache_hit_flag = True
-                self.freq_dict[address] = self.freq_dict.get(address, 0) + 1
-                return item[1]
+        if address in self.cache:
+            self.cache_hit_count += 1
+            self.cache_hit_flag = True
+            self._touch(address)
+            return self.cache[address]
+
+        data = super().lookup(address)
+        self.cache_hit_flag = False
+        if self.size <= 0:
+            return data
+        if len(self.cache) >= self.size:
+            self._evict()
+        self.cache[address] = data
+        self.freq_dict[address] = 1
+        self.freq_buckets[1][address] = None
+        self.min_freq = 1
+        return data
+
+    def _fill(self, address, data):
+        if self.cache.get(address) is _PENDING:
+            self.cache[address] = data
+
+    def _set(self, address, value):
+        self.cache[address] = value
+
+    def lookup_many(self, addresses):
+        addresses = list(addresses)
+        cache = self.cache
+        freq_dict = self.freq_dict
+        buckets = self.freq_buckets
+        missed = []
+        add_miss = missed.append
+        size = self.size
+        values = []
+        flags = bytearray()
+        add_value = values.append
+        add_flag = flags.append
+        hits = 0
+        for address in addresses:
+            if address in cache:
+                hits += 1
+                add_flag(1)
+                add_value(cache[address])
+                freq = freq_dict[address]
+                bucket = buckets[freq]
+                del bucket[address]
+                if not bucket:
+                    del buckets[freq]
+                    if self.min_freq == freq:
+                        self.min_freq = freq + 1
+                freq_dict[address] = freq + 1
+                buckets[freq + 1][address] = None
+                continue
+            data = _PENDING
+            add_miss(address)
+            add_flag(0)
+            add_value(data)
+            if size <= 0:
+                continue
+            if len(cache) >= size:
+                self._evict()
+            cache[address] = data
+            freq_dict[address] = 1
+            buckets[1][address] = None
+            self.min_freq = 1
+        self._resolve(addresses, values, flags, missed, hits)
+        return values, pack_flags(flags)
+
+
+# Adaptive Replacement Cache (Megiddo and Modha, 2003).
+# Resident entries are split between T1 (seen once recently) and T2
+# (seen at least twice). B1 and B2 are ghost lists holding only the
+# addresses recently evicted from T1 and T2. A hit in B1 means T1 was
+# too small, so the target size p for T1 grows; a hit in B2 shrinks
+# it. Every list is an OrderedDict with its least recently used entry
+# first, so all operations are O(1).
+
+
+class ARCCache(Cache):
+    def name(self):
+        return "ARC"
+
+    def __init__(self, data, size=5, write_back=False):
+        super().__init__(data, write_back=write_back)
+        self.size = size
+        self.p = 0
+        self.t1 = OrderedDict()
+        self.t2 = OrderedDict()
+        self.b1 = OrderedDict()
+        self.b2 = OrderedDict()
+
+    def contains(self, address):
+        return address in self.t1 or address in self.t2
+
+    def get_occupancy(self):
+        return len(self.t1) + len(self.t2)
+
+    # Victim for an address that isn't in either ghost list; a ghost
+    # hit moves p first and may pick from the other list.
+    def victim(self):
+        if len(self.t1) + len(self.t2) < self.size:
+            return None
+        if len(self.t1) + len(self.b1) == self.size \
+                and len(self.t1) == self.size:
+            return next(iter(self.t1))
+        if self.t1 and len(self.t1) > self.p:
+            return next(iter(self.t1))
+        return next(iter(self.t2))
+
+    def remove(self, address):
+        if address in self.t1:
+            del self.t1[address]
+        elif address in self.t2:
+            del self.t2[address]
+        else:
+            return False
+        self._write_back(address)
+        return True
+
+    def _set(self, address, value):
+        if address in self.t1:
+            self.t1[address] = value
+        else:
+            self.t2[address] = value
+
+    # Like _replace, but falls back to whichever list is not empty.
+    def evict(self):
+        t1_len = len(self.t1)
+        if t1_len and (t1_len > self.p or not self.t2):
+            address, _ = self.t1.popitem(last=False)
+            self.b1[address] = None
+        elif self.t2:
+            address, _ = self.t2.popitem(last=False)
+            self.b2[address] = None
+        else:
+            return None
+        self._write_back(address)
+        return address
+
+    # Evict from T1 or T2 into its ghost list, depending on whether T1
+    # is over its target size. Nothing to do if remove() left room.
+    def _replace(self, in_b2):
+        t1_len = len(self.t1)
+        if t1_len + len(self.t2) < self.size:
+            return
+        if t1_len and (t1_len > self.p or (in_b2 and t1_len == self.p)):
+            address, _ = self.t1.popitem(last=False)
+            self.b1[address] = None
+        else:
+            address, _ = self.t2.popitem(last=False)
+            self.b2[address] = None
+        self._write_back(address)
+
+    def lookup(self, address):
+        # Any hit moves the entry to the most recent end of T2
+        if address in self.t1 or address in self.t2:
+            if address in self.t1:
+                self.t2[address] = self.t1.pop(address)
+            else:
+                self.t2.move_to_end(address)
+            self.cache_hit_count += 1
+            self.cache_hit_flag = True
+            return self.t2[address]
 
         data = super().lookup(address)
-        # If there is space in the cache, add the new item
-        # Ensures items are alwaus added to the cache in the correct order
-        # So that in case of a tie in frequency as we remove LRU item
-        if None in self.cache:
-            self.cache.remove(None)
-            self.cache.append((address, data))
-            self.freq_dict[address] = self.freq_dict.get(address, 0) + 1
-        else:
-            # Find the LFU item
-            lfu_item = min(self.cache, key=lambda x: self.freq_dict[x[0]])
-            self.cache.remove(lfu_item)
-            del self.freq_dict[lfu_item[0]]
-            self.cache.append((address, data))
-            self.freq_dict[address] = self.freq_dict.get(address, 0) + 1
+        self.cache_hit_flag = False
+        size = self.size
+        if size <= 0:
+            return data
+        if address in self.b1:
+            self.p = min(size, self.p + max(len(self.b2) // len(self.b1), 1))
+            self._replace(False)
+            del self.b1[address]
+            self.t2[address] = data
+        elif address in self.b2:
+            self.p = max(0, self.p - max(len(self.b1) // len(self.b2), 1))
+            self._replace(True)
+            del self.b2[address]
+            self.t2[address] = data
+        else:
+            l1 = len(self.t1) + len(self.b1)
+            total = l1 + len(self.t2) + len(self.b2)
+            if l1 == size:
+                if len(self.t1) < size:
+                    self.b1.popitem(last=False)
+                    self._replace(False)
+                else:
+                    evicted, _ = self.t1.popitem(last=False)
+                    self._write_back(evicted)
+            elif total >= size:
+                if total == 2 * size:
+                    self.b2.popitem(last=False)
+                self._replace(False)
+            self.t1[address] = data
         return data
+
+    def lookup_many(self, addresses):
+        return self._lookup_each(addresses)
+
+
+# Doubly linked list of Nodes between head and tail sentinels, most
+# recently added at the front, for strategies that keep more than one
+# list.
+class NodeList:
+    def __init__(self):
+        self.head = Node(None, None)
+        self.tail = Node(None, None)
+        self.head.next = self.tail
+        self.tail.prev = self.head
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def remove(self, node):
+        node.prev.next = node.next
+        node.next.prev = node.prev
+        self.length -= 1
+
+    def add(self, node):
+        node.next = self.head.next
+        node.prev = self.head
+        self.head.next.prev = node
+        self.head.next = node
+        self.length += 1
+
+    def last(self):
+        return self.tail.prev
+
+    def pop(self):
+        node = self.tail.prev
+        self.remove(node)
+        return node
+
+
+# Segmented LRU. New entries start in the probationary segment and are
+# promoted to the protected segment on their second request. Protected
+# entries squeezed out by newer promotions drop back to the front of
+# the probationary segment, and evictions always come from the end of
+# the probationary segment, so a one-pass scan can't touch the
+# protected entries.
+
+
+class SLRUCache(Cache):
+    def name(self):
+        return "SLRU"
+
+    def __init__(self, data, size=5, protected_ratio=0.8,
+                 write_back=False):
+        super().__init__(data, write_back=write_back)
+        self.size = size
+        self.protected_size = int(size * protected_ratio)
+        if size > 1:
+            self.protected_size = min(self.protected_size, size - 1)
+        self.probation = NodeList()
+        self.protected = NodeList()
+        self.probation_map = {}
+        self.protected_map = {}
+
+    def contains(self, address):
+        return address in self.probation_map or \
+            address in self.protected_map
+
+    def get_occupancy(self):
+        return len(self.probation_map) + len(self.protected_map)
+
+    def victim(self):
+        if len(self.probation) + len(self.protected) < self.size \
+                or self.size <= 0:
+            return None
+        if self.probation:
+            return self.probation.last().key
+        return self.protected.last().key
+
+    def remove(self, address):
+        node = self.probation_map.pop(address, None)
+        if node is not None:
+            self.probation.remove(node)
+        else:
+            node = self.protected_map.pop(address, None)
+            if node is None:
+                return False
+            self.protected.remove(node)
+        self._write_back(address)
+        return True
+
+    def _set(self, address, value):
+        node = self.probation_map.get(address)
+        if node is None:
+            node = self.protected_map[address]
+        node.val = value
+
+    def evict(self):
+        if self.probation:
+            evicted = self.probation.pop()
+            del self.probation_map[evicted.key]
+        elif self.protected:
+            evicted = self.protected.pop()
+            del self.protected_map[evicted.key]
+        else:
+            return None
+        self._write_back(evicted.key)
+        return evicted.key
+
+    def _promote(self, node):
+        self.probation.remove(node)
+        del self.probation_map[node.key]
+        self.protected.add(node)
+        self.protected_map[node.key] = node
+        if len(self.protected) > self.protected_size:
+            demoted = self.protected.pop()
+            del self.protected_map[demoted.key]
+            self.probation.add(demoted)
+            self.probation_map[demoted.key] = demoted
+
+    def lookup(self, address):
+        node = self.protected_map.get(address)
+        if node is not None:
+            self.protected.remove(node)
+            self.protected.add(node)
+        else:
+            node = self.probation_map.get(address)
+            if node is not None:
+                if self.protected_size > 0:
+                    self._promote(node)
+                else:
+                    self.probation.remove(node)
+                    self.probation.add(node)
+        if node is not None:
+            self.cache_hit_count += 1
+            self.cache_hit_flag = True
+            return node.val
+
+        data = super().lookup(address)
+        self.cache_hit_flag = False
+        if self.size <= 0:
+            return data
+        if len(self.probation) + len(self.protected) >= self.size:
+            self.evict()
+        node = Node(address, data)
+        self.probation.add(node)
+        self.probation_map[address] = node
+        return data
+
+    def lookup_many(self, addresses):
+        return self._lookup_each(addresses)
+
+
+# 2Q (Johnson and Shasha, 1994). First-time entries go into A1in, a
+# FIFO of about a quarter of the cache; hits there don't reorder it.
+# Addresses evicted from A1in are remembered (without data) in the
+# ghost FIFO A1out. Only a miss on an address still in A1out goes into
+# Am, the main LRU list, so a scan passes through A1in and A1out and
+# never displaces Am.
+
+
+class TwoQCache(Cache):
+    def name(self):
+        return "2Q"
+
+    def __init__(self, data, size=5, in_ratio=0.25, out_ratio=0.5,
+                 write_back=False):
+        super().__init__(data, write_back=write_back)
+        self.size = size
+        self.in_size = max(int(size * in_ratio), 1)
+        self.out_size = max(int(size * out_ratio), 1)
+        self.a1in = NodeList()
+        self.am = NodeList()
+        self.a1in_map = {}
+        self.am_map = {}
+        self.a1out = OrderedDict()
+
+    def contains(self, address):
+        return address in self.am_map or address in self.a1in_map
+
+    def get_occupancy(self):
+        return self._resident()
+
+    def _resident(self):
+        return len(self.a1in) + len(self.am)
+
+    def victim(self):
+        if self._resident() < self.size or self.size <= 0:
+            return None
+        if len(self.a1in) > self.in_size or not self.am:
+            return self.a1in.last().key
+        return self.am.last().key
+
+    def remove(self, address):
+        node = self.a1in_map.pop(address, None)
+        if node is not None:
+            self.a1in.remove(node)
+        else:
+            node = self.am_map.pop(address, None)
+            if node is None:
+                return False
+            self.am.remove(node)
+        self._write_back(address)
+        return True
+
+    def _set(self, address, value):
+        node = self.a1in_map.get(address)
+        if node is None:
+            node = self.am_map[address]
+        node.val = value
+
+    def evict(self):
+        if not self._resident():
+            return None
+        if len(self.a1in) > self.in_size or not self.am:
+            evicted = self.a1in.pop()
+            del self.a1in_map[evicted.key]
+            self.a1out[evicted.key] = None
+            if len(self.a1out) > self.out_size:
+                self.a1out.popitem(last=False)
+        else:
+            evicted = self.am.pop()
+            del self.am_map[evicted.key]
+        self._write_back(evicted.key)
+        return evicted.key
+
+    # Free a slot for a new entry if the cache is full.
+    def _reclaim(self):
+        if self._resident() >= self.size:
+            self.evict()
+
+    def lookup(self, address):
+        node = self.am_map.get(address)
+        if node is not None:
+            self.am.remove(node)
+            self.am.add(node)
+        else:
+            node = self.a1in_map.get(address)
+        if node is not None:
+            self.cache_hit_count += 1
+            self.cache_hit_flag = True
+            return node.val
+
+        data = super().lookup(address)
+        self.cache_hit_flag = False
+        if self.size <= 0:
+            return data
+        # Take the address out of A1out before reclaiming, which may
+        # push the oldest ghost out
+        seen = address in self.a1out
+        if seen:
+            del self.a1out[address]
+        self._reclaim()
+        node = Node(address, data)
+        if seen:
+            self.am.add(node)
+            self.am_map[address] = node
+        else:
+            self.a1in.add(node)
+            self.a1in_map[address] = node
+        return data
+
+    def lookup_many(self, addresses):
+        return self._lookup_each(addresses)
+
+
+# CLOCK (second chance). Same ring of slots and address -> slot index
+# as CyclicCache, plus one reference bit per slot. A hit only sets the
+# slot's bit. On a miss the hand (self.index) sweeps forward, clearing
+# set bits, and the first slot whose bit is already clear is reused.
+
+
+class ClockCache(CyclicCache):
+    def name(self):
+        return "CLOCK"
+
+    def __init__(self, data, size=5, write_back=False):
+        super().__init__(data, size, write_back)
+        self.referenced = bytearray(max(size, 0))
+
+    def victim(self):
+        size = self.size
+        for i in range(size):
+            slot = (self.index + i) % size
+            if self.cache[slot] is None:
+                return None
+            if not self.referenced[slot]:
+                return self.cache[slot][0]
+        return self.cache[self.index][0] if size > 0 else None
+
+    # Sweep as for a miss, skipping empty slots.
+    def evict(self):
+        if not self.slot_index:
+            return None
+        hand = self.index
+        while self.cache[hand] is None or self.referenced[hand]:
+            self.referenced[hand] = 0
+            hand = (hand + 1) % self.size
+        address = self.cache[hand][0]
+        self.remove(address)
+        self.index = hand
+        return address
+
+    # Move the hand to the slot the next entry should go in.
+    def _find_slot(self):
+        cache = self.cache
+        referenced = self.referenced
+        hand = self.index
+        while cache[hand] is not None and referenced[hand]:
+            referenced[hand] = 0
+            hand += 1
+            if hand == self.size:
+                hand = 0
+        return hand
+
+    def _place(self, address, data):
+        slot = self._find_slot()
+        old = self.cache[slot]
+        if old is not None:
+            del self.slot_index[old[0]]
+            self._write_back(old[0])
+        self.cache[slot] = (address, data)
+        self.slot_index[address] = slot
+        self.referenced[slot] = 0
+        self.index = (slot + 1) % self.size
+        return slot
+
+    def lookup(self, address):
+        slot = self.slot_index.get(address)
+        if slot is not None:
+            self.referenced[slot] = 1
+            self.cache_hit_count += 1
+            self.cache_hit_flag = True
+            return self.cache[slot][1]
+
+        data = Cache.lookup(self, address)
+        self.cache_hit_flag = False
+        if self.size > 0:
+            self._place(address, data)
+        return data
+
+    def lookup_many(self, addresses):
+        addresses = list(addresses)
+        cache = self.cache
+        slot_index = self.slot_index
+        referenced = self.referenced
+        place = self._place
+        size = self.size
+        values = []
+        flags = bytearray()
+        missed = []
+        add_value = values.append
+        add_flag = flags.append
+        add_miss = missed.append
+        hits = 0
+        for address in addresses:
+            slot = slot_index.get(address)
+            if slot is not None:
+                referenced[slot] = 1
+                hits += 1
+                add_flag(1)
+                add_value(cache[slot][1])
+                continue
+            add_flag(0)
+            add_value(_PENDING)
+            add_miss(address)
+            if size > 0:
+                place(address, _PENDING)
+        self._resolve(addresses, values, flags, missed, hits)
+        return values, pack_flags(flags)
+
+
+# CLOCK-Pro approximation (after Jiang, Chen and Zhang, 2005), on the
+# same ring as ClockCache. Resident entries are hot or cold. New
+# entries start cold and in a test period; a cold entry referenced
+# again during its test period is promoted to hot. Evicting a cold
+# entry still in its test period leaves its address in a bounded
+# ghost FIFO; a miss on a ghost address comes back in as hot and
+# grows the cold target, while ghosts expiring from the FIFO shrink
+# it. Hits still only set the reference bit.
+#
+# Two hands move over the ring: the cold hand (self.index) finds
+# slots to reuse, and the hot hand demotes unreferenced hot entries
+# whenever there are more than size - cold_target of them. Unlike the
+# paper, non-resident entries live in the ghost FIFO rather than on
+# the ring, so there is no separate test hand.
+
+
+class ClockProCache(ClockCache):
+    def name(self):
+        return "CLOCK-Pro"
+
+    def __init__(self, data, size=5, write_back=False):
+        super().__init__(data, size, write_back)
+        self.hot = bytearray(max(size, 0))
+        self.test = bytearray(max(size, 0))
+        self.hot_hand = 0
+        self.hot_count = 0
+        self.cold_target = max(size // 4, 1)
+        self.ghost = OrderedDict()
+
+    # Runs the hands as a miss on an address that isn't in the ghost
+    # FIFO would, and leaves the cold hand on the slot it stops at, so
+    # that miss (or the next call) starts there instead of sweeping the
+    # same slots again. This only ages entries a little before a miss
+    # would have; a hit in between still gives the victim its second
+    # chance.
+    def victim(self):
+        if self.size <= 0:
+            return None
+        self.index = self._find_slot()
+        entry = self.cache[self.index]
+        return None if entry is None else entry[0]
+
+    def remove(self, address):
+        slot = self.slot_index.get(address)
+        if slot is None:
+            return False
+        if self.hot[slot]:
+            self.hot[slot] = 0
+            self.hot_count -= 1
+        self.test[slot] = 0
+        return super().remove(address)
+
+    def _run_hot_hand(self):
+        cache = self.cache
+        size = self.size
+        while self.hot_count > size - self.cold_target:
+            hand = self.hot_hand
+            if cache[hand] is not None:
+                if self.hot[hand]:
+                    if self.referenced[hand]:
+                        self.referenced[hand] = 0
+                    else:
+                        self.hot[hand] = 0
+                        self.hot_count -= 1
+                else:
+                    # The hot hand passing a cold entry ends its test
+                    self.test[hand] = 0
+            self.hot_hand = (hand + 1) % size
+
+    def _find_slot(self):
+        cache = self.cache
+        referenced = self.referenced
+        hot = self.hot
+        test = self.test
+        hand = self.index
+        while True:
+            if cache[hand] is None:
+                return hand
+            if not hot[hand]:
+                if not referenced[hand]:
+                    return hand
+                referenced[hand] = 0
+                if test[hand]:
+                    test[hand] = 0
+                    hot[hand] = 1
+                    self.hot_count += 1
+                    self._run_hot_hand()
+                else:
+                    test[hand] = 1
+            hand += 1
+            if hand == self.size:
+                hand = 0
+
+    def _place(self, address, data):
+        returning = address in self.ghost
+        if returning:
+            del self.ghost[address]
+            self.cold_target = min(self.cold_target + 1, self.size)
+        slot = self._find_slot()
+        old = self.cache[slot]
+        if old is not None:
+            del self.slot_index[old[0]]
+            self._write_back(old[0])
+            if self.test[slot]:
+                self.ghost[old[0]] = None
+                if len(self.ghost) > self.size:
+                    self.ghost.popitem(last=False)
+                    self.cold_target = max(self.cold_target - 1, 1)
+        self.cache[slot] = (address, data)
+        self.slot_index[address] = slot
+        self.referenced[slot] = 0
+        self.index = (slot + 1) % self.size
+        if returning:
+            self.hot[slot] = 1
+            self.test[slot] = 0
+            self.hot_count += 1
+            self._run_hot_hand()
+        else:
+            self.hot[slot] = 0
+            self.test[slot] = 1
+        return slot
+
+
+# Belady's MIN, the offline optimum: on a miss with the cache full,
+# evict the entry whose next use is farthest in the future. The whole
+# trace has to be given up front, and lookups must then follow it in
+# order. Next-use positions come from one backward pass; resident
+# entries sit in a max-heap on next use, with stale heap entries
+# skipped lazily, so each access costs O(log size) amortised.
+
+
+class OPTCache(Cache):
+    def name(self):
+        return "OPT"
+
+    def __init__(self, data, size=5, trace=(), write_back=False):
+        super().__init__(data, write_back=write_back)
+        self.size = size
+        self.trace = list(trace)
+        self.next_use = [0] * len(self.trace)
+        upcoming = {}
+        for i in range(len(self.trace) - 1, -1, -1):
+            address = self.trace[i]
+            self.next_use[i] = upcoming.get(address, len(self.trace))
+            upcoming[address] = i
+        self.position = 0
+        self.cache = {}
+        # address -> position of its next use, for resident entries
+        self.next_of = {}
+        self.heap = []
+
+    def contains(self, address):
+        return address in self.cache
+
+    def get_occupancy(self):
+        return len(self.cache)
+
+    # Drop heap entries that no longer match next_of.
+    def _top(self):
+        heap = self.heap
+        while heap and self.next_of.get(heap[0][1]) != -heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][1] if heap else None
+
+    def _schedule(self, address, next_use):
+        self.next_of[address] = next_use
+        heapq.heappush(self.heap, (-next_use, address))
+        # Rebuild once stale entries outnumber live ones
+        if len(self.heap) > 2 * len(self.next_of) + 16:
+            self.heap = [(-use, key) for key, use in self.next_of.items()]
+            heapq.heapify(self.heap)
+
+    def victim(self):
+        if len(self.cache) < self.size or self.size <= 0:
+            return None
+        return self._top()
+
+    def remove(self, address):
+        if address not in self.cache:
+            return False
+        del self.cache[address]
+        del self.next_of[address]
+        self._write_back(address)
+        return True
+
+    def evict(self):
+        address = self._top()
+        if address is not None:
+            self.remove(address)
+        return address
+
+    def _set(self, address, value):
+        self.cache[address] = value
+
+    def lookup(self, address):
+        position = self.position
+        if position >= len(self.trace) or self.trace[position] != address:
+            raise ValueError(
+                f"OPTCache lookup {position} is {address}, not the next "
+                "address in its trace")
+        self.position += 1
+        next_use = self.next_use[position]
+        if address in self.cache:
+            self._schedule(address, next_use)
+            self.cache_hit_count += 1
+            self.cache_hit_flag = True
+            return self.cache[address]
+
+        data = super().lookup(address)
+        self.cache_hit_flag = False
+        if self.size <= 0:
+            return data
+        if len(self.cache) >= self.size:
+            self.remove(self._top())
+        self.cache[address] = data
+        self._schedule(address, next_use)
+        return data
+
+    def lookup_many(self, addresses):
+        return self._lookup_each(addresses)
@@ -0,0 +1,214 @@
+import os
+import mmap
+import tempfile
+import multiprocessing
+from array import array
+from cache import Cache, LRUCache, LFUCache, Node
+from shared_cache import SharedLRUCache, _block_size, _bucket_count
+from shared_cache import _format, _NIL
+
+
+# Stands in for a SharedMemory block: a whole file mapped into memory.
+# Every process mapping the same file shares its pages, and the
+# operating system pages them in from disk only as they are touched.
+class _FileBlock:
+    def __init__(self, path, size=None):
+        self.name = path
+        self.file = open(path, "r+b" if size is None else "w+b")
+        if size is not None:
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.buf = memoryview(self.map)
+
+    def sync(self):
+        self.map.flush()
+
+    def close(self):
+        self.buf.release()
+        self.map.close()
+        self.file.close()
+
+    def unlink(self):
+        os.remove(self.name)
+
+
+# SharedLRUCache kept in a file instead of shared memory, so it
+# survives restarts: the fixed-width entries, the hash index and the
+# recency list are all in the mapped file. Reopening an existing file
+# maps it and reads nothing up front; entries are paged in as they are
+# looked up.
+#
+# With path None a temporary file is used. An existing file must have
+# been created with the same size and width. The hit and memory request
+# counts are kept in the file too, so they are totals since it was
+# created. Writes reach the file when the operating system flushes the
+# pages, or on sync() and close(); a process killed part way through
+# an update can leave the file inconsistent.
+class DiskLRUCache(SharedLRUCache):
+    def name(self):
+        return "DiskLRU"
+
+    def __init__(self, data, size=5, path=None, width=8, lock=None):
+        Cache.__init__(self, data)
+        self.data = data
+        self.lock = lock if lock is not None else multiprocessing.Lock()
+        if path is None:
+            handle, path = tempfile.mkstemp(suffix=".cache")
+            os.close(handle)
+        self.path = path
+        self.owner = not os.path.exists(path) or \
+            os.path.getsize(path) == 0
+        buckets = _bucket_count(size)
+        if self.owner:
+            self.block = _FileBlock(path, _block_size(size, buckets,
+                                                      width))
+            _format(self.block.buf, size, buckets, width)
+        else:
+            self.block = _FileBlock(path)
+        self._map()
+        if self.owner:
+            for i in range(self.nbuckets):
+                self.buckets[i] = _NIL
+        elif (self.size, self.width) != (size, width) or \
+                len(self.block.buf) != _block_size(self.size,
+                                                   self.nbuckets,
+                                                   self.width):
+            found = (self.size, self.width)
+            self.close()
+            raise ValueError(f"{path} holds a cache of size {found[0]} "
+                             f"and width {found[1]}, not {size} and "
+                             f"{width}")
+
+    def __getstate__(self):
+        return {"data": self.data, "path": self.path, "size": self.size,
+                "width": self.width, "lock": self.lock}
+
+    def __setstate__(self, state):
+        self.__init__(state["data"], state["size"], state["path"],
+                      state["width"], state["lock"])
+
+    # Write changed pages back to the file now.
+    def sync(self):
+        self.block.sync()
+
+    def close(self):
+        self.block.sync()
+        super().close()
+
+
+# Snapshots of LRUCache and LFUCache contents in a compact binary file,
+# all in native byte order:
+#
+#   header   int64[8]       magic, kind, size, count, width
+#   keys     int64[count]   in eviction order, next victim first
+#   freqs    int64[count]   LFU only: request count of each key
+#   lengths  uint8[count]   bytes used by each value
+#   values   bytes[count * width]
+#
+# Values are stored as UTF-8 in width bytes, as in SharedLRUCache;
+# entries with any other value are left out.
+_MAGIC = int.from_bytes(b"PYCACHE1", "little")
+_KINDS = {LRUCache: 0, LFUCache: 1}
+_SNAPSHOT_HEADER = 8
+
+
+def _entries(cache):
+    if isinstance(cache, LFUCache):
+        for freq in sorted(cache.freq_buckets):
+            for address in cache.freq_buckets[freq]:
+                yield address, cache.cache[address], freq
+    else:
+        node = cache.tail.prev
+        while node is not cache.head:
+            yield node.key, node.val, 0
+            node = node.prev
+
+
+# Write the contents and recency (and, for LFU, frequency) order of
+# cache to path. Dirty entries aren't recorded as dirty, so a write
+# back cache must be flushed first.
+def snapshot(cache, path, width=8):
+    kind = _KINDS.get(type(cache))
+    if kind is None:
+        raise TypeError(f"Can't snapshot a {cache.name()} cache")
+    if cache.dirty:
+        raise ValueError("Flush the cache before taking a snapshot")
+    keys = array("q")
+    freqs = array("q")
+    lengths = bytearray()
+    values = bytearray()
+    for address, value, freq in _entries(cache):
+        encoded = value.encode() if isinstance(value, str) else None
+        if encoded is None or len(encoded) > width:
+            continue
+        keys.append(address)
+        freqs.append(freq)
+        lengths.append(len(encoded))
+        values += encoded.ljust(width, b"\0")
+    header = array("q", [_MAGIC, kind, cache.size, len(keys), width, 0,
+                         0, 0])
+    with open(path, "wb") as output:
+        header.tofile(output)
+        keys.tofile(output)
+        if kind == _KINDS[LFUCache]:
+            freqs.tofile(output)
+        output.write(lengths)
+        output.write(values)
+
+
+# Values from a snapshot's lengths and values sections. When every
+# value fills its width with ASCII the whole section is decoded at once
+# and sliced, rather than each value being decoded on its own.
+def _decode(lengths, values, width):
+    count = len(lengths)
+    if lengths.count(width) == count and values.isascii():
+        text = values.decode("ascii")
+        return [text[i:i + width] for i in range(0, count * width, width)]
+    return [values[i * width:i * width + lengths[i]].decode()
+            for i in range(count)]
+
+
+def _read_array(view, offset, count):
+    with view[offset:offset + 8 * count] as raw, raw.cast("q") as typed:
+        return typed.tolist()
+
+
+# Rebuild the cache saved at path, as an LRUCache or LFUCache over data.
+# The file is mapped and each section converted in one go; the only
+# per-entry work is creating the cache's own records.
+def restore(path, data, write_back=False):
+    with open(path, "rb") as source:
+        mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    with mapped, memoryview(mapped) as view:
+        magic, kind, size, count, width = _read_array(
+            view, 0, _SNAPSHOT_HEADER)[:5]
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a cache snapshot")
+        offset = 8 * _SNAPSHOT_HEADER
+        keys = _read_array(view, offset, count)
+        offset += 8 * count
+        freqs = None
+        if kind == _KINDS[LFUCache]:
+            freqs = _read_array(view, offset, count)
+            offset += 8 * count
+        lengths = bytes(view[offset:offset + count])
+        offset += count
+        values = _decode(lengths, bytes(view[offset:offset +
+                                             count * width]), width)
+    if freqs is None:
+        cache = LRUCache(data, size, write_back=write_back)
+        entries = cache.cache
+        add = cache._add
+        for address, value in zip(keys, values):
+            node = Node(address, value)
+            entries[address] = node
+            add(node)
+    else:
+        cache = LFUCache(data, size, write_back=write_back)
+        cache.cache = dict(zip(keys, values))
+        cache.freq_dict = dict(zip(keys, freqs))
+        buckets = cache.freq_buckets
+        for address, freq in zip(keys, freqs):
+            buckets[freq][address] = None
+        cache.min_freq = freqs[0] if count else 0
+    return cache
@@ -0,0 +1,187 @@
+import time
+from cache import Cache, LRUCache, FetchedMemory, parts
+
+
+# Buckets of addresses by expiry tick, for sweeping out expired
+# entries without scanning the whole cache. Slot i holds addresses
+# whose deadline falls in a tick congruent to i modulo the number of
+# slots, so an entry may sit in its slot for several turns of the
+# wheel before it is due.
+class TimerWheel:
+    def __init__(self, tick=1.0, slots=64):
+        self.tick = tick
+        self.slots = [set() for _ in range(slots)]
+        self.current = None
+
+    def _slot(self, deadline):
+        return self.slots[int(deadline // self.tick) % len(self.slots)]
+
+    # The next advance starts from the earliest tick anything was added
+    # for, so a later deadline added first doesn't hide earlier ones.
+    def add(self, address, deadline):
+        tick = int(deadline // self.tick)
+        if self.current is None or tick < self.current:
+            self.current = tick
+        self._slot(deadline).add(address)
+
+    def discard(self, address, deadline):
+        self._slot(deadline).discard(address)
+
+    # Addresses in every slot for the ticks completed since the last
+    # call. Callers must check each deadline, since the wheel wraps.
+    def advance(self, now):
+        tick = int(now // self.tick)
+        first = self.current if self.current is not None else tick
+        self.current = tick
+        count = len(self.slots)
+        for t in range(first, min(tick, first + count)):
+            yield from list(self.slots[t % count])
+
+
+# Adds expiry and weighted capacity to LRUCache, LFUCache or
+# CyclicCache (or any strategy with remove and evict that reports the
+# entries it drops through _write_back, as all of those in cache.py and
+# tinylfu.py do).
+#
+# Each entry gets a deadline when it is stored, from the ttl passed to
+# lookup or else the default ttl (None means it never expires). An
+# expired entry is dropped lazily when it is next looked up, and
+# sweep() removes every expired entry found by the timer wheel.
+#
+# With capacity set, entries are weighted by sizeof(value) and the
+# strategy's lowest ranked entries are evicted until a new entry fits.
+# Values heavier than the whole capacity are returned but not cached.
+# The strategy still applies its own entry count limit (size).
+#
+# Evictions are counted by reason: expired, weight (making room under
+# capacity) and policy (the strategy's own eviction on insert).
+class ExpiringCache(Cache):
+    def name(self):
+        return "Expiring" + self.main.name()
+
+    def __init__(self, data, size=5, strategy=LRUCache, ttl=None,
+                 capacity=None, sizeof=None, clock=time.monotonic,
+                 wheel_tick=1.0, wheel_slots=64):
+        super().__init__(data)
+        self.main = strategy(data, size)
+        self.fetched = FetchedMemory()
+        self.main.memory = self.fetched
+        self.ttl = ttl
+        self.capacity = capacity
+        self.sizeof = sizeof if sizeof is not None else (lambda value: 1)
+        self.clock = clock
+        self.wheel = TimerWheel(wheel_tick, wheel_slots)
+        self.deadlines = {}
+        self.weights = {}
+        self.weight = 0
+        self.expired_count = 0
+        self.weight_eviction_count = 0
+        self.policy_eviction_count = 0
+        # Set while the strategy inserts, when its drops are its own
+        self.inserting = False
+        for part in parts(self.main):
+            self._hook(part)
+
+    # Forget each entry the strategy drops, whatever the reason, so the
+    # deadlines and weights only ever cover resident entries.
+    def _hook(self, part):
+        original = part._write_back
+
+        def write_back(address):
+            if address in self.weights:
+                self._forget(address)
+                if self.inserting:
+                    self.policy_eviction_count += 1
+            original(address)
+
+        part._write_back = write_back
+
+    def get_expired_count(self):
+        return self.expired_count
+
+    def get_weight_eviction_count(self):
+        return self.weight_eviction_count
+
+    def get_policy_eviction_count(self):
+        return self.policy_eviction_count
+
+    def get_weight(self):
+        return self.weight
+
+    def contains(self, address):
+        return self.main.contains(address) and not self._expired(
+            address, self.clock())
+
+    def get_occupancy(self):
+        return self.main.get_occupancy()
+
+    def _expired(self, address, now):
+        deadline = self.deadlines.get(address)
+        return deadline is not None and now >= deadline
+
+    # Drop the bookkeeping for an address the strategy no longer holds.
+    def _forget(self, address):
+        self.weight -= self.weights.pop(address, 0)
+        deadline = self.deadlines.pop(address, None)
+        if deadline is not None:
+            self.wheel.discard(address, deadline)
+
+    def _expire(self, address):
+        self.main.remove(address)
+        self._forget(address)
+        self.expired_count += 1
+
+    # Remove every expired entry due on the timer wheel so far.
+    def sweep(self):
+        now = self.clock()
+        for address in self.wheel.advance(now):
+            if self._expired(address, now):
+                self._expire(address)
+
+    def _store(self, address, data, ttl):
+        weight = self.sizeof(data)
+        if self.capacity is not None:
+            if weight > self.capacity:
+                return
+            while self.weight + weight > self.capacity:
+                evicted = self.main.evict()
+                if evicted is None:
+                    break
+                self._forget(evicted)
+                self.weight_eviction_count += 1
+        self.fetched.value = data
+        self.inserting = True
+        self.main.lookup(address)
+        self.inserting = False
+        self.fetched.value = None
+        if not self.main.contains(address):
+            return
+        self.weights[address] = weight
+        self.weight += weight
+        if ttl is not None:
+            deadline = self.clock() + ttl
+            self.deadlines[address] = deadline
+            self.wheel.add(address, deadline)
+
+    def lookup(self, address, ttl=None):
+        if self.main.contains(address):
+            if not self._expired(address, self.clock()):
+                self.cache_hit_count += 1
+                self.cache_hit_flag = True
+                return self.main.lookup(address)
+            self._expire(address)
+
+        data = super().lookup(address)
+        self.cache_hit_flag = False
+        self._store(address, data, ttl if ttl is not None else self.ttl)
+        return data
+
+    # Write through, dropping any cached copy rather than updating it,
+    # so the entry's weight and deadline start afresh on its next miss.
+    def store(self, address, value):
+        if self.main.remove(address):
+            self._forget(address)
+        self.memory.store(address, value)
+
+    def lookup_many(self, addresses):
+        return self._lookup_each(addresses)
@@ -2,8 +2,12 @@ import sys
 import argparse
 import utilities
 import logging
+import tracebin
 from memory import Memory
 from cache import Cache, CyclicCache, LRUCache, MRUCache, LFUCache
+from cache import ARCCache, SLRUCache, TwoQCache, ClockCache, ClockProCache
+from cache import OPTCache
+from prefetch import PrefetchingCache
 
 # ANSI Colours for nice display
 
@@ -25,10 +29,38 @@ class bcolours:
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('-s', '--strategy',
-                        help='Expects one of None (default), LRU, MRU or LFU',
+                        help='Expects one of None (default), Cyclic, LRU, '
+                        'MRU, LFU, ARC, SLRU, 2Q, CLOCK, CLOCK-Pro or '
+                        'OPT',
                         default="None")
     parser.add_argument('-l', '--log-level', default='WARNING',
                         help='set log level')
+    parser.add_argument('--stream', action='store_true',
+                        help='read the trace in large chunks and only '
+                        'print the summary')
+    parser.add_argument('-b', '--binary', action='store_true',
+                        help='trace is packed little-endian ints '
+                        '(implies --stream)')
+    parser.add_argument('-w', '--width', type=int, default=4,
+                        help='bytes per address in a binary trace')
+    parser.add_argument('-i', '--input',
+                        help='read the trace from this file instead of '
+                        'stdin (memory-mapped if binary)')
+    parser.add_argument('-p', '--progress', type=int, default=0,
+                        help='in stream mode, report progress every '
+                        'this many accesses')
+    parser.add_argument('-m', '--memory-size', type=int, default=10,
+                        help='number of memory locations')
+    parser.add_argument('--data-dir',
+                        help='map the memory contents from a dataset '
+                        'file kept in this directory (written the first '
+                        'time) instead of generating them')
+    parser.add_argument('--opt-gap', action='store_true',
+                        help='also replay the trace through OPT and '
+                        'report the hits the strategy missed out on')
+    parser.add_argument('--prefetch', action='store_true',
+                        help='put a stream prefetcher in front of the '
+                        'strategy and report how well it predicted')
     args = parser.parse_args()
 
     try:
@@ -42,8 +74,11 @@ if __name__ == '__main__':
         logger.getEffectiveLevel())))
 
     model = None
-    # Create some memory of size 10.
-    data = utilities.sample_data(size=10)
+    # Create some memory, of size 10 by default.
+    if args.data_dir:
+        data = utilities.dataset(args.memory_size, args.data_dir)
+    else:
+        data = utilities.sample_data(size=args.memory_size)
 
     if args.strategy == "None":
         model = Cache(data)
@@ -55,30 +90,103 @@ if __name__ == '__main__':
         model = MRUCache(data)
     elif args.strategy == "LFU":
         model = LFUCache(data)
+    elif args.strategy == "ARC":
+        model = ARCCache(data)
+    elif args.strategy == "SLRU":
+        model = SLRUCache(data)
+    elif args.strategy == "2Q":
+        model = TwoQCache(data)
+    elif args.strategy == "CLOCK":
+        model = ClockCache(data)
+    elif args.strategy == "CLOCK-Pro":
+        model = ClockProCache(data)
+    elif args.strategy == "OPT":
+        # Built once the whole trace has been read
+        pass
     else:
         print("Unknown strategy: {}".format(args.strategy))
         sys.exit(1)
 
-    # Reads a list of integers from the command line. No error
-    # checking, so non integers will bomb out.
-    count = 0
-    location = sys.stdin.readline().strip()
-    while (location):
-        count += 1
-        location = int(location)
-        print("{}{:03d}{},{}{:2d}{}, {}{}{}".format(bcolours.GREEN,
-                                                    count,
-                                                    bcolours.RESET,
-                                                    bcolours.BLUE,
-                                                    location,
-                                                    bcolours.RESET,
-                                                    bcolours.RED,
-                                                    model.lookup(location),
-                                                    bcolours.RESET))
-        location = sys.stdin.readline().strip()
+    if args.prefetch:
+        if model is None:
+            print("OPT can't be used with --prefetch")
+            sys.exit(1)
+        model = PrefetchingCache(data, strategy=type(model))
+
+    # OPT has to see the whole trace before the first lookup, so with it
+    # (or --opt-gap) the trace is read up front.
+    buffered = args.strategy == "OPT" or args.opt_gap
+    trace = None
+
+    if args.stream or args.binary:
+        # Stream mode: no per-access output, just batches through
+        # lookup_many.
+        if args.binary and args.input:
+            trace = tracebin.map_binary(args.input, args.width)
+            chunk = tracebin.CHUNK_BYTES // args.width
+            batches = (trace[i:i + chunk]
+                       for i in range(0, len(trace), chunk))
+        else:
+            source = open(args.input, 'rb') if args.input \
+                else sys.stdin.buffer
+            if args.binary:
+                batches = tracebin.iter_binary(source, args.width)
+            else:
+                batches = tracebin.iter_text(source)
+        if buffered:
+            trace = [address for batch in batches for address in batch]
+            chunk = tracebin.CHUNK_BYTES // args.width
+            batches = (trace[i:i + chunk]
+                       for i in range(0, len(trace), chunk))
+            if model is None:
+                model = OPTCache(data, trace=trace)
+        count = 0
+        reported = 0
+        for batch in batches:
+            model.lookup_many(batch)
+            count += len(batch)
+            if args.progress and count - reported >= args.progress:
+                reported = count - count % args.progress
+                print(f"{count} accesses, "
+                      f"{model.get_cache_hit_count()} cache hits",
+                      file=sys.stderr)
+    else:
+        # Reads a list of integers from the command line. No error
+        # checking, so non integers will bomb out.
+        count = 0
+        locations = map(int, iter(lambda: sys.stdin.readline().strip(), ''))
+        if buffered:
+            trace = list(locations)
+            locations = trace
+            if model is None:
+                model = OPTCache(data, trace=trace)
+        for location in locations:
+            count += 1
+            value = model.lookup(location)
+            print("{}{:03d}{},{}{:2d}{}, {}{}{}".format(bcolours.GREEN,
+                                                        count,
+                                                        bcolours.RESET,
+                                                        bcolours.BLUE,
+                                                        location,
+                                                        bcolours.RESET,
+                                                        bcolours.RED,
+                                                        value,
+                                                        bcolours.RESET))
     print(f"Model: {bcolours.BLACK}{model.name()}{bcolours.RESET}")
     print(f"{bcolours.YELLOW}{count} Accesses{bcolours.RESET}")
     print(f"{bcolours.YELLOW}{model.get_memory_request_count()}\
  Memory Hits{bcolours.RESET}")
     print(f"{bcolours.YELLOW}{model.get_cache_hit_count()}\
  Cache Hits{bcolours.RESET}")
+    if args.opt_gap:
+        optimum = OPTCache(data, getattr(model, "size", 0), trace)
+        optimum.lookup_many(trace)
+        gap = optimum.get_cache_hit_count() - model.get_cache_hit_count()
+        print(f"{bcolours.YELLOW}{optimum.get_cache_hit_count()}\
+ OPT Cache Hits ({gap} more){bcolours.RESET}")
+    if args.prefetch:
+        print(f"{bcolours.YELLOW}{model.get_prefetch_count()} Prefetched, "
+              f"{model.get_prefetch_hit_count()} used, "
+              f"{model.get_wasted_prefetch_count()} wasted (accuracy "
+              f"{model.get_prefetch_accuracy():.3f}, coverage "
+              f"{model.get_prefetch_coverage():.3f}){bcolours.RESET}")
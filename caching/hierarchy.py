@@ -0,0 +1,265 @@
+from cache import Cache, CacheMemory, LRUCache, LFUCache, parts
+
+MODES = ("inclusive", "exclusive")
+
+# Marks an address whose value L1 never saw (e.g. a _PENDING entry).
+_MISSING = object()
+
+
+# Memory behind L2: whatever the hierarchy's memory is at the time of
+# each call, so a wrapper that replaces it (such as the timing in
+# InstrumentedCache) sees L2's fetches and writes too.
+class _LowerMemory:
+    def __init__(self, hierarchy):
+        self.hierarchy = hierarchy
+
+    def name(self):
+        return self.hierarchy.memory.name()
+
+    def get_request_count(self):
+        return self.hierarchy.memory.get_request_count()
+
+    def get_round_trip_count(self):
+        return self.hierarchy.memory.get_round_trip_count()
+
+    def get_write_count(self):
+        return self.hierarchy.memory.get_write_count()
+
+    def get_write_round_trip_count(self):
+        return self.hierarchy.memory.get_write_round_trip_count()
+
+    def lookup(self, address):
+        return self.hierarchy.memory.lookup(address)
+
+    def lookup_many(self, addresses):
+        return self.hierarchy.memory.lookup_many(addresses)
+
+    def store(self, address, value):
+        self.hierarchy.memory.store(address, value)
+
+    def store_many(self, addresses, values):
+        self.hierarchy.memory.store_many(addresses, values)
+
+
+# Memory behind L1 in exclusive mode. An L1 miss that hits in L2 moves
+# the entry up, taking it out of L2 (writing it back first if dirty);
+# any other miss goes straight to memory, leaving L2 alone.
+class _ExclusiveMemory(CacheMemory):
+    def __init__(self, hierarchy):
+        super().__init__(hierarchy.l2)
+        self.hierarchy = hierarchy
+
+    def lookup(self, address):
+        self.request_count += 1
+        self.round_trip_count += 1
+        l2 = self.cache
+        if l2.contains(address):
+            data = l2.lookup(address)
+            self.hierarchy.promoting = True
+            try:
+                l2.remove(address)
+            finally:
+                self.hierarchy.promoting = False
+            return data
+        return self.hierarchy.memory.lookup(address)
+
+    def lookup_many(self, addresses):
+        return [self.lookup(address) for address in addresses]
+
+    # Only entries resident in L1 are written from here, so they are
+    # not in L2 and the write goes to memory.
+    def store(self, address, value):
+        self.write_count += 1
+        self.write_round_trip_count += 1
+        self.hierarchy.memory.store(address, value)
+
+    def store_many(self, addresses, values):
+        addresses = list(addresses)
+        if not addresses:
+            return
+        self.write_count += len(addresses)
+        self.write_round_trip_count += 1
+        self.hierarchy.memory.store_many(addresses, values)
+
+
+# Two levels of cache in front of memory: a small L1 (any strategy,
+# LRUCache by default) backed by a larger L2 (LFUCache by default).
+#
+# inclusive: every entry in L1 is also in L2. An L1 miss looks up L2,
+# which fetches from memory if it misses too, so the entry ends up in
+# both. When L2 drops an entry it is dropped from L1 as well. L1 is
+# always clean; writes update both copies, and in write back mode only
+# L2 holds the dirty state.
+#
+# exclusive: an entry is in at most one level, so the total capacity
+# is the sum of the two. L1 misses are promoted out of L2 or fetched
+# from memory into L1 alone, and whatever L1 evicts is demoted into L2
+# (with its dirty state, in write back mode) rather than dropped.
+#
+# Entries leaving the hierarchy altogether are reported through its
+# own _write_back, as a single strategy reports its drops, so wrappers
+# such as InstrumentedCache see the hierarchy as one cache.
+#
+# A lookup counts as a hit if either level serves it. level_stats()
+# gives each level's own lookups, hits and misses, where the misses of
+# one level are the lookups of the next (and those of L2 are the
+# memory requests).
+class HierarchyCache(Cache):
+    def name(self):
+        return (self.mode.capitalize() + self.l1.name() + "+" +
+                self.l2.name())
+
+    def __init__(self, data, size=5, l2_size=None, l1=LRUCache,
+                 l2=LFUCache, mode="inclusive", write_back=False):
+        if mode not in MODES:
+            raise ValueError(f"Unknown hierarchy mode: {mode}")
+        super().__init__(data, write_back=write_back)
+        if l2_size is None:
+            l2_size = 4 * size
+        self.mode = mode
+        self.size = size + l2_size
+        if write_back:
+            self.l2 = l2(data, l2_size, write_back=True)
+        else:
+            self.l2 = l2(data, l2_size)
+        self.l2.memory = _LowerMemory(self)
+        self.exclusive = mode == "exclusive"
+        self.promoting = False
+        self.lookup_count = 0
+        if self.exclusive:
+            if write_back:
+                self.l1 = l1(data, size, write_back=True)
+            else:
+                self.l1 = l1(data, size)
+            self.l1.memory = _ExclusiveMemory(self)
+            # address -> value for entries in L1, to demote on eviction
+            self.values = {}
+            self.demoting = True
+            self._hook(self.l1, self._demote)
+            self._hook(self.l2, self._dropped)
+        else:
+            self.l1 = l1(data, size)
+            self.l1.memory = CacheMemory(self.l2)
+            self._hook(self.l2, self._invalidate)
+
+    # Run dropped(address) ahead of the strategy's own write back each
+    # time level, or a strategy it wraps, drops an entry.
+    def _hook(self, level, dropped):
+        for part in parts(level):
+            self._hook_part(part, dropped)
+
+    def _hook_part(self, part, dropped):
+        original = part._write_back
+
+        def write_back(address):
+            dropped(address)
+            original(address)
+
+        part._write_back = write_back
+
+    def _dropped(self, address):
+        if not self.promoting:
+            self._write_back(address)
+
+    def _invalidate(self, address):
+        self.l1.remove(address)
+        self._write_back(address)
+
+    def _demote(self, address):
+        data = self.values.pop(address, _MISSING)
+        if not self.demoting or data is _MISSING:
+            self._write_back(address)
+            return
+        dirty = address in self.l1.dirty
+        if dirty:
+            data = self.l1.dirty.pop(address)
+        self.l2._insert(address, data)
+        if dirty:
+            if self.l2.contains(address):
+                self.l2.dirty[address] = data
+            else:
+                self.memory.store(address, data)
+
+    def level_stats(self):
+        stats = []
+        lookups = self.lookup_count
+        for number, level in ((1, self.l1), (2, self.l2)):
+            hits = level.get_cache_hit_count()
+            stats.append({"level": number,
+                          "strategy": level.name(),
+                          "size": level.size,
+                          "lookups": lookups,
+                          "hits": hits,
+                          "misses": lookups - hits})
+            lookups -= hits
+        return stats
+
+    # Mean cost of a lookup given the cost of reaching each level and
+    # memory (e.g. in ns), from the counts so far.
+    def average_access_time(self, l1_cost, l2_cost, memory_cost):
+        if not self.lookup_count:
+            return 0.0
+        l1, l2 = self.level_stats()
+        return (l1_cost * l1["lookups"] + l2_cost * l2["lookups"] +
+                memory_cost * l2["misses"]) / self.lookup_count
+
+    def contains(self, address):
+        return self.l1.contains(address) or self.l2.contains(address)
+
+    def get_occupancy(self):
+        if self.exclusive:
+            return self.l1.get_occupancy() + self.l2.get_occupancy()
+        return self.l2.get_occupancy()
+
+    def get_dirty_count(self):
+        return self.l1.get_dirty_count() + self.l2.get_dirty_count()
+
+    def remove(self, address):
+        self.demoting = False
+        try:
+            removed = self.l1.remove(address)
+        finally:
+            self.demoting = True
+        return self.l2.remove(address) or removed
+
+    # Evict from L2 first, as its entries are the colder ones.
+    def evict(self):
+        address = self.l2.evict()
+        if address is None:
+            self.demoting = False
+            try:
+                address = self.l1.evict()
+            finally:
+                self.demoting = True
+        return address
+
+    def lookup(self, address):
+        self.lookup_count += 1
+        requests = self.memory.get_request_count()
+        data = self.l1.lookup(address)
+        self.cache_hit_flag = self.memory.get_request_count() == requests
+        if self.cache_hit_flag:
+            self.cache_hit_count += 1
+        if self.exclusive and self.l1.contains(address):
+            self.values[address] = data
+        return data
+
+    def store(self, address, value):
+        if not self.exclusive:
+            self.l2.store(address, value)
+            if self.l1.contains(address):
+                self.l1._set(address, value)
+            return
+        level = self.l2 if self.l2.contains(address) else self.l1
+        level.store(address, value)
+        if self.l1.contains(address):
+            self.values[address] = value
+
+    def flush(self):
+        self.l1.flush()
+        self.l2.flush()
+
+    # Each level sees one lookup per access, so that L1 misses can be
+    # told apart from L2 misses.
+    def lookup_many(self, addresses):
+        return self._lookup_each(addresses)
@@ -0,0 +1,204 @@
+import threading
+from collections import namedtuple
+from functools import update_wrapper
+from memory import Memory
+from cache import CyclicCache, LRUCache, MRUCache, LFUCache
+from cache import ARCCache, SLRUCache, TwoQCache, ClockCache, ClockProCache
+from tinylfu import TinyLFUCache
+from expiry import ExpiringCache
+
+# Memoization with any of the strategies that take arbitrary hashable
+# keys (so not the compact ones), for functions rather than integer
+# addresses:
+#
+#   @cached(strategy="LFU", size=1000, ttl=60)
+#   def price(symbol, day):
+#       ...
+#
+# The arguments of each call make a key, and the wrapped function
+# stands in for Memory behind the cache, so a miss is a call to it.
+# Like functools.lru_cache, the wrapper has cache_info(), returning
+# the same (hits, misses, maxsize, currsize) tuple, and cache_clear().
+
+STRATEGIES = {
+    "Cyclic": CyclicCache,
+    "LRU": LRUCache,
+    "MRU": MRUCache,
+    "LFU": LFUCache,
+    "ARC": ARCCache,
+    "SLRU": SLRUCache,
+    "2Q": TwoQCache,
+    "CLOCK": ClockCache,
+    "CLOCK-Pro": ClockProCache,
+    "TinyLFU": TinyLFUCache,
+}
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize",
+                                     "currsize"])
+
+# Separates positional from keyword arguments in a key.
+_KEYWORDS = object()
+
+
+# Key for a call with keyword arguments, or with typed set: a tuple of
+# the arguments (keywords sorted by name) and, if typed, their types,
+# which also keeps the arguments themselves for calling the function
+# on a miss. Its hash is worked out once, as the strategies hash a key
+# several times per lookup.
+class Key(tuple):
+    def __new__(cls, args, kwargs, typed=False):
+        items = args
+        if kwargs:
+            kwargs = dict(sorted(kwargs.items()))
+            items += (_KEYWORDS,) + tuple(kwargs.items())
+        if typed:
+            items += tuple(type(value) for value in args)
+            if kwargs:
+                items += tuple(type(value) for value in kwargs.values())
+        key = super().__new__(cls, items)
+        key.hashvalue = hash(items)
+        key.args = args
+        key.kwargs = kwargs
+        return key
+
+    def __hash__(self):
+        return self.hashvalue
+
+
+# The key for a call. Positional arguments alone are their own key.
+def make_key(args, kwargs, typed=False):
+    if kwargs or typed:
+        return Key(args, kwargs, typed)
+    return args
+
+
+# Memory holding the results of a function: looking up a key from
+# make_key calls the function with the arguments it was made from. The
+# request count is the number of calls made.
+class FunctionMemory(Memory):
+    def __init__(self, function):
+        super().__init__(None)
+        self.function = function
+
+    def name(self):
+        return getattr(self.function, "__qualname__", "function")
+
+    def lookup(self, key):
+        self.request_count += 1
+        self.round_trip_count += 1
+        if type(key) is Key:
+            return self.function(*key.args, **key.kwargs)
+        return self.function(*key)
+
+    def lookup_many(self, keys):
+        return [self.lookup(key) for key in keys]
+
+    def store(self, key, value):
+        raise TypeError("A function's results can't be stored to")
+
+    def store_many(self, keys, values):
+        raise TypeError("A function's results can't be stored to")
+
+
+# A call in progress, which other callers with the same key wait for.
+# done is held until the result is in; a bare lock is much cheaper to
+# make than an Event, and one is made for every miss.
+class _Flight:
+    def __init__(self):
+        self.done = threading.Lock()
+        self.done.acquire()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.acquire()
+        self.done.release()
+
+
+# The strategy named, holding size results, behind an ExpiringCache if
+# ttl (in seconds) is set.
+def build(strategy, size, ttl=None):
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}")
+    if ttl is not None:
+        return ExpiringCache(None, size, STRATEGIES[strategy], ttl=ttl)
+    return STRATEGIES[strategy](None, size)
+
+
+# Decorator memoizing a function in a cache of the given strategy.
+# Used bare (@cached) it takes the defaults. Every argument must be
+# hashable; with typed set, arguments of different types are cached
+# separately even if they compare equal (f(3) and f(3.0)).
+#
+# The wrapper is thread safe. The function is called without the lock
+# held, and only once at a time for each key: callers arriving while
+# it runs wait for its result (or exception) instead of calling it
+# again, and count as hits. Exceptions aren't cached.
+def cached(function=None, *, strategy="LRU", size=128, ttl=None,
+           typed=False):
+    if function is None:
+        return lambda function: cached(function, strategy=strategy,
+                                       size=size, ttl=ttl, typed=typed)
+    lock = threading.Lock()
+    flights = {}
+    cache = None
+    hits = misses = 0
+
+    def clear():
+        nonlocal cache, hits, misses
+        cache = build(strategy, size, ttl)
+        cache.memory = FunctionMemory(function)
+        hits = misses = 0
+
+    clear()
+
+    def wrapper(*args, **kwargs):
+        nonlocal hits, misses
+        key = make_key(args, kwargs, typed)
+        with lock:
+            if cache.contains(key):
+                hits += 1
+                return cache.lookup(key)
+            flight = flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = flights[key] = _Flight()
+                misses += 1
+                owner = cache
+            else:
+                hits += 1
+        if not leader:
+            flight.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = owner.memory.lookup(key)
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with lock:
+                del flights[key]
+                # Unless cache_clear() was called meanwhile
+                if flight.error is None and cache is owner:
+                    owner._insert(key, flight.value)
+            flight.done.release()
+        return flight.value
+
+    def cache_info():
+        with lock:
+            return CacheInfo(hits, misses, size, cache.get_occupancy())
+
+    def cache_clear():
+        with lock:
+            clear()
+
+    def cache_parameters():
+        return {"strategy": strategy, "size": size, "ttl": ttl,
+                "typed": typed}
+
+    wrapper.cache_info = cache_info
+    wrapper.cache_clear = cache_clear
+    wrapper.cache_parameters = cache_parameters
+    return update_wrapper(wrapper, function)
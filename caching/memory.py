@@ -6,11 +6,28 @@ class Memory:
     def __init__(self, data):
         self.data = data
         self.request_count = 0
+        self.round_trip_count = 0
+        self.write_count = 0
+        self.write_round_trip_count = 0
 
     # Returns information about the number of requests made
     def get_request_count(self):
         return self.request_count
 
+    # Returns the number of calls made to the backing store. A bulk
+    # lookup_many counts once here but once per address in
+    # request_count.
+    def get_round_trip_count(self):
+        return self.round_trip_count
+
+    # Number of addresses written, and of calls made to write them
+    # (a store_many counts once here).
+    def get_write_count(self):
+        return self.write_count
+
+    def get_write_round_trip_count(self):
+        return self.write_round_trip_count
+
     def name(self):
         return "Memory"
 
@@ -30,12 +47,52 @@ class Memory:
         # implementation that operates in a different way. You should
         # only assume that the interface remains the same.
         self.request_count += 1
+        self.round_trip_count += 1
         try:
             return self.data[address]
         except IndexError as error:
             print(f"Unknown memory location: {address}")
             return None
 
+    # Bulk lookup, returning values in the same order as addresses.
+    # The whole batch is a single round trip to the backing store.
+    def lookup_many(self, addresses):
+        addresses = list(addresses)
+        if not addresses:
+            return []
+        self.request_count += len(addresses)
+        self.round_trip_count += 1
+        values = []
+        for address in addresses:
+            try:
+                values.append(self.data[address])
+            except IndexError as error:
+                print(f"Unknown memory location: {address}")
+                values.append(None)
+        return values
+
+    def store(self, address, value):
+        self.write_count += 1
+        self.write_round_trip_count += 1
+        try:
+            self.data[address] = value
+        except IndexError as error:
+            print(f"Unknown memory location: {address}")
+
+    # Bulk store, writing values[i] to addresses[i] in a single round
+    # trip.
+    def store_many(self, addresses, values):
+        addresses = list(addresses)
+        if not addresses:
+            return
+        self.write_count += len(addresses)
+        self.write_round_trip_count += 1
+        for address, value in zip(addresses, values):
+            try:
+                self.data[address] = value
+            except IndexError as error:
+                print(f"Unknown memory location: {address}")
+
 
 # Tests
 class TestMemory(unittest.TestCase):
@@ -69,6 +126,22 @@ class TestMemory(unittest.TestCase):
         memory = Memory(self.sample_data())
         self.assertIsNone(memory.lookup(100))
 
+    def test_six(self):
+        memory = Memory(self.sample_data())
+        self.assertEqual(memory.lookup_many([3, 1, 3]), [3, 1, 3])
+        self.assertEqual(memory.get_request_count(), 3)
+        self.assertEqual(memory.get_round_trip_count(), 1)
+        memory.lookup(0)
+        self.assertEqual(memory.get_round_trip_count(), 2)
+
+    def test_seven(self):
+        memory = Memory(self.sample_data())
+        memory.store(4, -4)
+        memory.store_many([5, 6], [-5, -6])
+        self.assertEqual(memory.lookup_many([4, 5, 6]), [-4, -5, -6])
+        self.assertEqual(memory.get_write_count(), 3)
+        self.assertEqual(memory.get_write_round_trip_count(), 2)
+
 
 def suite():
     suite = unittest.TestSuite()
@@ -77,6 +150,8 @@ def suite():
     suite.addTest(TestMemory('test_three'))
     suite.addTest(TestMemory('test_four'))
     suite.addTest(TestMemory('test_five'))
+    suite.addTest(TestMemory('test_six'))
+    suite.addTest(TestMemory('test_seven'))
     return suite
 
 
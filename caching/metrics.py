@@ -0,0 +1,387 @@
+import time
+from bisect import bisect_left
+from collections import deque
+from cache import FetchedMemory, parts
+
+# Instrumentation for any cache strategy.
+#
+# Nothing here touches the strategies themselves: InstrumentedCache
+# wraps a cache and, while attached, also wraps its Memory and hooks
+# the _write_back call every strategy makes for each entry it drops.
+# A cache that was never instrumented, or has been detached, runs
+# exactly the code it always did, so the instrumentation costs
+# nothing when it is off.
+#
+# The numbers go to a Metrics registry of counters, histograms and
+# gauges, which exports them as a plain dict (snapshot) or in the
+# Prometheus text exposition format (prometheus). Anything with the
+# same counter, histogram, gauge and event methods can stand in for
+# Metrics to send them elsewhere.
+
+# Upper bounds, in nanoseconds, of the latency histogram buckets:
+# 250ns up to about a second in steps of 4.
+LATENCY_BOUNDS_NS = tuple(250 * 4 ** i for i in range(12))
+
+# Reasons an entry leaves the cache: the strategy's own choice (making
+# room for a new entry, or expiry in ExpiringCache), remove() or
+# evict().
+EVICTION_REASONS = ("policy", "remove", "evict")
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+# A counter whose value is read from function whenever it is exported,
+# for totals the cache already keeps.
+class FunctionCounter:
+    def __init__(self, function):
+        self.function = function
+
+    @property
+    def value(self):
+        return self.function()
+
+
+# Counts of observed values by bucket, where bucket i holds values
+# up to bounds[i] and the last bucket everything above.
+class Histogram:
+    def __init__(self, bounds=LATENCY_BOUNDS_NS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Upper bound of the bucket holding the q quantile, or None for the
+    # overflow bucket (or no observations).
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self):
+        buckets = {}
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            buckets[bound] = seen
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"') \
+        .replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"'
+                          for key, value in labels) + "}"
+
+
+# Registry of named metrics. Each metric may be registered several
+# times with different labels (e.g. evictions by reason); labels given
+# to Metrics itself are added to every metric on export. Sampled events
+# are kept in a bounded buffer, newest last.
+class Metrics:
+    def __init__(self, labels=None, max_events=1024):
+        self.labels = dict(labels or {})
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.events = deque(maxlen=max_events)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def counter(self, name, function=None, **labels):
+        key = self._key(name, labels)
+        if function is not None:
+            self.counters[key] = FunctionCounter(function)
+        elif key not in self.counters:
+            self.counters[key] = Counter()
+        return self.counters[key]
+
+    def histogram(self, name, bounds=LATENCY_BOUNDS_NS, **labels):
+        key = self._key(name, labels)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(bounds)
+        return self.histograms[key]
+
+    # A gauge is read from function whenever the metrics are exported.
+    def gauge(self, name, function, **labels):
+        self.gauges[self._key(name, labels)] = function
+
+    def event(self, record):
+        self.events.append(record)
+
+    # Every metric by name. A metric registered without labels maps to
+    # its value; one with labels maps to a dict from label values
+    # (joined with commas if there are several) to values. Histograms
+    # are given as count, sum and cumulative counts by upper bound.
+    def snapshot(self):
+        result = {}
+        for table, read in ((self.counters, lambda c: c.value),
+                            (self.histograms, Histogram.snapshot),
+                            (self.gauges, lambda f: f())):
+            for (name, labels), metric in table.items():
+                if labels:
+                    key = ",".join(str(value) for _, value in labels)
+                    result.setdefault(name, {})[key] = read(metric)
+                else:
+                    result[name] = read(metric)
+        return result
+
+    def prometheus(self, prefix="cache"):
+        lines = []
+        typed = set()
+        common = tuple(sorted(self.labels.items()))
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), counter in self.counters.items():
+            metric = f"{prefix}_{name}_total"
+            header(metric, "counter")
+            lines.append(f"{metric}{_format_labels(common + labels)} "
+                         f"{counter.value}")
+        for (name, labels), function in self.gauges.items():
+            metric = f"{prefix}_{name}"
+            header(metric, "gauge")
+            lines.append(f"{metric}{_format_labels(common + labels)} "
+                         f"{function()}")
+        for (name, labels), histogram in self.histograms.items():
+            metric = f"{prefix}_{name}"
+            header(metric, "histogram")
+            labels = common + labels
+            seen = 0
+            for bound, count in zip(histogram.bounds + ("+Inf",),
+                                    histogram.counts):
+                seen += count
+                bucket = _format_labels(labels + (("le", bound),))
+                lines.append(f"{metric}_bucket{bucket} {seen}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} "
+                         f"{histogram.sum}")
+            lines.append(f"{metric}_count{_format_labels(labels)} "
+                         f"{histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+# Stands in for a Memory, timing every fetch into the miss_penalty_ns
+# histogram (labelled by call, as a lookup_many is one round trip for
+# many addresses).
+class TimedMemory:
+    def __init__(self, memory, metrics, clock=time.perf_counter_ns):
+        self.memory = memory
+        self.clock = clock
+        self.single = metrics.histogram("miss_penalty_ns", call="lookup")
+        self.batch = metrics.histogram("miss_penalty_ns",
+                                       call="lookup_many")
+
+    def name(self):
+        return self.memory.name()
+
+    def get_request_count(self):
+        return self.memory.get_request_count()
+
+    def get_round_trip_count(self):
+        return self.memory.get_round_trip_count()
+
+    def get_write_count(self):
+        return self.memory.get_write_count()
+
+    def get_write_round_trip_count(self):
+        return self.memory.get_write_round_trip_count()
+
+    def lookup(self, address):
+        start = self.clock()
+        data = self.memory.lookup(address)
+        self.single.observe(self.clock() - start)
+        return data
+
+    def lookup_many(self, addresses):
+        start = self.clock()
+        values = self.memory.lookup_many(addresses)
+        self.batch.observe(self.clock() - start)
+        return values
+
+    def store(self, address, value):
+        self.memory.store(address, value)
+
+    def store_many(self, addresses, values):
+        self.memory.store_many(addresses, values)
+
+
+# Wraps any cache with counters for lookups, hits, misses, inserts
+# and evictions by reason, latency histograms for lookup, lookup_many
+# and memory fetches, and an occupancy gauge.
+#
+# Single lookups are timed one in time_every (all of them by default);
+# the rest only bump a count, which keeps most of the overhead off the
+# hit path when the cache is hot. Every sample_every lookups (0 for
+# never) an event is passed to metrics.event for tracing; for single
+# lookups it should be a multiple of time_every.
+#
+#   cache = InstrumentedCache(LRUCache(data, 100))
+#   ...
+#   print(cache.metrics.prometheus())
+#
+# Only the timings, lookups and drops are recorded as they happen.
+# Hits come from the cache's own hit count, and inserts from the
+# change in occupancy plus the drops.
+#
+# detach() removes the hooks and returns the original cache.
+class InstrumentedCache:
+    def __init__(self, cache, metrics=None, time_every=1,
+                 sample_every=1024, clock=time.perf_counter_ns):
+        if metrics is None:
+            metrics = Metrics({"cache": cache.name()})
+        self.cache = cache
+        self.metrics = metrics
+        self.clock = clock
+        self.time_every = time_every
+        self.sample_every = sample_every
+        self.lookups = 0
+        self.evictions = {reason: metrics.counter("evictions",
+                                                  reason=reason)
+                          for reason in EVICTION_REASONS}
+        self.latency = metrics.histogram("lookup_latency_ns")
+        self.batch_latency = metrics.histogram("lookup_many_latency_ns")
+        self.base_hits = cache.get_cache_hit_count()
+        self.base_occupancy = cache.get_occupancy()
+        metrics.counter("lookups", function=self.get_lookup_count)
+        metrics.counter("hits", function=self.get_hit_count)
+        metrics.counter("misses", function=lambda: (
+            self.get_lookup_count() - self.get_hit_count()))
+        metrics.counter("inserts", function=self.get_insert_count)
+        metrics.gauge("occupancy", cache.get_occupancy)
+        # The reason charged for drops made by the wrapped cache
+        self.reason = "policy"
+        self.parts = parts(cache)
+        for part in self.parts:
+            self._hook(part)
+
+    def _hook(self, part):
+        original = part._write_back
+
+        def write_back(address):
+            self.evictions[self.reason].value += 1
+            original(address)
+
+        part._write_back = write_back
+        memory = getattr(part, "memory", None)
+        if memory is not None and not isinstance(memory, FetchedMemory):
+            part.memory = TimedMemory(memory, self.metrics, self.clock)
+
+    def detach(self):
+        for part in self.parts:
+            del part._write_back
+            if isinstance(part.memory, TimedMemory):
+                part.memory = part.memory.memory
+        self.parts = []
+        return self.cache
+
+    def name(self):
+        return "Instrumented" + self.cache.name()
+
+    def get_lookup_count(self):
+        return self.lookups
+
+    def get_hit_count(self):
+        return self.cache.get_cache_hit_count() - self.base_hits
+
+    def get_insert_count(self):
+        return self.cache.get_occupancy() - self.base_occupancy + \
+            sum(counter.value for counter in self.evictions.values())
+
+    def get_cache_hit_count(self):
+        return self.cache.get_cache_hit_count()
+
+    def get_cache_hit_flag(self):
+        return self.cache.get_cache_hit_flag()
+
+    def get_memory_request_count(self):
+        return self.cache.get_memory_request_count()
+
+    def get_occupancy(self):
+        return self.cache.get_occupancy()
+
+    def contains(self, address):
+        return self.cache.contains(address)
+
+    def victim(self):
+        return self.cache.victim()
+
+    def _sample(self, record):
+        record["time_ns"] = time.time_ns()
+        record["occupancy"] = self.cache.get_occupancy()
+        self.metrics.event(record)
+
+    def lookup(self, address):
+        self.lookups += 1
+        if self.lookups % self.time_every:
+            return self.cache.lookup(address)
+        start = self.clock()
+        data = self.cache.lookup(address)
+        elapsed = self.clock() - start
+        self.latency.observe(elapsed)
+        if self.sample_every and not self.lookups % self.sample_every:
+            self._sample({"operation": "lookup", "address": address,
+                          "hit": self.cache.get_cache_hit_flag(),
+                          "latency_ns": elapsed})
+        return data
+
+    def lookup_many(self, addresses):
+        addresses = list(addresses)
+        start = self.clock()
+        values, bitmap = self.cache.lookup_many(addresses)
+        elapsed = self.clock() - start
+        self.batch_latency.observe(elapsed)
+        before = self.lookups
+        self.lookups += len(addresses)
+        if self.sample_every and before // self.sample_every != \
+                self.lookups // self.sample_every:
+            hits = bin(int.from_bytes(bitmap, "little")).count("1")
+            self._sample({"operation": "lookup_many",
+                          "count": len(addresses), "hits": hits,
+                          "latency_ns": elapsed})
+        return values, bitmap
+
+    def store(self, address, value):
+        self.cache.store(address, value)
+
+    def flush(self):
+        self.cache.flush()
+
+    def remove(self, address):
+        self.reason = "remove"
+        try:
+            return self.cache.remove(address)
+        finally:
+            self.reason = "policy"
+
+    def evict(self):
+        self.reason = "evict"
+        try:
+            return self.cache.evict()
+        finally:
+            self.reason = "policy"
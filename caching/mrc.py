@@ -0,0 +1,227 @@
+import sys
+import argparse
+import tracebin
+
+# LRU hit-ratio curves in one pass over a trace.
+#
+# LRU has the stack property: a cache of size c holds exactly the c
+# most recently used distinct addresses. So an access hits in every
+# LRU cache at least as large as its stack distance, the number of
+# distinct addresses used since the previous access to the same
+# address, counting itself. One pass recording a histogram of stack
+# distances gives the hit count for every size at once.
+#
+# Stack distances come from a Fenwick tree over access times with a
+# bit set at the most recent access to each address: the distance is
+# the number of bits set after that address's previous access. The
+# tree is renumbered whenever it fills up, so it never holds more than
+# a couple of slots per distinct address, and the whole pass is
+# O(N log M) for N accesses over M distinct addresses.
+
+_MASK = (1 << 64) - 1
+# Sampling precision for SHARDS, in bits of the hashed address.
+_SAMPLE_BITS = 24
+
+
+# splitmix64 finaliser, so that neighbouring addresses (and address 0)
+# hash to unrelated values.
+def _mix(address):
+    h = (hash(address) + 0x9E3779B97F4A7C15) & _MASK
+    h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & _MASK
+    return h ^ (h >> 31)
+
+
+# Fenwick (binary indexed) tree of counts over positions 0..size-1.
+class FenwickTree:
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    def add(self, position, delta):
+        tree = self.tree
+        i = position + 1
+        while i <= self.size:
+            tree[i] += delta
+            i += i & -i
+
+    # Sum of counts at positions 0..position-1.
+    def prefix(self, position):
+        tree = self.tree
+        total = 0
+        i = position
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+
+# Yield the stack distance of each access in trace, or None for the
+# first access to an address. trace may be any iterable. The Fenwick
+# tree operations are inlined, as this loop is the whole cost.
+def stack_distances(trace):
+    last = {}
+    capacity = 1024
+    tree = [0] * (capacity + 1)
+    now = 0
+    for address in trace:
+        if now == capacity:
+            # Renumber the live positions 0..len(last)-1, keeping
+            # their order, into a tree with room to spare.
+            order = sorted(last, key=last.get)
+            capacity = max(2 * len(order), 1024)
+            fenwick = FenwickTree(capacity)
+            for position, key in enumerate(order):
+                last[key] = position
+                fenwick.add(position, 1)
+            tree = fenwick.tree
+            now = len(order)
+        previous = last.get(address)
+        if previous is None:
+            yield None
+        else:
+            # Entries set at or after previous
+            distance = len(last)
+            i = previous
+            while i > 0:
+                distance -= tree[i]
+                i -= i & -i
+            yield distance
+            i = previous + 1
+            while i <= capacity:
+                tree[i] -= 1
+                i += i & -i
+        i = now + 1
+        while i <= capacity:
+            tree[i] += 1
+            i += i & -i
+        last[address] = now
+        now += 1
+
+
+# SHARDS (Waldspurger et al., 2015) spatial sampling: only addresses
+# whose hash falls under rate are kept, and their stack distances are
+# scaled up by 1 / rate. The same address is always kept or always
+# dropped, so reuse within the sample is preserved.
+def sampled(trace, rate):
+    threshold = int(rate * (1 << _SAMPLE_BITS))
+    shift = 64 - _SAMPLE_BITS
+    for address in trace:
+        if _mix(address) >> shift < threshold:
+            yield address
+
+
+# Wraps an iterable and counts the items taken from it.
+class _Counted:
+    def __init__(self, iterable):
+        self.iterable = iterable
+        self.count = 0
+
+    def __iter__(self):
+        for item in self.iterable:
+            self.count += 1
+            yield item
+
+
+# Histogram of stack distances for trace: a list whose entry d is the
+# number of accesses at stack distance d (entry 0 is unused), plus the
+# number of accesses read and the number of cold misses. With rate
+# below 1 the trace is sampled as above and the histogram is an
+# estimate scaled back up to the full trace.
+def distance_histogram(trace, rate=1.0):
+    counted = _Counted(trace)
+    if rate < 1.0:
+        distances = stack_distances(sampled(counted, rate))
+    else:
+        distances = stack_distances(counted)
+    scale = 1.0 / rate
+    histogram = [0]
+    cold = 0
+    for distance in distances:
+        if distance is None:
+            cold += 1
+            continue
+        if rate < 1.0:
+            distance = max(int(distance * scale + 0.5), 1)
+        if distance >= len(histogram):
+            histogram.extend([0] * (distance + 1 - len(histogram)))
+        histogram[distance] += 1
+    if rate < 1.0:
+        # SHARDS-adj: a hot address landing in (or missing) the sample
+        # skews the sampled access count away from count * rate. Put
+        # the difference on the smallest distance, where that address
+        # would mostly have been counted.
+        if len(histogram) > 1:
+            sampled_count = sum(histogram) + cold
+            histogram[1] = max(histogram[1] + round(
+                counted.count * rate) - sampled_count, 0)
+        histogram = [round(hits * scale) for hits in histogram]
+        cold = round(cold * scale)
+    return histogram, counted.count, cold
+
+
+# Hit counts for LRU caches of every size up to the largest stack
+# distance seen (beyond which the count no longer changes): entry c is
+# the number of hits an LRUCache of size c would score on trace.
+def hit_curve(histogram):
+    curve = [0]
+    hits = 0
+    for distance in range(1, len(histogram)):
+        hits += histogram[distance]
+        curve.append(hits)
+    return curve
+
+
+# Hits for each of sizes, from a curve as returned by hit_curve.
+def hits_at(curve, sizes):
+    return {size: curve[min(size, len(curve) - 1)] if size > 0 else 0
+            for size in sizes}
+
+
+# Hit counts of LRUCache at each of sizes for trace, in one pass.
+def lru_hits(trace, sizes, rate=1.0):
+    histogram, _, _ = distance_histogram(trace, rate)
+    return hits_at(hit_curve(histogram), sizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='LRU hit-ratio curve for a trace, in one pass')
+    parser.add_argument('-i', '--input',
+                        help='read the trace from this file instead of '
+                        'stdin (memory-mapped if binary)')
+    parser.add_argument('-b', '--binary', action='store_true',
+                        help='trace is packed little-endian ints')
+    parser.add_argument('-w', '--width', type=int, default=4,
+                        help='bytes per address in a binary trace')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        help='cache sizes to report (default: powers '
+                        'of two up to the largest useful size)')
+    parser.add_argument('-r', '--rate', type=float, default=1.0,
+                        help='SHARDS sampling rate, e.g. 0.01 for huge '
+                        'traces (default 1, exact)')
+    args = parser.parse_args()
+
+    if args.binary and args.input:
+        trace = tracebin.map_binary(args.input, args.width)
+    else:
+        source = open(args.input, 'rb') if args.input \
+            else sys.stdin.buffer
+        if args.binary:
+            batches = tracebin.iter_binary(source, args.width)
+        else:
+            batches = tracebin.iter_text(source)
+        trace = (address for batch in batches for address in batch)
+
+    histogram, count, cold = distance_histogram(trace, args.rate)
+    curve = hit_curve(histogram)
+    sizes = args.sizes
+    if sizes is None:
+        sizes = [1]
+        while sizes[-1] < len(curve) - 1:
+            sizes.append(sizes[-1] * 2)
+    print(f"{count} accesses, {cold} cold misses")
+    print(f"{'size':>10} {'hits':>12} {'hit ratio':>10}")
+    for size, hits in hits_at(curve, sizes).items():
+        ratio = hits / count if count else 0.0
+        print(f"{size:>10} {hits:>12} {ratio:>10.4f}")
@@ -0,0 +1,309 @@
+from collections import OrderedDict
+from cache import Cache, LRUCache
+
+# Kinds of access pattern the detector recognises: a run of
+# consecutive addresses, a run with any other constant step, and a
+# repeating cycle of steps (e.g. +1, +1, +6 walking a row at a time
+# through a matrix).
+PATTERNS = ("sequential", "strided", "delta")
+
+
+class _Stream:
+    __slots__ = ("last", "deltas", "period", "next", "ahead")
+
+    def __init__(self, address):
+        self.last = address
+        self.deltas = []
+        self.period = 0
+        # The access the pattern predicts next, if there is a pattern
+        self.next = None
+        # Predicted accesses beyond the last one already prefetched
+        self.ahead = 0
+
+
+# Splits a sequence of accesses into streams and predicts where each is
+# going next.
+#
+# An access joins the stream that predicted it, or failing that the
+# nearest stream whose last access is within window of it; otherwise
+# it starts a new stream, replacing the least recently used one once
+# there are streams of them. Streams are indexed by predicted next
+# access and by last access // window, so finding one takes a few
+# dict lookups whatever the number of streams (when two streams last
+# touched the same region, only the later one is found by distance).
+#
+# Each stream keeps its last history steps. Once the latest steps
+# repeat with a period of at most max_period (twice over, so three
+# accesses for a constant stride) the stream has a pattern, and
+# observe() returns the next degree addresses it implies. The period
+# is only worked out again when an access breaks the pattern.
+#
+# Predictions are handed out in batches: nothing more is returned for a
+# stream until it has used up half of the addresses predicted so far,
+# and then only the new ones, so the caller can fetch each batch in a
+# single round trip.
+class StreamDetector:
+    def __init__(self, streams=8, window=256, history=8, max_period=4,
+                 degree=8):
+        self.max_streams = streams
+        self.window = max(window, 1)
+        self.history = max(history, 2 * max_period)
+        self.max_period = max_period
+        self.degree = degree
+        # Streams in order of use, least recent first
+        self.streams = {}
+        # Predicted next access -> stream
+        self.expected = {}
+        # last // window -> the stream there most recently
+        self.regions = {}
+
+    def _find(self, address):
+        stream = self.expected.get(address)
+        if stream is not None:
+            return stream
+        best = None
+        best_distance = self.window + 1
+        region = address // self.window
+        for key in (region - 1, region, region + 1):
+            stream = self.regions.get(key)
+            if stream is not None:
+                distance = abs(address - stream.last)
+                if distance < best_distance:
+                    best, best_distance = stream, distance
+        return best
+
+    def _unindex(self, stream):
+        if self.expected.get(stream.next) is stream:
+            del self.expected[stream.next]
+        region = stream.last // self.window
+        if self.regions.get(region) is stream:
+            del self.regions[region]
+
+    def _index(self, stream):
+        self.regions[stream.last // self.window] = stream
+        if stream.next is not None:
+            self.expected[stream.next] = stream
+
+    # The period with which the latest steps have repeated for longest
+    # (the shortest, on a tie), as long as they have repeated at least
+    # twice over; 0 if there is none. Preferring the longest run keeps
+    # +1, +1, +6 from being read as a stride of 1 after its two +1s.
+    def period(self, deltas):
+        best = 0
+        longest = 0
+        for period in range(1, self.max_period + 1):
+            run = 0
+            for i in range(len(deltas) - 1, period - 1, -1):
+                if deltas[i] != deltas[i - period]:
+                    break
+                run += 1
+            if run >= period and run > longest:
+                best, longest = period, run
+        return best
+
+    # Record an access. Returns the pattern and a list of addresses to
+    # prefetch, or None if there is nothing new to prefetch.
+    def observe(self, address):
+        streams = self.streams
+        stream = self._find(address)
+        if stream is None:
+            if len(streams) >= self.max_streams:
+                oldest = next(iter(streams))
+                del streams[oldest]
+                self._unindex(oldest)
+            stream = _Stream(address)
+            streams[stream] = None
+            self._index(stream)
+            return None
+        del streams[stream]
+        streams[stream] = None
+        delta = address - stream.last
+        if not delta:
+            return None
+        deltas = stream.deltas
+        deltas.append(delta)
+        if len(deltas) > self.history:
+            del deltas[0]
+        if address == stream.next:
+            stream.ahead = max(stream.ahead - 1, 0)
+        else:
+            stream.ahead = 0
+            stream.period = self.period(deltas)
+        period = stream.period
+        cycle = deltas[-period:] if period else None
+        self._unindex(stream)
+        stream.last = address
+        stream.next = address + cycle[0] if period else None
+        self._index(stream)
+        if not period or stream.ahead > self.degree // 2:
+            return None
+        predicted = []
+        for step in range(self.degree):
+            address += cycle[step % period]
+            if step >= stream.ahead:
+                predicted.append(address)
+        stream.ahead = self.degree
+        if period > 1:
+            pattern = "delta"
+        elif cycle[0] == 1:
+            pattern = "sequential"
+        else:
+            pattern = "strided"
+        return pattern, predicted
+
+
+# Prefetching in front of any strategy (LRUCache by default).
+#
+# Every lookup is passed to a StreamDetector. The addresses it predicts
+# that are not already cached are fetched together with one
+# memory.lookup_many and kept in a prefetch buffer of buffer_size
+# entries (4 * degree by default) alongside the main cache of size
+# entries. Prefetched entries only reach the main cache when a lookup
+# asks for them, so predictions that turn out wrong age out of the
+# buffer, oldest first, without displacing anything the strategy chose
+# to keep.
+#
+# A lookup served from the buffer counts as a hit. Each prefetched
+# entry ends up used (a prefetch hit), wasted (dropped from the buffer
+# before it was asked for) or still in the buffer:
+#
+#   accuracy  prefetch hits / prefetched entries
+#   coverage  prefetch hits / (prefetch hits + demand misses), the share
+#             of misses without prefetching that it removed
+#
+# The memory request count includes the prefetches.
+class PrefetchingCache(Cache):
+    def name(self):
+        return "Prefetching" + self.main.name()
+
+    def __init__(self, data, size=5, strategy=LRUCache, buffer_size=None,
+                 streams=8, window=256, degree=8, max_period=4,
+                 write_back=False):
+        super().__init__(data, write_back=write_back)
+        if buffer_size is None:
+            buffer_size = 4 * degree
+        if write_back:
+            self.main = strategy(data, size, write_back=True)
+        else:
+            self.main = strategy(data, size)
+        self.main.memory = self.memory
+        self.buffer_size = buffer_size
+        self.size = size + buffer_size
+        self.limit = len(data)
+        self.detector = StreamDetector(streams, window,
+                                       max_period=max_period, degree=degree)
+        self.buffer = OrderedDict()
+        self.prefetch_count = 0
+        self.prefetch_hit_count = 0
+        self.wasted_count = 0
+        self.demand_miss_count = 0
+        self.pattern_counts = dict.fromkeys(PATTERNS, 0)
+
+    def get_prefetch_count(self):
+        return self.prefetch_count
+
+    def get_prefetch_hit_count(self):
+        return self.prefetch_hit_count
+
+    def get_wasted_prefetch_count(self):
+        return self.wasted_count
+
+    def get_demand_miss_count(self):
+        return self.demand_miss_count
+
+    # Entries prefetched for each kind of pattern.
+    def get_pattern_counts(self):
+        return dict(self.pattern_counts)
+
+    def get_prefetch_accuracy(self):
+        if not self.prefetch_count:
+            return 0.0
+        return self.prefetch_hit_count / self.prefetch_count
+
+    def get_prefetch_coverage(self):
+        misses = self.prefetch_hit_count + self.demand_miss_count
+        if not misses:
+            return 0.0
+        return self.prefetch_hit_count / misses
+
+    def contains(self, address):
+        return address in self.buffer or self.main.contains(address)
+
+    def get_occupancy(self):
+        return len(self.buffer) + self.main.get_occupancy()
+
+    def get_dirty_count(self):
+        return self.main.get_dirty_count()
+
+    def victim(self):
+        return self.main.victim()
+
+    def _drop(self, address):
+        del self.buffer[address]
+        self.wasted_count += 1
+        self._write_back(address)
+
+    def remove(self, address):
+        if address in self.buffer:
+            self._drop(address)
+            return True
+        return self.main.remove(address)
+
+    # Unused prefetches go first, as the lowest priority entries.
+    def evict(self):
+        if self.buffer:
+            address = next(iter(self.buffer))
+            self._drop(address)
+            return address
+        return self.main.evict()
+
+    def _prefetch(self, pattern, predicted):
+        buffer = self.buffer
+        main = self.main
+        addresses = [address for address in dict.fromkeys(predicted)
+                     if 0 <= address < self.limit and
+                     address not in buffer and not main.contains(address)]
+        if not addresses or self.buffer_size <= 0:
+            return
+        values = self.memory.lookup_many(addresses)
+        self.prefetch_count += len(addresses)
+        self.pattern_counts[pattern] += len(addresses)
+        for address, value in zip(addresses, values):
+            buffer[address] = value
+        while len(buffer) > self.buffer_size:
+            self._drop(next(iter(buffer)))
+
+    def lookup(self, address):
+        prediction = self.detector.observe(address)
+        if address in self.buffer:
+            data = self.buffer.pop(address)
+            self.prefetch_hit_count += 1
+            self.main._insert(address, data)
+            self.cache_hit_flag = True
+        else:
+            data = self.main.lookup(address)
+            self.cache_hit_flag = self.main.get_cache_hit_flag()
+            if not self.cache_hit_flag:
+                self.demand_miss_count += 1
+        if self.cache_hit_flag:
+            self.cache_hit_count += 1
+        if prediction is not None:
+            self._prefetch(*prediction)
+        return data
+
+    # A write back store allocates the entry in the main cache, so any
+    # prefetched copy is dropped first.
+    def store(self, address, value):
+        if address in self.buffer:
+            if self.write_back:
+                self._drop(address)
+            else:
+                self.buffer[address] = value
+        self.main.store(address, value)
+
+    def flush(self):
+        self.main.flush()
+
+    # Prefetch decisions are made access by access.
+    def lookup_many(self, addresses):
+        return self._lookup_each(addresses)
@@ -0,0 +1,118 @@
+import threading
+from cache import LRUCache, pack_flags, unpack_flags
+
+
+# Thread-safe cache made of several independent instances of one
+# strategy. Each address always maps to the same shard, and each shard
+# has its own lock, so threads only contend when they touch the same
+# shard. The total size is split as evenly as possible between shards.
+#
+# The hit flag is kept per thread: get_cache_hit_flag reports on the
+# last lookup made by the calling thread.
+#
+# With write_back set every shard runs in write back mode, and flush()
+# makes one bulk store per shard that has dirty entries.
+class ShardedCache:
+    def __init__(self, data, size=5, shards=4, strategy=LRUCache,
+                 write_back=False):
+        self.shards = []
+        for i in range(shards):
+            shard_size = size // shards + (1 if i < size % shards else 0)
+            if write_back:
+                shard = strategy(data, shard_size, write_back=True)
+            else:
+                shard = strategy(data, shard_size)
+            self.shards.append(shard)
+        self.locks = [threading.Lock() for _ in range(shards)]
+        self.local = threading.local()
+
+    def name(self):
+        return "Sharded" + self.shards[0].name()
+
+    def _shard_for(self, address):
+        return hash(address) % len(self.shards)
+
+    def get_cache_hit_count(self):
+        total = 0
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                total += shard.get_cache_hit_count()
+        return total
+
+    def get_memory_request_count(self):
+        total = 0
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                total += shard.get_memory_request_count()
+        return total
+
+    def get_memory_write_count(self):
+        total = 0
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                total += shard.get_memory_write_count()
+        return total
+
+    def get_dirty_count(self):
+        total = 0
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                total += shard.get_dirty_count()
+        return total
+
+    def get_occupancy(self):
+        total = 0
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                total += shard.get_occupancy()
+        return total
+
+    def get_cache_hit_flag(self):
+        return getattr(self.local, "cache_hit_flag", False)
+
+    def contains(self, address):
+        i = self._shard_for(address)
+        with self.locks[i]:
+            return self.shards[i].contains(address)
+
+    def lookup(self, address):
+        i = self._shard_for(address)
+        shard = self.shards[i]
+        with self.locks[i]:
+            data = shard.lookup(address)
+            self.local.cache_hit_flag = shard.get_cache_hit_flag()
+        return data
+
+    def store(self, address, value):
+        i = self._shard_for(address)
+        with self.locks[i]:
+            self.shards[i].store(address, value)
+
+    def flush(self):
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                shard.flush()
+
+    # Split the batch by shard, keeping each shard's addresses in
+    # order, and run one lookup_many per shard under its lock.
+    def lookup_many(self, addresses):
+        addresses = list(addresses)
+        positions = [[] for _ in self.shards]
+        for position, address in enumerate(addresses):
+            positions[self._shard_for(address)].append(position)
+        values = [None] * len(addresses)
+        flags = bytearray(len(addresses))
+        for i, shard_positions in enumerate(positions):
+            if not shard_positions:
+                continue
+            batch = [addresses[position] for position in shard_positions]
+            with self.locks[i]:
+                shard_values, bitmap = self.shards[i].lookup_many(batch)
+            shard_flags = unpack_flags(bitmap, len(batch))
+            for position, value, flag in zip(shard_positions,
+                                             shard_values, shard_flags):
+                values[position] = value
+                flags[position] = flag
+        if flags:
+            self.local.cache_hit_flag = flags[-1] == 1
+        return values, pack_flags(flags)
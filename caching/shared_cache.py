@@ -0,0 +1,295 @@
+import multiprocessing
+from multiprocessing import shared_memory
+from cache import Cache
+
+# Layout of the shared block, all in native byte order:
+#
+#   header   int64[8]           see the _H* offsets below
+#   keys     int64[size]        address held in each slot
+#   prev     int32[size]        recency list, head = most recent
+#   next     int32[size]
+#   chain    int32[size]        next slot in the same hash bucket
+#   buckets  int32[buckets]     first slot in each hash bucket
+#   values   bytes[size * (width + 1)]
+#
+# Each value is one length byte followed by up to width bytes of
+# UTF-8, which suits the 8 character hex strings made by
+# utilities.mangle.
+_HSIZE, _HCOUNT, _HHEAD, _HTAIL, _HHITS, _HMISSES, _HBUCKETS, _HWIDTH = \
+    range(8)
+_HEADER = 8
+_NIL = -1
+
+
+def _block_size(size, buckets, width):
+    return 8 * (_HEADER + size) + 4 * (3 * size + buckets) \
+        + size * (width + 1)
+
+
+def _bucket_count(size):
+    buckets = 1
+    while buckets < size:
+        buckets *= 2
+    return buckets
+
+
+# Write the header of a freshly created block.
+def _format(buf, size, buckets, width):
+    header = buf[:8 * _HEADER].cast("q")
+    header[_HSIZE] = size
+    header[_HHEAD] = _NIL
+    header[_HTAIL] = _NIL
+    header[_HBUCKETS] = buckets
+    header[_HWIDTH] = width
+    header.release()
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before 3.13 every attaching process registers the block with
+        # the resource tracker, which then unlinks it when that process
+        # exits. Only the creator should own it.
+        from multiprocessing import resource_tracker
+        block = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+
+# LRU cache whose entries and recency list live in a shared memory
+# block, so several worker processes share one warm cache.
+#
+# The first process creates the block; others attach by passing the
+# instance to a multiprocessing.Process (it pickles as the block name
+# and lock) or by constructing with the same name and lock. A single
+# cross-process lock guards the block. It is not held while memory is
+# being read, so a slow miss doesn't stall hits in other processes.
+#
+# The hit and memory request counts are totals for every process;
+# the hit flag is per process. Values that aren't strings of at most
+# width bytes are returned but not cached. Stores are write through,
+# updating a resident entry in place.
+class SharedLRUCache(Cache):
+    def name(self):
+        return "SharedLRU"
+
+    def __init__(self, data, size=5, name=None, lock=None, width=8):
+        super().__init__(data)
+        self.data = data
+        self.lock = lock if lock is not None else multiprocessing.Lock()
+        self.owner = name is None
+        if self.owner:
+            buckets = _bucket_count(size)
+            self.block = shared_memory.SharedMemory(
+                create=True, size=_block_size(size, buckets, width))
+            _format(self.block.buf, size, buckets, width)
+        else:
+            self.block = _attach(name)
+        self._map()
+        if self.owner:
+            for i in range(self.nbuckets):
+                self.buckets[i] = _NIL
+
+    # Build typed views over the block from the sizes in its header.
+    def _map(self):
+        buf = self.block.buf
+        self.header = header = buf[:8 * _HEADER].cast("q")
+        size = self.size = header[_HSIZE]
+        buckets = self.nbuckets = header[_HBUCKETS]
+        width = self.width = header[_HWIDTH]
+        offset = 8 * _HEADER
+        self.keys = buf[offset:offset + 8 * size].cast("q")
+        offset += 8 * size
+        self.prev = buf[offset:offset + 4 * size].cast("i")
+        offset += 4 * size
+        self.next = buf[offset:offset + 4 * size].cast("i")
+        offset += 4 * size
+        self.chain = buf[offset:offset + 4 * size].cast("i")
+        offset += 4 * size
+        self.buckets = buf[offset:offset + 4 * buckets].cast("i")
+        offset += 4 * buckets
+        self.values = buf[offset:offset + size * (width + 1)]
+
+    def __getstate__(self):
+        return {"data": self.data, "name": self.block.name,
+                "lock": self.lock}
+
+    def __setstate__(self, state):
+        self.__init__(state["data"], name=state["name"],
+                      lock=state["lock"])
+
+    def close(self):
+        for view in (self.header, self.keys, self.prev, self.next,
+                     self.chain, self.buckets, self.values):
+            view.release()
+        self.block.close()
+
+    # Remove the block once every process has closed it. Only the
+    # creating process should call this.
+    def unlink(self):
+        self.block.unlink()
+
+    def get_cache_hit_count(self):
+        return self.header[_HHITS]
+
+    def get_memory_request_count(self):
+        return self.header[_HMISSES]
+
+    def contains(self, address):
+        with self.lock:
+            return self._find(address) != _NIL
+
+    def get_occupancy(self):
+        return self.header[_HCOUNT]
+
+    # The following helpers must be called with the lock held.
+
+    def _find(self, address):
+        keys = self.keys
+        chain = self.chain
+        slot = self.buckets[address % self.nbuckets]
+        while slot != _NIL and keys[slot] != address:
+            slot = chain[slot]
+        return slot
+
+    def _unlink(self, slot):
+        prev = self.prev[slot]
+        next = self.next[slot]
+        if prev == _NIL:
+            self.header[_HHEAD] = next
+        else:
+            self.next[prev] = next
+        if next == _NIL:
+            self.header[_HTAIL] = prev
+        else:
+            self.prev[next] = prev
+
+    def _push_front(self, slot):
+        head = self.header[_HHEAD]
+        self.prev[slot] = _NIL
+        self.next[slot] = head
+        if head == _NIL:
+            self.header[_HTAIL] = slot
+        else:
+            self.prev[head] = slot
+        self.header[_HHEAD] = slot
+
+    def _unhash(self, slot):
+        bucket = self.keys[slot] % self.nbuckets
+        current = self.buckets[bucket]
+        if current == slot:
+            self.buckets[bucket] = self.chain[slot]
+            return
+        while self.chain[current] != slot:
+            current = self.chain[current]
+        self.chain[current] = self.chain[slot]
+
+    def _read(self, slot):
+        start = slot * (self.width + 1)
+        length = self.values[start]
+        return bytes(self.values[start + 1:start + 1 + length]).decode()
+
+    def _write(self, slot, encoded):
+        start = slot * (self.width + 1)
+        self.values[start] = len(encoded)
+        self.values[start + 1:start + 1 + len(encoded)] = encoded
+
+    # Free slot, moving the entry in the last used slot into it so the
+    # used slots stay 0 to count - 1.
+    def _drop(self, slot):
+        self._unlink(slot)
+        self._unhash(slot)
+        last = self.header[_HCOUNT] - 1
+        self.header[_HCOUNT] = last
+        if slot == last:
+            return
+        prev = self.prev[last]
+        next = self.next[last]
+        self._unlink(last)
+        self._unhash(last)
+        address = self.keys[slot] = self.keys[last]
+        start = last * (self.width + 1)
+        self._write(slot, self.values[start + 1:start + 1
+                                      + self.values[start]])
+        bucket = address % self.nbuckets
+        self.chain[slot] = self.buckets[bucket]
+        self.buckets[bucket] = slot
+        self.prev[slot] = prev
+        self.next[slot] = next
+        if prev == _NIL:
+            self.header[_HHEAD] = slot
+        else:
+            self.next[prev] = slot
+        if next == _NIL:
+            self.header[_HTAIL] = slot
+        else:
+            self.prev[next] = slot
+
+    def _insert(self, address, encoded):
+        header = self.header
+        if header[_HCOUNT] < self.size:
+            slot = header[_HCOUNT]
+            header[_HCOUNT] = slot + 1
+        else:
+            slot = header[_HTAIL]
+            self._unlink(slot)
+            self._unhash(slot)
+        self.keys[slot] = address
+        bucket = address % self.nbuckets
+        self.chain[slot] = self.buckets[bucket]
+        self.buckets[bucket] = slot
+        self._write(slot, encoded)
+        self._push_front(slot)
+
+    def remove(self, address):
+        with self.lock:
+            slot = self._find(address) if self.size > 0 else _NIL
+            if slot == _NIL:
+                return False
+            self._drop(slot)
+            return True
+
+    # A value that can't be held replaces the cached one by dropping
+    # the entry, rather than leaving the old value cached.
+    def _set(self, address, value):
+        encoded = value.encode() if isinstance(value, str) else None
+        with self.lock:
+            slot = self._find(address) if self.size > 0 else _NIL
+            if slot == _NIL:
+                return
+            if encoded is None or len(encoded) > self.width:
+                self._drop(slot)
+            else:
+                self._write(slot, encoded)
+
+    def lookup(self, address):
+        with self.lock:
+            slot = self._find(address) if self.size > 0 else _NIL
+            if slot != _NIL:
+                if self.header[_HHEAD] != slot:
+                    self._unlink(slot)
+                    self._push_front(slot)
+                self.header[_HHITS] += 1
+                self.cache_hit_flag = True
+                return self._read(slot)
+
+        data = super().lookup(address)
+        self.cache_hit_flag = False
+        encoded = data.encode() if isinstance(data, str) else None
+        with self.lock:
+            self.header[_HMISSES] += 1
+            if encoded is None or len(encoded) > self.width \
+                    or self.size <= 0:
+                return data
+            # Another process may have cached it while we were reading
+            slot = self._find(address)
+            if slot == _NIL:
+                self._insert(address, encoded)
+            elif self.header[_HHEAD] != slot:
+                self._unlink(slot)
+                self._push_front(slot)
+        return data
+
+    def lookup_many(self, addresses):
+        return self._lookup_each(addresses)
@@ -0,0 +1,357 @@
+import sys
+import time
+import argparse
+from collections import OrderedDict
+import tracebin
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Offline simulators for whole traces held as NumPy integer arrays.
+# Each returns a boolean hit vector, one entry per access, matching
+# exactly what the object-based cache of the same size would report
+# through get_cache_hit_flag() after each lookup. counters() turns a
+# hit vector into the final counters. Traces are read a chunk at a
+# time, so a memory-mapped trace is never copied whole.
+#
+# LRU at a single size is a plain OrderedDict pass over the trace,
+# which needs none of the bookkeeping of LRUCache and takes about half
+# the time per access of LRUCache.lookup_many. The vectorised path is
+# for many sizes at once. The stack distance of an access (see mrc.py)
+# is 1 plus the number of accesses j strictly between it and the
+# previous access p to the same address whose own previous access is
+# before p. Those dominance counts are computed for every access at
+# once over dyadic blocks of positions, one sort and one searchsorted
+# per level, so a chunk of n accesses costs O(n log^2 n) inside NumPy.
+# Long traces go through in chunks: each chunk is prefixed with the
+# carried LRU stack (addresses in order of last use), which gives the
+# same stack distances as the full history. lru_hit_counts() turns one
+# set of distances into the hit counts for every size.
+#
+# Cyclic eviction depends on the running miss count: the entry
+# inserted by miss k is overwritten by miss k + size, so an access hits
+# if its address was inserted by miss k and at most size misses have
+# happened since. Caches of at least VECTOR_SIZE entries are simulated
+# size accesses at a time. No entry inserted within such a chunk can be
+# overwritten before the chunk ends, so every repeat within it hits and
+# the first access to an address missing at the start misses. What is
+# left is when each entry resident at the start is overwritten, which
+# depends on the misses before it. That is found by fixed point
+# iteration, starting from the misses already known: each round can
+# only add misses or move them earlier, and settles on the exact
+# answer, usually within a few rounds. A chunk that takes more than
+# ROUNDS (each overwrite setting off the next, as in a loop just bigger
+# than the cache) is finished by the loop used for smaller caches.
+
+CHUNK = 1 << 13
+VECTOR_SIZE = 2048
+ROUNDS = 16
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("simulate.py needs NumPy")
+
+
+# Position of the previous access to the same address, or -1.
+def previous_access(trace):
+    order = np.argsort(trace, kind="stable")
+    previous = np.full(len(trace), -1, dtype=np.int64)
+    same = trace[order[1:]] == trace[order[:-1]]
+    previous[order[1:][same]] = order[:-1][same]
+    return previous
+
+
+# Stack distances for one in-memory block of accesses, 0 for the first
+# access to each address.
+def _block_distances(trace):
+    n = len(trace)
+    previous = previous_access(trace)
+    queries = np.nonzero(previous >= 0)[0]
+    before = previous[queries]
+    # Entry j is counted for query i when j < i and keys[j] <= before.
+    # Queries at both ends of each window: ends[i] and before + 1,
+    # with weights +1 and -1.
+    keys = previous + 1
+    ends = np.concatenate((queries, before + 1))
+    limits = np.concatenate((before, before)) + 1
+    signs = np.concatenate((np.ones(len(queries), dtype=np.int64),
+                            np.full(len(queries), -1, dtype=np.int64)))
+    owners = np.concatenate((np.arange(len(queries)),
+                             np.arange(len(queries))))
+    value_bits = n.bit_length()
+    index_bits = (2 * len(ends)).bit_length()
+    index_mask = (1 << index_bits) - 1
+    # Keys and probes are normally sorted together, with a tag bit
+    # below the value (probes 0, keys 1, so a probe sorts before equal
+    # keys) and the probe's index in the lowest bits; the running count
+    # of keys then gives, at each probe, the number of keys below it.
+    # Blocks too long to pack that way fall back to searchsorted.
+    packed = 2 * value_bits + 1 + index_bits <= 63
+    positions = np.arange(n, dtype=np.int64)
+    counts = np.zeros(len(queries), dtype=np.int64)
+    shift = index_bits + 1
+    tagged_keys = (keys << 1 | 1) << index_bits
+    level = 0
+    while (1 << level) <= n:
+        # [0, end) takes in the whole block to the left of end's block
+        # at this level exactly when bit level of end is set
+        chosen = np.nonzero((ends >> level) & 1)[0]
+        block = ((ends[chosen] >> level) - 1) << value_bits
+        probes = np.concatenate((block | limits[chosen], block))
+        if packed:
+            merged = np.concatenate((
+                ((positions >> level) << (value_bits + shift))
+                | tagged_keys,
+                (probes << shift) | np.arange(len(probes))))
+            merged.sort()
+            is_key = (merged >> index_bits) & 1
+            below = np.cumsum(is_key)
+            at_probe = is_key == 0
+            found = np.empty(len(probes), dtype=np.int64)
+            found[merged[at_probe] & index_mask] = below[at_probe]
+        else:
+            level_keys = ((positions >> level) << value_bits) | keys
+            found = np.searchsorted(np.sort(level_keys), probes)
+        m = len(chosen)
+        counts += np.bincount(
+            owners[chosen], weights=signs[chosen] * (found[:m] - found[m:]),
+            minlength=len(queries)).astype(np.int64)
+        level += 1
+    distances = np.zeros(n, dtype=np.int64)
+    distances[queries] = counts + 1
+    return distances
+
+
+# The addresses of trace in order of last access, oldest first, at
+# most depth of them (all if depth is None).
+def _lru_stack(trace, depth=None):
+    reverse = trace[::-1]
+    addresses, first = np.unique(reverse, return_index=True)
+    stack = addresses[np.argsort(-first, kind="stable")]
+    if depth is not None:
+        stack = stack[max(len(stack) - depth, 0):] if depth > 0 \
+            else stack[:0]
+    return stack
+
+
+# Stack distance of every access in trace, 0 for a first access. With
+# depth set, distances beyond depth may also be reported as 0, which
+# keeps the carried stack (and so each chunk) small. Chunks are at
+# least chunk accesses and at least three times the carried stack.
+def lru_distances(trace, depth=None, chunk=CHUNK):
+    _require_numpy()
+    trace = np.asarray(trace, dtype=np.int64)
+    distances = np.empty(len(trace), dtype=np.int64)
+    stack = trace[:0]
+    start = 0
+    while start < len(trace):
+        end = start + max(chunk, 3 * len(stack))
+        block = np.concatenate((stack, trace[start:end]))
+        found = _block_distances(block)[len(stack):]
+        if depth is not None:
+            found[found > depth] = 0
+        distances[start:start + len(found)] = found
+        stack = _lru_stack(block, depth)
+        start = end
+    return distances
+
+
+def simulate_lru(trace, size, chunk=CHUNK):
+    _require_numpy()
+    trace = np.asarray(trace)
+    hits = bytearray(len(trace))
+    if size > 0:
+        cache = OrderedDict()
+        for start in range(0, len(trace), chunk):
+            for i, address in enumerate(trace[start:start + chunk].tolist(),
+                                        start):
+                if address in cache:
+                    cache.move_to_end(address)
+                    hits[i] = 1
+                else:
+                    cache[address] = None
+                    if len(cache) > size:
+                        cache.popitem(last=False)
+    return np.frombuffer(hits, dtype=bool)
+
+
+# LRU hit counts for every size in sizes, from one set of distances.
+def lru_hit_counts(trace, sizes, chunk=CHUNK):
+    distances = lru_distances(trace, depth=max(sizes, default=0),
+                              chunk=chunk)
+    histogram = np.bincount(distances)
+    histogram[0] = 0
+    curve = np.cumsum(histogram)
+    return {size: int(curve[min(size, len(curve) - 1)]) if size > 0
+            else 0 for size in sizes}
+
+
+# Cyclic hits for accesses, continuing from inserted (address -> the
+# miss that inserted it) after misses misses. Updates inserted and
+# returns the hits and the new miss count.
+def _cyclic_loop(accesses, size, inserted, misses):
+    hits = bytearray(len(accesses))
+    for i, address in enumerate(accesses.tolist()):
+        k = inserted.get(address)
+        if k is not None and misses - k <= size:
+            hits[i] = 1
+        else:
+            inserted[address] = misses
+            misses += 1
+    return np.frombuffer(hits, dtype=bool), misses
+
+
+# The addresses of chunk in sorted order, and the position each came
+# from, ties in position order. Positions are packed below the
+# addresses where they fit, as sorting one array is much quicker than
+# a stable argsort.
+def _sort_chunk(chunk):
+    n = len(chunk)
+    bits = n.bit_length()
+    low = int(chunk.min())
+    if int(chunk.max()) - low < 1 << (62 - bits):
+        packed = np.sort(((chunk - low) << bits) | np.arange(n))
+        return packed & ((1 << bits) - 1), (packed >> bits) + low
+    order = np.argsort(chunk, kind="stable")
+    return order, chunk[order]
+
+
+# Cyclic misses for one chunk of at most size accesses, given the
+# resident addresses (sorted) and the misses that inserted them, or
+# None if the iteration doesn't settle within ROUNDS.
+def _cyclic_chunk(chunk, size, addresses, inserted, misses):
+    n = len(chunk)
+    order, ordered = _sort_chunk(chunk)
+    repeat = ordered[1:] == ordered[:-1]
+    # Previous access to the same address in the chunk, or itself
+    previous = np.arange(n)
+    previous[order[1:][repeat]] = order[:-1][repeat]
+    first = previous == np.arange(n)
+    index = np.searchsorted(addresses, ordered)
+    found = index < len(addresses)
+    found[found] = addresses[index[found]] == ordered[found]
+    resident = np.zeros(n, dtype=bool)
+    resident[order[found]] = True
+    # A resident entry survives up to this many misses in the chunk
+    limit = np.zeros(n, dtype=np.int64)
+    limit[order[found]] = inserted[index[found]] + (size - misses)
+    known = first & ~resident
+    missed = known
+    for _ in range(ROUNDS):
+        before = np.cumsum(missed)
+        before -= missed
+        overwritten = resident & (before > limit)
+        update = known | (overwritten & (first | ~overwritten[previous]))
+        if np.array_equal(update, missed):
+            return missed
+        missed = update
+    return None
+
+
+def _cyclic_vector(trace, size):
+    hits = np.zeros(len(trace), dtype=bool)
+    addresses = np.zeros(0, dtype=np.int64)
+    inserted = np.zeros(0, dtype=np.int64)
+    misses = 0
+    for start in range(0, len(trace), size):
+        chunk = np.asarray(trace[start:start + size], dtype=np.int64)
+        missed = _cyclic_chunk(chunk, size, addresses, inserted, misses)
+        if missed is None:
+            resident = dict(zip(addresses.tolist(), inserted.tolist()))
+            chunk_hits, _ = _cyclic_loop(chunk, size, resident, misses)
+            missed = ~chunk_hits
+        hits[start:start + len(chunk)] = ~missed
+        # Each address misses at most once in a chunk
+        new = chunk[missed]
+        new_inserted = misses + np.arange(len(new))
+        misses += len(new)
+        addresses = np.concatenate((addresses, new))
+        inserted = np.concatenate((inserted, new_inserted))
+        keep = inserted >= misses - size
+        addresses = addresses[keep]
+        inserted = inserted[keep]
+        # Two sorted runs, merged
+        order = np.argsort(addresses, kind="stable")
+        addresses = addresses[order]
+        inserted = inserted[order]
+    return hits
+
+
+# With vectorise None, caches of VECTOR_SIZE entries or more take the
+# vectorised path.
+def simulate_cyclic(trace, size, chunk=CHUNK, vectorise=None):
+    _require_numpy()
+    trace = np.asarray(trace)
+    if size <= 0:
+        return np.zeros(len(trace), dtype=bool)
+    if vectorise is None:
+        vectorise = size >= VECTOR_SIZE
+    if vectorise:
+        return _cyclic_vector(trace, size)
+    hits = np.zeros(len(trace), dtype=bool)
+    inserted = {}
+    misses = 0
+    for start in range(0, len(trace), chunk):
+        hits[start:start + chunk], misses = _cyclic_loop(
+            trace[start:start + chunk], size, inserted, misses)
+        # Forget entries that have been overwritten
+        if len(inserted) > 2 * size + chunk:
+            inserted = {address: k for address, k in inserted.items()
+                        if misses - k <= size}
+    return hits
+
+
+SIMULATORS = {
+    "Cyclic": simulate_cyclic,
+    "LRU": simulate_lru,
+}
+
+
+# Final counters for a hit vector, as the caches report them.
+def counters(hits):
+    cache_hits = int(np.count_nonzero(hits))
+    return {"cache_hits": cache_hits,
+            "memory_requests": len(hits) - cache_hits}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Simulate a cache over a whole trace with NumPy')
+    parser.add_argument('-s', '--strategy', default='LRU',
+                        choices=sorted(SIMULATORS))
+    parser.add_argument('-c', '--cache-size', type=int, default=5)
+    parser.add_argument('-i', '--input',
+                        help='read the trace from this file instead of '
+                        'stdin (memory-mapped if binary)')
+    parser.add_argument('-b', '--binary', action='store_true',
+                        help='trace is packed little-endian ints')
+    parser.add_argument('-w', '--width', type=int, default=4,
+                        help='bytes per address in a binary trace')
+    args = parser.parse_args()
+    _require_numpy()
+
+    if args.binary and args.input:
+        trace = np.asarray(tracebin.map_binary(args.input, args.width))
+    else:
+        source = open(args.input, 'rb') if args.input \
+            else sys.stdin.buffer
+        if args.binary:
+            batches = tracebin.iter_binary(source, args.width)
+        else:
+            batches = tracebin.iter_text(source)
+        trace = np.concatenate([np.asarray(batch, dtype=np.int64)
+                                for batch in batches]
+                               or [np.zeros(0, dtype=np.int64)])
+
+    start = time.perf_counter()
+    hits = SIMULATORS[args.strategy](trace, args.cache_size)
+    elapsed = time.perf_counter() - start
+    result = counters(hits)
+    print(f"Model: {args.strategy} ({args.cache_size} entries)")
+    print(f"{len(hits)} Accesses")
+    print(f"{result['memory_requests']} Memory Hits")
+    print(f"{result['cache_hits']} Cache Hits")
+    print(f"{elapsed:.3f}s")
@@ -1,6 +1,36 @@
 from memory import Memory
 from cache import Cache, CyclicCache, LRUCache, MRUCache, LFUCache
+from cache import CompactLRUCache, CompactMRUCache, unpack_flags
+from cache import ARCCache, SLRUCache, TwoQCache
+from cache import ClockCache, ClockProCache, OPTCache, CacheMemory
+from async_cache import AsyncCache
+from sharded_cache import ShardedCache
+from shared_cache import SharedLRUCache
+from tinylfu import TinyLFUCache, CountMinSketch
+from expiry import ExpiringCache
+from metrics import InstrumentedCache, Metrics, Histogram, TimedMemory
+from hierarchy import HierarchyCache, MODES
+from disk_cache import DiskLRUCache, snapshot, restore
+from prefetch import PrefetchingCache, StreamDetector
+from memoize import cached
+import memoize
+import mrc
+import simulate
 import utilities
+import traces
+import benchmark
+import tracebin
+import tempfile
+import functools
+import hashlib
+import io
+import os
+import asyncio
+import multiprocessing
+import random
+import sys
+import threading
+import time
 import unittest
 
 # A collection of basic unit tests for caching. These tests will check
@@ -261,6 +291,2004 @@ class TestCaseMultipleLookup(BasicTestCase):
         self.caching_check(self.lfu, 0)
 
 
+class TestCaseLFUTieBreak(BasicTestCase):
+
+    # Fill the cache, then request 1 after 2 so that both have a
+    # frequency of two. Ties on frequency evict the least recently
+    # requested entry, which is now 2 rather than 1.
+    def test_lfu_tie_break(self):
+        for loc in range(1, 6):
+            self.lfu.lookup(loc)
+        self.lfu.lookup(2)
+        self.lfu.lookup(1)
+        for loc in (3, 4, 5):
+            self.lfu.lookup(loc)
+        # All five entries now have frequency two, least recent is 2
+        self.lfu.lookup(6)
+        hits = self.lfu.get_cache_hit_count()
+        self.lfu.lookup(1)
+        self.assertEqual(hits + 1, self.lfu.get_cache_hit_count())
+        self.lfu.lookup(2)
+        self.assertFalse(self.lfu.get_cache_hit_flag())
+
+    # A single lookup after a hit should reset the hit flag.
+    def test_lfu_flag_reset(self):
+        self.lfu.lookup(1)
+        self.lfu.lookup(1)
+        self.assertTrue(self.lfu.get_cache_hit_flag())
+        self.lfu.lookup(2)
+        self.assertFalse(self.lfu.get_cache_hit_flag())
+
+
+class TestCaseCyclicSlots(BasicTestCase):
+
+    # Once the five slots are full, each miss overwrites the next slot
+    # in turn, starting again from the first.
+    def test_cyclic_rotation(self):
+        for loc in range(1, 6):
+            self.cyclic.lookup(loc)
+        self.cyclic.lookup(6)
+        self.cyclic.lookup(2)
+        self.assertTrue(self.cyclic.get_cache_hit_flag())
+        self.cyclic.lookup(1)
+        self.assertFalse(self.cyclic.get_cache_hit_flag())
+        # 1 went into the slot holding 2
+        self.cyclic.lookup(2)
+        self.assertFalse(self.cyclic.get_cache_hit_flag())
+        self.assertEqual(self.cyclic.get_memory_request_count(), 8)
+
+
+class TestCaseLookupMany(unittest.TestCase):
+
+    # A fixed trace with repeats, reuse after eviction and a scan.
+    trace = [0, 1, 2, 0, 3, 4, 5, 1, 6, 0, 0, 7, 2, 8, 9, 1, 3, 3,
+             10, 11, 12, 13, 14, 15, 0, 1, 2, 0, 5, 5, 4, 16, 1]
+
+    # lookup_many should return the same values, hits and counters as
+    # calling lookup once per address on a fresh instance.
+    def batch_check(self, cls):
+        data = utilities.sample_data(size=100)
+        single = cls(data)
+        batch = cls(data)
+        values = []
+        flags = []
+        for address in self.trace:
+            values.append(single.lookup(address))
+            flags.append(single.get_cache_hit_flag())
+        batch_values, bitmap = batch.lookup_many(iter(self.trace))
+        self.assertEqual(values, batch_values)
+        self.assertEqual(flags, unpack_flags(bitmap, len(self.trace)))
+        self.assertEqual(len(bitmap), (len(self.trace) + 7) // 8)
+        self.assertEqual(single.get_cache_hit_count(),
+                         batch.get_cache_hit_count())
+        self.assertEqual(single.get_memory_request_count(),
+                         batch.get_memory_request_count())
+        self.assertEqual(single.get_cache_hit_flag(),
+                         batch.get_cache_hit_flag())
+        # Batches continue from the state left by earlier lookups
+        self.assertEqual(single.lookup(1), batch.lookup_many([1])[0][0])
+        self.assertEqual(single.get_cache_hit_count(),
+                         batch.get_cache_hit_count())
+
+    def test_default_cache(self):
+        self.batch_check(Cache)
+
+    def test_cyclic(self):
+        self.batch_check(CyclicCache)
+
+    def test_lru(self):
+        self.batch_check(LRUCache)
+
+    def test_mru(self):
+        self.batch_check(MRUCache)
+
+    def test_lfu(self):
+        self.batch_check(LFUCache)
+
+    def test_compact_lru(self):
+        self.batch_check(CompactLRUCache)
+
+    def test_compact_mru(self):
+        self.batch_check(CompactMRUCache)
+
+    def test_arc(self):
+        self.batch_check(ARCCache)
+
+    def test_slru(self):
+        self.batch_check(SLRUCache)
+
+    def test_2q(self):
+        self.batch_check(TwoQCache)
+
+    def test_clock(self):
+        self.batch_check(ClockCache)
+
+    def test_clock_pro(self):
+        self.batch_check(ClockProCache)
+
+
+# Memory with a fixed delay on every call, standing in for a backing
+# store where round trips dominate.
+class SlowMemory(Memory):
+    latency = 0.01
+
+    def lookup(self, address):
+        time.sleep(self.latency)
+        return super().lookup(address)
+
+    def lookup_many(self, addresses):
+        time.sleep(self.latency)
+        return super().lookup_many(addresses)
+
+
+class TestCaseBatchedMisses(unittest.TestCase):
+
+    trace = [0, 1, 2, 3, 4, 5, 6, 7, 0, 1, 8, 9, 2, 10, 11, 0]
+
+    # All misses in a batch should go to memory in one round trip,
+    # while request_count still counts every miss.
+    def batch_check(self, cls):
+        data = utilities.sample_data(size=100)
+        single = cls(data)
+        single.memory = SlowMemory(data)
+        batch = cls(data)
+        batch.memory = SlowMemory(data)
+        values = [single.lookup(address) for address in self.trace]
+        start = time.perf_counter()
+        batch_values, _ = batch.lookup_many(self.trace)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(values, batch_values)
+        self.assertEqual(single.get_memory_request_count(),
+                         batch.get_memory_request_count())
+        self.assertEqual(batch.get_memory_round_trip_count(), 1)
+        self.assertEqual(single.get_memory_round_trip_count(),
+                         single.get_memory_request_count())
+        self.assertLess(elapsed, 5 * SlowMemory.latency)
+        # Values fetched in bulk are held by the cache afterwards
+        hits = batch.get_cache_hit_count()
+        self.assertEqual(batch.lookup(0), values[0])
+        self.assertEqual(batch.get_cache_hit_count(), hits + 1)
+
+    def test_default_cache(self):
+        data = utilities.sample_data(size=100)
+        impl = Cache(data)
+        impl.memory = SlowMemory(data)
+        impl.lookup_many(self.trace)
+        self.assertEqual(impl.get_memory_request_count(), len(self.trace))
+        self.assertEqual(impl.get_memory_round_trip_count(), 1)
+
+    def test_cyclic(self):
+        self.batch_check(CyclicCache)
+
+    def test_lru(self):
+        self.batch_check(LRUCache)
+
+    def test_mru(self):
+        self.batch_check(MRUCache)
+
+    def test_lfu(self):
+        self.batch_check(LFUCache)
+
+    # A batch whose fetch fails should leave no placeholders behind and
+    # no hits counted, so later lookups go back to memory.
+    def test_failed_fetch(self):
+        data = utilities.sample_data(size=100)
+        for cls in (CyclicCache, LRUCache, MRUCache, LFUCache,
+                    CompactLRUCache, CompactMRUCache, ClockCache,
+                    ClockProCache):
+            with self.subTest(cls=cls.__name__):
+                impl = cls(data, 4)
+                impl.lookup(1)
+                impl.memory = FailingMemory(data)
+                with self.assertRaises(ConnectionError):
+                    impl.lookup_many([1, 2, 3, 2])
+                self.assertEqual(impl.get_cache_hit_count(), 0)
+                self.assertFalse(impl.contains(2))
+                self.assertFalse(impl.contains(3))
+                impl.memory = Memory(data)
+                self.assertEqual(impl.lookup(2), data[2])
+                self.assertFalse(impl.get_cache_hit_flag())
+                self.assertEqual(impl.lookup_many([3, 2])[0],
+                                 [data[3], data[2]])
+
+
+# Memory whose bulk fetches fail, like a backing store gone away.
+class FailingMemory(Memory):
+    def lookup_many(self, addresses):
+        raise ConnectionError("memory unavailable")
+
+
+# Async memory that counts requests and takes a little while to answer.
+class CountingAsyncMemory:
+    def __init__(self, data):
+        self.data = data
+        self.request_count = 0
+
+    def get_request_count(self):
+        return self.request_count
+
+    async def lookup(self, address):
+        self.request_count += 1
+        await asyncio.sleep(0.01)
+        return self.data[address]
+
+
+class TestCaseAsync(unittest.TestCase):
+
+    # Many coroutines missing on the same address should share a
+    # single fetch, and later lookups should hit the cache.
+    def single_flight_check(self, cls):
+        data = utilities.sample_data(size=100)
+        memory = CountingAsyncMemory(data)
+        impl = AsyncCache(cls(data), memory=memory)
+
+        async def run():
+            first = await asyncio.gather(*[impl.lookup(7)
+                                           for _ in range(20)])
+            second = await asyncio.gather(impl.lookup(7), impl.lookup(8))
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertEqual(first, [data[7]] * 20)
+        self.assertEqual(second, [data[7], data[8]])
+        self.assertEqual(memory.get_request_count(), 2)
+        self.assertEqual(impl.get_coalesced_count(), 19)
+        self.assertEqual(impl.get_cache_hit_count(), 1)
+
+    def test_lru(self):
+        self.single_flight_check(LRUCache)
+
+    def test_lfu(self):
+        self.single_flight_check(LFUCache)
+
+    def test_cyclic(self):
+        self.single_flight_check(CyclicCache)
+
+    # A failed fetch is raised in every waiting coroutine and is not
+    # cached, so the next lookup tries again.
+    def test_fetch_error(self):
+        data = utilities.sample_data(size=10)
+        memory = CountingAsyncMemory(data)
+        impl = AsyncCache(LRUCache(data), memory=memory)
+
+        async def run():
+            return await asyncio.gather(impl.lookup(50), impl.lookup(50),
+                                        return_exceptions=True)
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(r, IndexError) for r in results))
+        self.assertEqual(memory.get_request_count(), 1)
+        self.assertEqual(asyncio.run(impl.lookup(5)), data[5])
+        self.assertFalse(impl.get_cache_hit_flag())
+
+    # Cancelling the coroutine making a fetch should not cancel the
+    # ones waiting on it: one of them fetches the value instead.
+    def test_leader_cancelled(self):
+        data = utilities.sample_data(size=10)
+        memory = CountingAsyncMemory(data)
+        impl = AsyncCache(LRUCache(data), memory=memory)
+
+        async def run():
+            leader = asyncio.ensure_future(impl.lookup(4))
+            await asyncio.sleep(0)
+            followers = [asyncio.ensure_future(impl.lookup(4))
+                         for _ in range(3)]
+            await asyncio.sleep(0)
+            leader.cancel()
+            values = await asyncio.gather(*followers)
+            return leader.cancelled(), values
+
+        cancelled, values = asyncio.run(run())
+        self.assertTrue(cancelled)
+        self.assertEqual(values, [data[4]] * 3)
+        self.assertEqual(memory.get_request_count(), 2)
+        self.assertEqual(impl.get_coalesced_count(), 2)
+        self.assertEqual(asyncio.run(impl.lookup(4)), data[4])
+        self.assertTrue(impl.get_cache_hit_flag())
+
+    # Dirty entries evicted by misses are still written back to the
+    # strategy's own Memory.
+    def test_write_back(self):
+        data = utilities.sample_data(size=10)
+        strategy = LRUCache(data, 2, write_back=True)
+        backing = strategy.memory
+        impl = AsyncCache(strategy, memory=CountingAsyncMemory(data))
+        strategy.store(1, "one")
+
+        async def run():
+            for address in (2, 3, 4):
+                await impl.lookup(address)
+
+        asyncio.run(run())
+        self.assertFalse(strategy.contains(1))
+        self.assertEqual(backing.get_write_count(), 1)
+        self.assertEqual(strategy.get_dirty_count(), 0)
+
+    # Without an explicit memory the strategy's own Memory is used.
+    def test_default_memory(self):
+        data = utilities.sample_data(size=10)
+        impl = AsyncCache(LRUCache(data))
+        self.assertEqual(asyncio.run(impl.lookup(3)), data[3])
+        self.assertEqual(impl.get_memory_request_count(), 1)
+
+
+class TestCaseSharded(unittest.TestCase):
+
+    threads = 16
+    lookups = 2000
+
+    # Walk a shard's linked list in both directions and check that it
+    # agrees with the shard's dict.
+    def check_list(self, shard):
+        forward = []
+        node = shard.head.next
+        while node is not shard.tail:
+            self.assertIs(node.next.prev, node)
+            forward.append(node.key)
+            node = node.next
+        backward = []
+        node = shard.tail.prev
+        while node is not shard.head:
+            backward.append(node.key)
+            node = node.prev
+        self.assertEqual(forward, backward[::-1])
+        self.assertEqual(sorted(forward), sorted(shard.cache))
+        self.assertLessEqual(len(forward), shard.size)
+
+    # Hammer one instance from many threads with a tiny switch
+    # interval, then check every list and that hits plus memory
+    # requests account for every lookup.
+    def stress_check(self, strategy):
+        data = utilities.sample_data(size=100)
+        impl = ShardedCache(data, size=20, shards=4, strategy=strategy)
+        errors = []
+        flags = {}
+
+        def worker(seed):
+            rng = random.Random(seed)
+            for _ in range(self.lookups):
+                address = rng.randrange(100)
+                if impl.lookup(address) != data[address]:
+                    errors.append(address)
+            impl.lookup(0)
+            impl.lookup(0)
+            flags[seed] = impl.get_cache_hit_flag()
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            workers = [threading.Thread(target=worker, args=(seed,))
+                       for seed in range(self.threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        self.assertEqual(errors, [])
+        total = self.threads * (self.lookups + 2)
+        self.assertEqual(impl.get_cache_hit_count()
+                         + impl.get_memory_request_count(), total)
+        for shard in impl.shards:
+            self.check_list(shard)
+        # Each thread saw its own hit flag, not another thread's
+        self.assertEqual(len(flags), self.threads)
+
+    def test_lru(self):
+        self.stress_check(LRUCache)
+
+    def test_mru(self):
+        self.stress_check(MRUCache)
+
+    # Sizes are split across shards and stats are summed.
+    def test_split_and_batch(self):
+        data = utilities.sample_data(size=100)
+        impl = ShardedCache(data, size=10, shards=3, strategy=LFUCache)
+        self.assertEqual([shard.size for shard in impl.shards], [4, 3, 3])
+        trace = [1, 2, 3, 1, 2, 3, 4]
+        values, bitmap = impl.lookup_many(trace)
+        self.assertEqual(values, [data[a] for a in trace])
+        self.assertEqual(unpack_flags(bitmap, len(trace)),
+                         [False] * 3 + [True] * 3 + [False])
+        self.assertEqual(impl.get_cache_hit_count(), 3)
+        self.assertEqual(impl.get_memory_request_count(), 4)
+        self.assertFalse(impl.get_cache_hit_flag())
+        impl.lookup(4)
+        self.assertTrue(impl.get_cache_hit_flag())
+
+    # Strategies without a write back mode still make shards.
+    def test_write_through_strategies(self):
+        data = utilities.sample_data(size=100)
+        for strategy in (TinyLFUCache, ExpiringCache):
+            impl = ShardedCache(data, size=40, shards=4, strategy=strategy)
+            for address in (1, 2, 1, 2):
+                self.assertEqual(impl.lookup(address), data[address])
+            self.assertEqual(impl.get_cache_hit_count(), 2)
+
+    # A hit in one thread doesn't change the flag seen by another.
+    def test_thread_flags(self):
+        data = utilities.sample_data(size=100)
+        impl = ShardedCache(data, size=10, shards=2)
+        impl.lookup(5)
+        thread = threading.Thread(target=impl.lookup, args=(5,))
+        thread.start()
+        thread.join()
+        self.assertEqual(impl.get_cache_hit_count(), 1)
+        self.assertFalse(impl.get_cache_hit_flag())
+
+
+# Runs in a separate process against a SharedLRUCache passed in from
+# the parent. Reports any wrong values through the queue.
+def shared_worker(impl, seed, lookups, results):
+    rng = random.Random(seed)
+    wrong = 0
+    for _ in range(lookups):
+        address = rng.randrange(40)
+        if impl.lookup(address) != utilities.mangle(address):
+            wrong += 1
+    impl.close()
+    results.put(wrong)
+
+
+class TestCaseSharedMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.data = utilities.sample_data(size=100)
+        self.impl = SharedLRUCache(self.data, size=20)
+
+    def tearDown(self):
+        self.impl.close()
+        self.impl.unlink()
+
+    # Check the recency list and hash chains in the shared block.
+    def check_block(self, impl):
+        seen = []
+        slot = impl.header[2]
+        while slot != -1:
+            seen.append(impl.keys[slot])
+            slot = impl.next[slot]
+        self.assertEqual(len(seen), impl.header[1])
+        self.assertEqual(len(set(seen)), len(seen))
+        for address in seen:
+            self.assertTrue(impl.contains(address))
+
+    # Same behaviour as LRUCache in a single process.
+    def test_matches_lru(self):
+        lru = LRUCache(self.data, size=20)
+        rng = random.Random(1)
+        for _ in range(500):
+            address = rng.randrange(40)
+            self.assertEqual(self.impl.lookup(address), lru.lookup(address))
+            self.assertEqual(self.impl.get_cache_hit_flag(),
+                             lru.get_cache_hit_flag())
+        self.assertEqual(self.impl.get_cache_hit_count(),
+                         lru.get_cache_hit_count())
+        self.assertEqual(self.impl.get_memory_request_count(),
+                         lru.get_memory_request_count())
+        self.check_block(self.impl)
+
+    # Several processes share one cache: entries warmed by the parent
+    # are hits in the children and the counters cover every process.
+    def test_processes(self):
+        for address in range(20):
+            self.impl.lookup(address)
+        processes = 4
+        lookups = 500
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(
+                       target=shared_worker,
+                       args=(self.impl, seed, lookups, results))
+                   for seed in range(processes)]
+        for worker in workers:
+            worker.start()
+        wrong = [results.get(timeout=30) for _ in workers]
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(wrong, [0] * processes)
+        self.assertEqual(self.impl.get_cache_hit_count()
+                         + self.impl.get_memory_request_count(),
+                         20 + processes * lookups)
+        self.assertGreater(self.impl.get_cache_hit_count(), 0)
+        self.check_block(self.impl)
+
+    # Stores update resident entries in place; a value too wide to hold
+    # drops the entry instead. Removing keeps the block consistent.
+    def test_store(self):
+        lru = LRUCache(self.data, size=20)
+        for address in range(20):
+            self.impl.lookup(address)
+            lru.lookup(address)
+        for impl in (self.impl, lru):
+            impl.store(5, "five")
+            impl.remove(3)
+            impl.remove(19)
+        self.assertEqual(self.impl.lookup(5), "five")
+        self.impl.store(7, "far too wide")
+        self.assertFalse(self.impl.contains(7))
+        self.assertEqual(self.impl.get_occupancy(), 17)
+        self.check_block(self.impl)
+        self.assertEqual(self.impl.lookup(7), "far too wide")
+        self.assertFalse(self.impl.contains(7))
+        self.impl.store(7, "seven")
+        lru.remove(7)
+        lru.lookup(5)
+        rng = random.Random(2)
+        for _ in range(300):
+            address = rng.randrange(40)
+            self.assertEqual(self.impl.lookup(address), lru.lookup(address))
+            self.assertEqual(self.impl.get_cache_hit_flag(),
+                             lru.get_cache_hit_flag())
+        self.check_block(self.impl)
+
+
+class TestCaseCompact(unittest.TestCase):
+
+    # The array-backed caches should evict in exactly the same order
+    # as the Node-based ones, leaving the same entries resident.
+    def order_check(self, reference_cls, compact_cls):
+        data = utilities.sample_data(size=100)
+        rng = random.Random(3)
+        for size in (1, 2, 5, 13):
+            reference = reference_cls(data, size)
+            compact = compact_cls(data, size)
+            for _ in range(400):
+                address = rng.randrange(30)
+                self.assertEqual(reference.lookup(address),
+                                 compact.lookup(address))
+                self.assertEqual(reference.get_cache_hit_flag(),
+                                 compact.get_cache_hit_flag())
+            self.assertEqual(sorted(reference.cache),
+                             [a for a in range(30) if compact.contains(a)])
+            self.assertEqual(reference.get_memory_request_count(),
+                             compact.get_memory_request_count())
+
+    def test_lru(self):
+        self.order_check(LRUCache, CompactLRUCache)
+
+    def test_mru(self):
+        self.order_check(MRUCache, CompactMRUCache)
+
+    # Removals and evictions keep the address table consistent, for
+    # strided, negative and colliding addresses too.
+    def test_remove(self):
+        rng = random.Random(6)
+        universe = [n * 97 for n in range(-10, 30)] + list(range(20))
+        data = {address: str(address) for address in universe}
+        for reference_cls, compact_cls in ((LRUCache, CompactLRUCache),
+                                           (MRUCache, CompactMRUCache)):
+            reference = reference_cls(data, 13)
+            compact = compact_cls(data, 13)
+            for _ in range(3000):
+                address = rng.choice(universe)
+                action = rng.random()
+                if action < 0.1:
+                    self.assertEqual(compact.remove(address),
+                                     reference.remove(address))
+                elif action < 0.15:
+                    self.assertEqual(compact.evict(), reference.evict())
+                else:
+                    self.assertEqual(compact.lookup(address),
+                                     reference.lookup(address))
+                    self.assertEqual(compact.get_cache_hit_flag(),
+                                     reference.get_cache_hit_flag())
+            self.assertEqual(
+                [a for a in universe if compact.contains(a)],
+                [a for a in universe if reference.contains(a)])
+            self.assertEqual(compact.get_occupancy(),
+                             reference.get_occupancy())
+
+    # A full cache reuses its slots rather than growing.
+    def test_slot_reuse(self):
+        impl = CompactLRUCache(utilities.sample_data(size=100), 5)
+        for address in range(50):
+            impl.lookup(address)
+        self.assertEqual(impl.used, 5)
+        self.assertEqual(sorted(impl.keys), [45, 46, 47, 48, 49])
+
+
+class TestCaseTraces(unittest.TestCase):
+
+    # Every generator gives n in-range addresses and repeats itself
+    # for the same seed.
+    def test_generators(self):
+        for kind, generate in traces.GENERATORS.items():
+            trace = generate(500, 50, seed=4)
+            self.assertEqual(len(trace), 500, kind)
+            self.assertTrue(all(0 <= a < 50 for a in trace), kind)
+            self.assertEqual(trace, generate(500, 50, seed=4), kind)
+
+    # Higher skew concentrates accesses on the lowest addresses.
+    def test_zipf_skew(self):
+        flat = traces.zipf(5000, 100, skew=0.0, seed=1)
+        steep = traces.zipf(5000, 100, skew=1.5, seed=1)
+        self.assertGreater(steep.count(0), 3 * flat.count(0))
+
+    # A tiny suite run reports every combination with counters that
+    # add up.
+    def test_suite_report(self):
+        report = benchmark.run_suite(kinds=["loop", "zipf"],
+                                     strategies=["None", "LRU"],
+                                     sizes=[5], length=200, universe=50)
+        self.assertEqual(len(report["results"]), 4)
+        for row in report["results"]:
+            self.assertEqual(row["hits"] + row["memory_requests"], 200)
+            self.assertLessEqual(row["p50_ns"], row["p99_ns"])
+        changes = benchmark.compare(report, report)
+        self.assertEqual([c["hit_ratio_delta"] for c in changes],
+                         [0.0] * 4)
+
+
+class TestCaseTraceFormats(unittest.TestCase):
+
+    addresses = [0, 7, 12, 123456, 3, 99, 4000000000, 1]
+
+    def text(self):
+        return "".join(f"{a}\n" for a in self.addresses).encode()
+
+    # Lines split across chunk boundaries are put back together.
+    def test_text_chunks(self):
+        for chunk_bytes in (1, 3, 7, 1024):
+            stream = io.BytesIO(self.text().rstrip(b"\n"))
+            read = [a for batch in tracebin.iter_text(stream, chunk_bytes)
+                    for a in batch]
+            self.assertEqual(read, self.addresses)
+
+    # Text converts to binary and reads back both streamed and mapped.
+    def test_binary_round_trip(self):
+        for width in (4, 8):
+            binary = io.BytesIO()
+            count = tracebin.convert(io.BytesIO(self.text()), binary, width)
+            self.assertEqual(count, len(self.addresses))
+            self.assertEqual(len(binary.getvalue()), width * count)
+            binary.seek(0)
+            read = [a for batch in tracebin.iter_binary(binary, width, 12)
+                    for a in batch]
+            self.assertEqual(read, self.addresses)
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "trace.bin")
+                with open(path, "wb") as trace_file:
+                    trace_file.write(binary.getvalue())
+                mapped = tracebin.map_binary(path, width)
+                self.assertEqual(list(mapped), self.addresses)
+                mapped.release()
+
+    def test_partial_entry(self):
+        with self.assertRaises(ValueError):
+            list(tracebin.iter_binary(io.BytesIO(b"\x01\x00\x00"), 4))
+
+
+# A small hot set accessed repeatedly, with a long scan of addresses
+# that are never reused after each burst.
+def scan_polluted_trace(rounds=40, hot=20, scan=60, seed=0):
+    rng = random.Random(seed)
+    trace = []
+    start = 100
+    for _ in range(rounds):
+        trace.extend(rng.randrange(hot) for _ in range(3 * hot))
+        trace.extend(range(start, start + scan))
+        start += scan
+    return trace
+
+
+class TestCaseARC(unittest.TestCase):
+
+    def setUp(self):
+        self.data = utilities.sample_data(size=3000)
+
+    def hits(self, impl, trace):
+        for address in trace:
+            self.assertEqual(impl.lookup(address), self.data[address])
+        return impl.get_cache_hit_count()
+
+    # Scans push the hot set out of LRU every round; ARC keeps it in
+    # T2 and only lets the scan churn through T1.
+    def test_beats_lru_on_scans(self):
+        trace = scan_polluted_trace()
+        lru = self.hits(LRUCache(self.data, 30), trace)
+        arc = self.hits(ARCCache(self.data, 30), trace)
+        self.assertGreater(arc, lru * 1.3)
+
+    # List sizes stay within ARC's bounds on a random trace.
+    def test_invariants(self):
+        rng = random.Random(5)
+        for size in (0, 1, 4, 10):
+            impl = ARCCache(self.data, size)
+            for _ in range(1000):
+                impl.lookup(rng.randrange(30))
+                resident = len(impl.t1) + len(impl.t2)
+                self.assertLessEqual(resident, size)
+                self.assertLessEqual(len(impl.t1) + len(impl.b1), size)
+                self.assertLessEqual(resident + len(impl.b1)
+                                     + len(impl.b2), 2 * size)
+                self.assertTrue(0 <= impl.p <= size)
+            self.assertEqual(impl.get_cache_hit_count()
+                             + impl.get_memory_request_count(), 1000)
+
+    def test_flag(self):
+        impl = ARCCache(self.data)
+        impl.lookup(1)
+        self.assertFalse(impl.get_cache_hit_flag())
+        impl.lookup(1)
+        self.assertTrue(impl.get_cache_hit_flag())
+
+
+class TestCaseTinyLFU(unittest.TestCase):
+
+    def setUp(self):
+        self.data = utilities.sample_data(size=5000)
+
+    def run_trace(self, impl, trace):
+        for address in trace:
+            self.assertEqual(impl.lookup(address), self.data[address])
+        self.assertEqual(impl.get_cache_hit_count()
+                         + impl.get_memory_request_count(), len(trace))
+        return impl.get_cache_hit_count()
+
+    # Frequency-based admission should beat plain LRU on a skewed
+    # trace.
+    def test_zipf(self):
+        trace = traces.zipf(20000, 5000, skew=0.9, seed=2)
+        lru = self.run_trace(LRUCache(self.data, 100), trace)
+        tiny = self.run_trace(TinyLFUCache(self.data, 100), trace)
+        self.assertGreater(tiny, lru)
+
+    # A scan of addresses seen only once is never admitted past the
+    # window, so the hot set in the main cache survives it.
+    def test_one_hit_wonders(self):
+        impl = TinyLFUCache(self.data, 20, window=0.1, sketch_bytes=4096,
+                            doorkeeper_bits=4096)
+        hot = list(range(18))
+        for _ in range(5):
+            for address in hot:
+                impl.lookup(address)
+        impl.lookup_many(range(1000, 1100))
+        hits = impl.get_cache_hit_count()
+        for address in hot:
+            impl.lookup(address)
+        self.assertEqual(impl.get_cache_hit_count() - hits, len(hot))
+        self.assertGreater(impl.get_rejected_count(), 90)
+
+    # The sketch never exceeds its byte budget, saturates and ages.
+    def test_sketch(self):
+        sketch = CountMinSketch(1000, depth=4)
+        self.assertLessEqual(sketch.get_size_bytes(), 1000)
+        for _ in range(40):
+            sketch.increment("key")
+        self.assertEqual(sketch.estimate("key"), 15)
+        sketch.halve()
+        self.assertEqual(sketch.estimate("key"), 7)
+        impl = TinyLFUCache(self.data, 100, sketch_bytes=256)
+        self.assertLessEqual(impl.sketch.get_size_bytes(), 256)
+
+    def test_flag(self):
+        impl = TinyLFUCache(self.data)
+        impl.lookup(1)
+        self.assertFalse(impl.get_cache_hit_flag())
+        impl.lookup(1)
+        self.assertTrue(impl.get_cache_hit_flag())
+
+
+class TestCaseScanResistance(unittest.TestCase):
+
+    def setUp(self):
+        self.data = utilities.sample_data(size=5000)
+
+    # Warm a hot set of 20 with some cold traffic in between, scan
+    # every other address once, then count how much of the hot set is
+    # still cached.
+    def survivors(self, impl):
+        hot = range(20)
+        cold = 1000
+        for _ in range(10):
+            for address in hot:
+                impl.lookup(address)
+            impl.lookup_many(range(cold, cold + 20))
+            cold += 20
+        impl.lookup_many(range(3000, 5000))
+        hits = impl.get_cache_hit_count()
+        for address in hot:
+            impl.lookup(address)
+        return impl.get_cache_hit_count() - hits
+
+    def test_lru_flushed(self):
+        self.assertEqual(self.survivors(LRUCache(self.data, 40)), 0)
+
+    def test_slru(self):
+        self.assertEqual(self.survivors(SLRUCache(self.data, 40)), 20)
+
+    def test_2q(self):
+        self.assertEqual(self.survivors(TwoQCache(self.data, 40)), 20)
+
+    # Segment sizes respect their limits on a random trace.
+    def test_limits(self):
+        rng = random.Random(6)
+        for size in (0, 1, 3, 10):
+            slru = SLRUCache(self.data, size)
+            two_q = TwoQCache(self.data, size)
+            for _ in range(1000):
+                address = rng.randrange(30)
+                self.assertEqual(slru.lookup(address), self.data[address])
+                self.assertEqual(two_q.lookup(address), self.data[address])
+                self.assertLessEqual(len(slru.probation)
+                                     + len(slru.protected), size)
+                self.assertLessEqual(len(slru.protected),
+                                     slru.protected_size)
+                self.assertLessEqual(len(two_q.a1in) + len(two_q.am), size)
+                self.assertLessEqual(len(two_q.a1out), two_q.out_size)
+
+
+class TestCaseClock(unittest.TestCase):
+
+    def setUp(self):
+        self.data = utilities.sample_data(size=5000)
+
+    # A referenced entry gets a second chance: the hand clears its bit
+    # and evicts the next unreferenced entry instead.
+    def test_second_chance(self):
+        impl = ClockCache(self.data, 3)
+        for address in (1, 2, 3):
+            impl.lookup(address)
+        impl.lookup(1)
+        impl.lookup(4)
+        self.assertTrue(impl.contains(1))
+        self.assertFalse(impl.contains(2))
+        self.assertEqual(impl.victim(), 3)
+        self.assertEqual(impl.get_memory_request_count(), 4)
+
+    # CLOCK-Pro's victim is the entry the next miss (not on a ghost)
+    # evicts, and asking again gives the same answer.
+    def test_clock_pro_victim(self):
+        impl = ClockProCache(self.data, 50)
+        rng = random.Random(3)
+        checked = 0
+        for _ in range(5000):
+            address = rng.randrange(200)
+            victim = impl.victim()
+            self.assertEqual(impl.victim(), victim)
+            evicting = not impl.contains(address) and \
+                address not in impl.ghost and victim is not None
+            before = {a for a in range(200) if impl.contains(a)}
+            impl.lookup(address)
+            if evicting:
+                after = {a for a in range(200) if impl.contains(a)}
+                self.assertEqual(before - after, {victim})
+                checked += 1
+        self.assertGreater(checked, 1000)
+
+    # Without any hits CLOCK behaves exactly like CyclicCache.
+    def test_matches_cyclic_without_hits(self):
+        clock = ClockCache(self.data, 4)
+        cyclic = CyclicCache(self.data, 4)
+        for address in range(20):
+            clock.lookup(address)
+            cyclic.lookup(address)
+        self.assertEqual(clock.cache, cyclic.cache)
+
+    # Hit ratios on a skewed trace should be close to LRU's or better.
+    def test_hit_ratio(self):
+        trace = traces.zipf(20000, 5000, skew=0.9, seed=3)
+        results = {}
+        for cls in (LRUCache, ClockCache, ClockProCache):
+            impl = cls(self.data, 200)
+            impl.lookup_many(trace)
+            results[cls] = impl.get_cache_hit_count() / len(trace)
+        self.assertGreater(results[ClockCache], results[LRUCache] - 0.02)
+        self.assertGreater(results[ClockProCache], results[LRUCache])
+
+    # Hot entries never exceed size - cold_target.
+    def test_clock_pro_limits(self):
+        rng = random.Random(8)
+        for size in (1, 2, 8):
+            impl = ClockProCache(self.data, size)
+            for _ in range(2000):
+                address = rng.randrange(3 * size)
+                self.assertEqual(impl.lookup(address), self.data[address])
+                self.assertEqual(impl.hot_count, sum(impl.hot))
+                self.assertLessEqual(impl.hot_count,
+                                     size - impl.cold_target)
+                self.assertLessEqual(len(impl.ghost), size)
+
+
+# Clock for ExpiringCache tests, advanced by hand.
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCaseExpiry(unittest.TestCase):
+
+    def setUp(self):
+        self.data = utilities.sample_data(size=100)
+        self.clock = FakeClock()
+
+    # An expired entry is a miss on its next lookup and is fetched again.
+    def test_lazy_expiry(self):
+        for strategy in (CyclicCache, LRUCache, LFUCache):
+            self.clock.now = 0.0
+            impl = ExpiringCache(self.data, 5, strategy=strategy, ttl=10,
+                                 clock=self.clock)
+            impl.lookup(1)
+            impl.lookup(2, ttl=30)
+            self.clock.now = 9.5
+            self.assertEqual(impl.lookup(1), self.data[1])
+            self.assertTrue(impl.get_cache_hit_flag())
+            self.clock.now = 10.0
+            self.assertFalse(impl.contains(1))
+            self.assertEqual(impl.lookup(1), self.data[1])
+            self.assertFalse(impl.get_cache_hit_flag())
+            self.assertEqual(impl.lookup(2), self.data[2])
+            self.assertTrue(impl.get_cache_hit_flag())
+            self.assertEqual(impl.get_expired_count(), 1)
+            self.assertEqual(impl.get_memory_request_count(), 3)
+
+    # sweep() removes exactly the entries that are due, including ones
+    # left for more than a full turn of the wheel.
+    def test_sweep(self):
+        impl = ExpiringCache(self.data, 50, clock=self.clock,
+                             wheel_tick=1.0, wheel_slots=8)
+        for address in range(20):
+            impl.lookup(address, ttl=address + 0.5)
+        impl.lookup(20)
+        for now in (3.0, 7.2, 30.0):
+            self.clock.now = now
+            impl.sweep()
+            for address in range(20):
+                self.assertEqual(impl.main.contains(address),
+                                 address + 0.5 > now)
+        self.assertTrue(impl.contains(20))
+        self.assertEqual(impl.get_expired_count(), 20)
+        self.assertEqual(impl.get_weight(), 1)
+
+    # An entry with a short ttl added after one with a long ttl is
+    # still swept when due.
+    def test_sweep_earlier_deadline(self):
+        impl = ExpiringCache(self.data, 5, clock=self.clock)
+        impl.lookup(1, ttl=100)
+        impl.lookup(2, ttl=1)
+        for now, expired in ((2.0, 1), (3.0, 1), (50.0, 1), (101.0, 2)):
+            self.clock.now = now
+            impl.sweep()
+            self.assertEqual(impl.get_expired_count(), expired)
+        self.assertEqual(impl.get_occupancy(), 0)
+
+    # Entries are evicted in the strategy's order until a new one fits
+    # under capacity, and each reason has its own counter.
+    def test_weighted_capacity(self):
+        impl = ExpiringCache(self.data, 4, capacity=10,
+                             sizeof=lambda value: len(value))
+        sizes = {address: len(self.data[address]) for address in range(4)}
+        for address in range(4):
+            impl.lookup(address)
+        self.assertLessEqual(impl.get_weight(), 10)
+        self.assertEqual(impl.get_weight(), sum(
+            sizes[a] for a in range(4) if impl.contains(a)))
+
+        impl = ExpiringCache(self.data, 3, capacity=8,
+                             sizeof=lambda value: 2)
+        for address in range(3):
+            impl.lookup(address)
+        impl.lookup(3)
+        self.assertEqual(impl.get_policy_eviction_count(), 1)
+        self.assertEqual(impl.get_weight_eviction_count(), 0)
+        self.assertFalse(impl.contains(0))
+
+        impl = ExpiringCache(self.data, 10, capacity=6,
+                             sizeof=lambda value: 2)
+        for address in range(5):
+            impl.lookup(address)
+        self.assertEqual(impl.get_weight_eviction_count(), 2)
+        self.assertEqual(impl.get_policy_eviction_count(), 0)
+        self.assertEqual(impl.get_weight(), 6)
+        self.assertEqual([impl.contains(a) for a in range(5)],
+                         [False, False, True, True, True])
+
+    # Whatever the strategy drops, ghost hits and admission included,
+    # the deadlines and weights cover exactly the resident entries.
+    def test_policy_drops(self):
+        rng = random.Random(6)
+        for strategy in (CyclicCache, LRUCache, LFUCache, ARCCache,
+                         SLRUCache, TwoQCache, ClockCache, ClockProCache,
+                         TinyLFUCache):
+            impl = ExpiringCache(self.data, 8, strategy=strategy,
+                                 ttl=1000, capacity=20,
+                                 sizeof=lambda value: int(value, 16) % 3 + 1)
+            for _ in range(3000):
+                impl.lookup(rng.randrange(40))
+                resident = {a for a in range(40) if impl.contains(a)}
+                self.assertEqual(set(impl.deadlines), resident)
+                self.assertEqual(set(impl.weights), resident)
+                self.assertEqual(impl.get_weight(), sum(
+                    impl.weights.values()))
+                self.assertLessEqual(impl.get_weight(), 20)
+            self.assertGreater(impl.get_policy_eviction_count(), 0)
+
+    # A value heavier than the whole capacity is returned, not cached.
+    def test_oversized(self):
+        impl = ExpiringCache(self.data, 5, capacity=3,
+                             sizeof=lambda value: 4)
+        self.assertEqual(impl.lookup(7), self.data[7])
+        self.assertFalse(impl.contains(7))
+        self.assertEqual(impl.get_weight(), 0)
+
+    # remove() and evict() on every strategy keep contains() and the
+    # size limit consistent with a stream of lookups.
+    def test_remove_and_evict(self):
+        rng = random.Random(4)
+        for cls in (CyclicCache, LRUCache, MRUCache, LFUCache, ARCCache,
+                    SLRUCache, TwoQCache, ClockCache, ClockProCache,
+                    TinyLFUCache):
+            impl = cls(self.data, 6)
+            for _ in range(2000):
+                address = rng.randrange(20)
+                action = rng.random()
+                if action < 0.1:
+                    impl.remove(address)
+                    self.assertFalse(impl.contains(address))
+                elif action < 0.15:
+                    evicted = impl.evict()
+                    if evicted is not None:
+                        self.assertFalse(impl.contains(evicted))
+                else:
+                    self.assertEqual(impl.lookup(address),
+                                     self.data[address])
+                    self.assertTrue(impl.contains(address))
+                self.assertLessEqual(
+                    sum(impl.contains(a) for a in range(20)), 6)
+
+
+class TestCaseWrites(unittest.TestCase):
+
+    def setUp(self):
+        self.data = utilities.sample_data(size=100)
+        self.strategies = (CyclicCache, LRUCache, MRUCache, LFUCache,
+                           CompactLRUCache, CompactMRUCache, ARCCache,
+                           SLRUCache, TwoQCache, ClockCache,
+                           ClockProCache)
+
+    # Write through updates a resident entry, doesn't allocate one on a
+    # write miss, and sends every write to memory.
+    def test_write_through(self):
+        impl = LRUCache(list(self.data), 5)
+        impl.lookup(1)
+        impl.store(1, "one")
+        impl.store(2, "two")
+        self.assertFalse(impl.contains(2))
+        self.assertEqual(impl.lookup(1), "one")
+        self.assertTrue(impl.get_cache_hit_flag())
+        self.assertEqual(impl.lookup(2), "two")
+        self.assertEqual(impl.get_memory_write_count(), 2)
+        self.assertEqual(impl.get_memory_request_count(), 2)
+        self.assertEqual(impl.get_dirty_count(), 0)
+
+    # Write back absorbs repeated writes, writes an evicted dirty entry
+    # once, and flushes the rest in a single round trip.
+    def test_write_back(self):
+        data = list(self.data)
+        impl = LRUCache(data, 3, write_back=True)
+        for value in range(10):
+            impl.store(1, value)
+        impl.store(2, "two")
+        self.assertEqual(impl.get_memory_request_count(), 0)
+        self.assertEqual(impl.get_memory_write_count(), 0)
+        self.assertEqual(impl.lookup(1), 9)
+        self.assertTrue(impl.get_cache_hit_flag())
+        for address in (3, 4):
+            impl.lookup(address)
+        self.assertFalse(impl.contains(2))
+        self.assertEqual(data[2], "two")
+        self.assertEqual(impl.get_memory_write_count(), 1)
+        impl.store(3, "three")
+        impl.flush()
+        self.assertEqual(data[1], 9)
+        self.assertEqual(data[3], "three")
+        self.assertEqual(impl.get_memory_write_count(), 3)
+        self.assertEqual(impl.get_memory_write_round_trip_count(), 2)
+        self.assertEqual(impl.get_dirty_count(), 0)
+        self.assertTrue(impl.contains(1))
+
+    # Random reads and writes, single and batched, against a plain
+    # dict: reads always see the last write and memory matches after
+    # a flush.
+    def test_consistency(self):
+        for write_back in (False, True):
+            for cls in self.strategies:
+                rng = random.Random(6)
+                data = list(self.data)
+                expected = list(self.data)
+                impl = cls(data, 6, write_back=write_back)
+                for step in range(1500):
+                    address = rng.randrange(20)
+                    action = rng.random()
+                    if action < 0.3:
+                        impl.store(address, step)
+                        expected[address] = step
+                    elif action < 0.4:
+                        batch = [rng.randrange(20) for _ in range(8)]
+                        values, _ = impl.lookup_many(batch)
+                        self.assertEqual(
+                            values, [expected[a] for a in batch])
+                    else:
+                        self.assertEqual(impl.lookup(address),
+                                         expected[address])
+                impl.flush()
+                self.assertEqual(data, expected)
+
+    # On a skewed write-heavy trace write back sends far fewer writes
+    # to memory than write through.
+    def test_traffic(self):
+        trace = traces.zipf(5000, 100, skew=1.0, seed=2)
+        writes = {}
+        for write_back in (False, True):
+            impl = LRUCache(list(self.data), 20, write_back=write_back)
+            for step, address in enumerate(trace):
+                impl.store(address, step)
+            impl.flush()
+            writes[write_back] = impl.get_memory_write_count()
+        self.assertEqual(writes[False], len(trace))
+        self.assertLess(writes[True], writes[False] // 2)
+
+    def test_sharded(self):
+        data = list(self.data)
+        impl = ShardedCache(data, 8, shards=4, write_back=True)
+        for address in range(8):
+            impl.store(address, -address)
+        self.assertEqual(impl.get_dirty_count(), 8)
+        self.assertEqual(impl.get_memory_write_count(), 0)
+        impl.flush()
+        self.assertEqual(data[:8], [-a for a in range(8)])
+        self.assertEqual(impl.get_memory_write_count(), 8)
+        self.assertEqual(impl.get_dirty_count(), 0)
+
+
+class TestCaseMissRatioCurve(unittest.TestCase):
+
+    def setUp(self):
+        self.data = utilities.sample_data(size=3000)
+
+    def test_stack_distances(self):
+        trace = [1, 2, 3, 1, 1, 3, 4, 2]
+        self.assertEqual(list(mrc.stack_distances(trace)),
+                         [None, None, None, 3, 1, 2, None, 4])
+
+    # The one-pass curve matches LRUCache exactly at every sampled
+    # size, including across renumberings of the Fenwick tree and with
+    # the trace given as a one-shot iterator.
+    def test_matches_lru(self):
+        sizes = [0, 1, 2, 7, 50, 299, 300, 301, 1000, 5000]
+        for trace in (traces.zipf(20000, 3000, seed=5),
+                      traces.loop(10000, 3000, loop_size=300),
+                      traces.shifting(20000, 3000, phase=2000)):
+            hits = mrc.lru_hits(iter(trace), sizes)
+            for size in sizes:
+                impl = LRUCache(self.data, size)
+                impl.lookup_many(trace)
+                self.assertEqual(hits[size], impl.get_cache_hit_count())
+
+    def test_histogram_totals(self):
+        trace = traces.zipf(5000, 3000, seed=1)
+        histogram, count, cold = mrc.distance_histogram(trace)
+        self.assertEqual(count, len(trace))
+        self.assertEqual(cold, len(set(trace)))
+        self.assertEqual(sum(histogram) + cold, count)
+
+    # SHARDS sampling stays close to the exact curve for sizes well
+    # above 1 / rate.
+    def test_sampled(self):
+        trace = traces.zipf(100000, 50000, seed=3)
+        sizes = [1000, 5000, 20000]
+        exact = mrc.lru_hits(trace, sizes)
+        estimate = mrc.lru_hits(trace, sizes, rate=0.1)
+        for size in sizes:
+            self.assertAlmostEqual(estimate[size] / len(trace),
+                                   exact[size] / len(trace), delta=0.02)
+
+
+@unittest.skipIf(simulate.np is None, "NumPy is not installed")
+class TestCaseSimulate(unittest.TestCase):
+
+    def setUp(self):
+        self.data = utilities.sample_data(size=3000)
+        self.traces = [traces.zipf(20000, 3000, seed=5),
+                       traces.loop(8000, 3000, loop_size=300),
+                       traces.shifting(20000, 3000, phase=2000),
+                       [1, 2, 3, 1, 1, 3, 4, 2]]
+
+    # Per-access hit flags must equal the object cache's hit flag after
+    # every lookup.
+    def flags_check(self, cls, simulator, **kwargs):
+        for trace in self.traces:
+            array = simulate.np.asarray(trace)
+            for size in (0, 1, 3, 50, 299, 300, 301, 5000):
+                impl = cls(self.data, size)
+                expected = []
+                for address in trace:
+                    impl.lookup(address)
+                    expected.append(impl.get_cache_hit_flag())
+                hits = simulator(array, size, **kwargs)
+                self.assertEqual(hits.tolist(), expected)
+                self.assertEqual(simulate.counters(hits), {
+                    "cache_hits": impl.get_cache_hit_count(),
+                    "memory_requests": impl.get_memory_request_count()})
+
+    def test_lru(self):
+        self.flags_check(LRUCache, simulate.simulate_lru)
+
+    # Small chunks exercise the cache carried between chunks.
+    def test_lru_chunks(self):
+        self.flags_check(LRUCache, simulate.simulate_lru, chunk=512)
+
+    def test_cyclic(self):
+        self.flags_check(CyclicCache, simulate.simulate_cyclic)
+        self.flags_check(CyclicCache, simulate.simulate_cyclic, chunk=512,
+                         vectorise=False)
+
+    # The vectorised path at every size, including the loop one entry
+    # longer than the cache, which needs the fallback to the loop.
+    def test_cyclic_vector(self):
+        self.flags_check(CyclicCache, simulate.simulate_cyclic,
+                         vectorise=True)
+
+    def test_distances(self):
+        for trace in self.traces:
+            expected = [distance or 0
+                        for distance in mrc.stack_distances(trace)]
+            for chunk in (100, simulate.CHUNK):
+                self.assertEqual(simulate.lru_distances(
+                    trace, chunk=chunk).tolist(), expected)
+            sizes = [1, 10, 300, 4000]
+            self.assertEqual(simulate.lru_hit_counts(trace, sizes),
+                             mrc.lru_hits(trace, sizes))
+
+
+# Belady's MIN by brute force: on a miss with a full cache, evict the
+# entry whose next use is furthest away (or never comes).
+def belady_hits(trace, size):
+    cache = set()
+    hits = 0
+    for i, address in enumerate(trace):
+        if address in cache:
+            hits += 1
+            continue
+        if size <= 0:
+            continue
+        if len(cache) >= size:
+            def next_use(entry):
+                for j in range(i + 1, len(trace)):
+                    if trace[j] == entry:
+                        return j
+                return len(trace)
+            cache.remove(max(cache, key=next_use))
+        cache.add(address)
+    return hits
+
+
+class TestCaseOPT(unittest.TestCase):
+
+    def setUp(self):
+        self.data = utilities.sample_data(size=100)
+
+    def test_matches_brute_force(self):
+        rng = random.Random(3)
+        for _ in range(30):
+            trace = [rng.randrange(12) for _ in range(rng.randrange(80))]
+            for size in (0, 1, 2, 4, 7, 20):
+                impl = OPTCache(self.data, size, trace)
+                flags = []
+                for address in trace:
+                    impl.lookup(address)
+                    flags.append(impl.get_cache_hit_flag())
+                self.assertEqual(impl.get_cache_hit_count(),
+                                 belady_hits(trace, size))
+                self.assertEqual(sum(flags), impl.get_cache_hit_count())
+                self.assertEqual(impl.get_cache_hit_count()
+                                 + impl.get_memory_request_count(),
+                                 len(trace))
+
+    def test_upper_bound(self):
+        data = utilities.sample_data(size=1000)
+        for trace in (traces.zipf(5000, 1000, seed=2),
+                      traces.loop(3000, 1000, loop_size=120),
+                      traces.shifting(5000, 1000, phase=800)):
+            optimum = OPTCache(data, 100, trace)
+            optimum.lookup_many(trace)
+            for cls in (CyclicCache, LRUCache, LFUCache, ARCCache,
+                        ClockCache):
+                impl = cls(data, 100)
+                impl.lookup_many(trace)
+                self.assertGreaterEqual(optimum.get_cache_hit_count(),
+                                        impl.get_cache_hit_count())
+
+    def test_out_of_order(self):
+        impl = OPTCache(self.data, 2, [1, 2, 3])
+        impl.lookup(1)
+        with self.assertRaises(ValueError):
+            impl.lookup(3)
+        impl.lookup(2)
+        impl.lookup(3)
+        with self.assertRaises(ValueError):
+            impl.lookup(1)
+
+    def test_report_gap(self):
+        report = benchmark.run_suite(kinds=["loop", "zipf"],
+                                     strategies=["LRU", "OPT"],
+                                     sizes=[5, 20], length=300,
+                                     universe=60)
+        for row in report["results"]:
+            self.assertAlmostEqual(row["opt_gap"], row["opt_hit_ratio"]
+                                   - row["hit_ratio"])
+            self.assertGreaterEqual(row["opt_gap"], 0)
+            if row["strategy"] == "OPT":
+                self.assertEqual(row["opt_gap"], 0)
+
+
+class TestCaseMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.data = utilities.sample_data(size=500)
+        self.trace = traces.zipf(3000, 500, seed=4)
+
+    # Derived counters must agree with the cache's own, whether the
+    # lookups are single or batched.
+    def test_counters(self):
+        makers = [lambda: LRUCache(self.data, 40),
+                  lambda: ARCCache(self.data, 40),
+                  lambda: CompactLRUCache(self.data, 40),
+                  lambda: TinyLFUCache(self.data, 40),
+                  lambda: ExpiringCache(self.data, 40),
+                  lambda: ShardedCache(self.data, 40),
+                  lambda: Cache(self.data)]
+        for make in makers:
+            impl = InstrumentedCache(make(), sample_every=0)
+            for address in self.trace[:1000]:
+                impl.lookup(address)
+            impl.lookup_many(self.trace[1000:])
+            snapshot = impl.metrics.snapshot()
+            self.assertEqual(snapshot["lookups"], len(self.trace))
+            self.assertEqual(snapshot["hits"], impl.get_cache_hit_count())
+            self.assertEqual(snapshot["hits"] + snapshot["misses"],
+                             len(self.trace))
+            self.assertEqual(snapshot["inserts"]
+                             - sum(snapshot["evictions"].values()),
+                             snapshot["occupancy"])
+            self.assertEqual(snapshot["lookup_latency_ns"]["count"], 1000)
+            self.assertEqual(snapshot["lookup_many_latency_ns"]["count"],
+                             1)
+
+    def test_inserts_match_misses(self):
+        impl = InstrumentedCache(LRUCache(self.data, 40))
+        impl.lookup_many(self.trace)
+        snapshot = impl.metrics.snapshot()
+        self.assertEqual(snapshot["inserts"], snapshot["misses"])
+        self.assertEqual(snapshot["evictions"]["policy"],
+                         snapshot["misses"] - 40)
+        self.assertEqual(snapshot["miss_penalty_ns"]["lookup_many"]
+                         ["count"], 1)
+
+    # A hierarchy counts as one cache: only entries leaving both levels
+    # are drops, and fetches by L2 are timed as miss penalties.
+    def test_hierarchy(self):
+        for mode in MODES:
+            for l1, l2 in ((LRUCache, LFUCache), (LRUCache, TinyLFUCache)):
+                impl = InstrumentedCache(HierarchyCache(
+                    self.data, 10, 30, l1=l1, l2=l2, mode=mode))
+                for address in self.trace:
+                    impl.lookup(address)
+                snapshot = impl.metrics.snapshot()
+                misses = snapshot["misses"]
+                self.assertEqual(misses, impl.get_memory_request_count())
+                self.assertEqual(snapshot["inserts"], misses)
+                self.assertEqual(snapshot["evictions"]["policy"],
+                                 misses - impl.get_occupancy())
+                self.assertEqual(snapshot["miss_penalty_ns"]["lookup"]
+                                 ["count"], misses)
+                self.assertTrue(impl.remove(self.trace[-1]))
+                self.assertIsNotNone(impl.evict())
+                evictions = impl.metrics.snapshot()["evictions"]
+                self.assertEqual((evictions["remove"], evictions["evict"]),
+                                 (1, 1))
+
+    def test_reasons(self):
+        impl = InstrumentedCache(LFUCache(self.data, 3))
+        for address in [1, 2, 3, 4]:
+            impl.lookup(address)
+        self.assertTrue(impl.remove(4))
+        self.assertIsNotNone(impl.evict())
+        evictions = impl.metrics.snapshot()["evictions"]
+        self.assertEqual(evictions, {"policy": 1, "remove": 1, "evict": 1})
+        self.assertEqual(impl.get_occupancy(), 1)
+        self.assertEqual(
+            impl.metrics.snapshot()["miss_penalty_ns"]["lookup"]["count"],
+            4)
+
+    def test_sampling(self):
+        impl = InstrumentedCache(LRUCache(self.data, 40), time_every=4,
+                                 sample_every=100)
+        for address in self.trace[:1000]:
+            impl.lookup(address)
+        impl.lookup_many(self.trace[1000:1150])
+        events = list(impl.metrics.events)
+        self.assertEqual(len(events), 11)
+        self.assertEqual(events[0]["address"], self.trace[99])
+        self.assertEqual(events[-1]["operation"], "lookup_many")
+        snapshot = impl.metrics.snapshot()
+        self.assertEqual(snapshot["lookups"], 1150)
+        self.assertEqual(snapshot["lookup_latency_ns"]["count"], 250)
+
+    def test_detach(self):
+        cache = LRUCache(self.data, 5)
+        memory = cache.memory
+        impl = InstrumentedCache(cache)
+        self.assertIsInstance(cache.memory, TimedMemory)
+        self.assertIs(impl.detach(), cache)
+        self.assertIs(cache.memory, memory)
+        self.assertNotIn("_write_back", vars(cache))
+        for address in self.trace[:100]:
+            cache.lookup(address)
+        self.assertEqual(impl.metrics.snapshot()["evictions"]["policy"], 0)
+
+    def test_histogram(self):
+        histogram = Histogram([10, 100, 1000])
+        for value in [5, 10, 11, 50, 500, 5000]:
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 2, 1, 1])
+        self.assertEqual(histogram.quantile(0.5), 100)
+        self.assertEqual(histogram.quantile(0.8), 1000)
+        self.assertIsNone(histogram.quantile(1.0))
+        self.assertEqual(histogram.snapshot()["buckets"],
+                         {10: 2, 100: 4, 1000: 5})
+
+    def test_prometheus(self):
+        metrics = Metrics({"cache": 'L"1'})
+        metrics.counter("hits").inc(3)
+        metrics.counter("evictions", reason="policy").inc()
+        metrics.gauge("occupancy", lambda: 7)
+        histogram = metrics.histogram("latency_ns", bounds=[10, 100])
+        histogram.observe(50)
+        histogram.observe(500)
+        lines = metrics.prometheus().splitlines()
+        self.assertIn("# TYPE cache_hits_total counter", lines)
+        self.assertIn('cache_hits_total{cache="L\\"1"} 3', lines)
+        self.assertIn('cache_evictions_total{cache="L\\"1",'
+                      'reason="policy"} 1', lines)
+        self.assertIn('cache_occupancy{cache="L\\"1"} 7', lines)
+        self.assertIn('cache_latency_ns_bucket{cache="L\\"1",le="100"} 1',
+                      lines)
+        self.assertIn('cache_latency_ns_bucket{cache="L\\"1",le="+Inf"} 2',
+                      lines)
+        self.assertIn('cache_latency_ns_sum{cache="L\\"1"} 550', lines)
+        self.assertIn('cache_latency_ns_count{cache="L\\"1"} 2', lines)
+        self.assertEqual(metrics.snapshot()["evictions"], {"policy": 1})
+
+
+class TestCaseHierarchy(unittest.TestCase):
+
+    # Random reads, writes, removes and evictions against a plain list,
+    # checking values, the inclusion or exclusion invariant and the
+    # level sizes after every step.
+    def random_check(self, mode, l1, l2, write_back):
+        rng = random.Random(6)
+        data = utilities.sample_data(size=40)
+        expected = list(data)
+        impl = HierarchyCache(data, 3, 10, l1=l1, l2=l2, mode=mode,
+                              write_back=write_back)
+        for step in range(1500):
+            address = rng.randrange(40)
+            action = rng.random()
+            if action < 0.2:
+                impl.store(address, step)
+                expected[address] = step
+            elif action < 0.23:
+                impl.remove(address)
+            elif action < 0.25:
+                impl.evict()
+            else:
+                self.assertEqual(impl.lookup(address), expected[address])
+            upper = {a for a in range(40) if impl.l1.contains(a)}
+            lower = {a for a in range(40) if impl.l2.contains(a)}
+            if mode == "inclusive":
+                self.assertLessEqual(upper, lower)
+            else:
+                self.assertFalse(upper & lower)
+            self.assertLessEqual(len(upper), 3)
+            self.assertLessEqual(len(lower), 10)
+        impl.flush()
+        self.assertEqual(data, expected)
+        self.assertEqual(impl.level_stats()[1]["misses"],
+                         impl.get_memory_request_count())
+
+    def test_inclusive(self):
+        for l1, l2 in ((LRUCache, LFUCache), (ClockCache, ARCCache),
+                       (CompactLRUCache, SLRUCache)):
+            for write_back in (False, True):
+                self.random_check("inclusive", l1, l2, write_back)
+
+    # Levels without a write back mode are fine when it isn't asked for.
+    def test_write_through_levels(self):
+        for mode in MODES:
+            self.random_check(mode, TinyLFUCache, TinyLFUCache, False)
+
+    def test_exclusive(self):
+        for l1, l2 in ((LRUCache, LFUCache), (TwoQCache, CompactLRUCache),
+                       (ClockProCache, LRUCache)):
+            for write_back in (False, True):
+                self.random_check("exclusive", l1, l2, write_back)
+
+    def test_demotion(self):
+        data = utilities.sample_data(size=10)
+        impl = HierarchyCache(data, 2, 2, l1=LRUCache, l2=LRUCache,
+                              mode="exclusive")
+        for address in [1, 2, 3, 4]:
+            impl.lookup(address)
+        self.assertEqual([a for a in range(10) if impl.l1.contains(a)],
+                         [3, 4])
+        self.assertEqual([a for a in range(10) if impl.l2.contains(a)],
+                         [1, 2])
+        impl.lookup(1)
+        self.assertTrue(impl.get_cache_hit_flag())
+        self.assertFalse(impl.l2.contains(1))
+        self.assertTrue(impl.l2.contains(3))
+        self.assertEqual(impl.get_memory_request_count(), 4)
+        l1, l2 = impl.level_stats()
+        self.assertEqual((l1["lookups"], l1["hits"]), (5, 0))
+        self.assertEqual((l2["lookups"], l2["hits"]), (5, 1))
+
+    def test_level_stats(self):
+        data = utilities.sample_data(size=500)
+        trace = traces.zipf(3000, 500, seed=8)
+        impl = HierarchyCache(data, 10, 50)
+        impl.lookup_many(trace)
+        l1, l2 = impl.level_stats()
+        self.assertEqual(l1["lookups"], 3000)
+        self.assertEqual(l2["lookups"], l1["misses"])
+        self.assertEqual(l2["lookups"],
+                         impl.l1.get_memory_request_count())
+        self.assertEqual(l1["hits"] + l2["hits"],
+                         impl.get_cache_hit_count())
+        self.assertEqual(l2["misses"], impl.get_memory_request_count())
+        self.assertAlmostEqual(impl.average_access_time(1, 10, 100),
+                               (3000 + 10 * l2["lookups"]
+                                + 100 * l2["misses"]) / 3000)
+        with self.assertRaises(ValueError):
+            HierarchyCache(data, mode="victim")
+
+    def test_stacked(self):
+        data = utilities.sample_data(size=20)
+        lower = LFUCache(data, 8)
+        upper = LRUCache(data, 2)
+        upper.memory = CacheMemory(lower)
+        for address in [1, 2, 3, 1, 4, 1]:
+            self.assertEqual(upper.lookup(address), data[address])
+        self.assertEqual(upper.get_memory_request_count(), 5)
+        self.assertEqual(lower.get_cache_hit_count(), 1)
+        self.assertEqual(lower.get_memory_request_count(), 4)
+        upper.store(2, "two")
+        self.assertEqual(lower.lookup(2), "two")
+        self.assertEqual(data[2], "two")
+
+    def test_compact_remove(self):
+        impl = CompactLRUCache(utilities.sample_data(size=10), 3)
+        for address in [1, 2, 3]:
+            impl.lookup(address)
+        self.assertTrue(impl.remove(2))
+        self.assertFalse(impl.remove(2))
+        self.assertIsNone(impl.victim())
+        impl.lookup(4)
+        self.assertEqual(impl.evict(), 1)
+        self.assertEqual([a for a in range(6) if impl.contains(a)], [3, 4])
+        self.assertEqual(impl.victim(), None)
+        impl.lookup(5)
+        self.assertEqual(impl.victim(), 3)
+
+
+class TestCaseDisk(unittest.TestCase):
+
+    def setUp(self):
+        self.data = utilities.sample_data(size=100)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache")
+        self.rng = random.Random(3)
+        self.trace = [self.rng.randrange(60) for _ in range(600)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assert_same(self, impl, reference, trace):
+        for address in trace:
+            self.assertEqual(impl.lookup(address),
+                             reference.lookup(address))
+            self.assertEqual(impl.get_cache_hit_flag(),
+                             reference.get_cache_hit_flag())
+
+    # Reopening the file carries on exactly where the cache left off.
+    def test_reopen(self):
+        impl = DiskLRUCache(self.data, 20, self.path)
+        lru = LRUCache(self.data, size=20)
+        self.assert_same(impl, lru, self.trace[:300])
+        impl.close()
+        impl = DiskLRUCache(self.data, 20, self.path)
+        self.assertEqual(impl.get_occupancy(), 20)
+        self.assert_same(impl, lru, self.trace[300:])
+        self.assertEqual(impl.get_cache_hit_count(),
+                         lru.get_cache_hit_count())
+        impl.close()
+
+    # Stores to resident entries are kept in the file.
+    def test_store(self):
+        impl = DiskLRUCache(self.data, 20, self.path)
+        impl.lookup(4)
+        impl.store(4, "four")
+        impl.close()
+        impl = DiskLRUCache(utilities.sample_data(size=100), 20, self.path)
+        self.assertEqual(impl.lookup(4), "four")
+        self.assertTrue(impl.get_cache_hit_flag())
+        impl.close()
+        with self.assertRaises(ValueError):
+            DiskLRUCache(self.data, 10, self.path)
+
+    # A restored cache has the same contents, order and frequencies,
+    # so it goes on to hit and evict exactly as the original does.
+    def test_snapshot(self):
+        for cls in (LRUCache, LFUCache):
+            original = cls(self.data, size=20)
+            self.assert_same(original, cls(self.data, size=20),
+                             self.trace[:300])
+            snapshot(original, self.path)
+            restored = restore(self.path, self.data)
+            self.assertIs(type(restored), cls)
+            self.assertEqual(restored.get_memory_request_count(), 0)
+            self.assertEqual(restored.get_occupancy(),
+                             original.get_occupancy())
+            self.assert_same(restored, original, self.trace[300:])
+
+    def test_snapshot_errors(self):
+        with self.assertRaises(TypeError):
+            snapshot(ARCCache(self.data, size=20), self.path)
+        cache = LRUCache(self.data, size=20, write_back=True)
+        cache.store(1, "x")
+        with self.assertRaises(ValueError):
+            snapshot(cache, self.path)
+        cache.flush()
+        snapshot(cache, self.path)
+        self.assertEqual(restore(self.path, self.data).lookup(1), "x")
+        with open(self.path, "wb") as output:
+            output.write(bytes(64))
+        with self.assertRaises(ValueError):
+            restore(self.path, self.data)
+
+    def test_warm_restart_report(self):
+        rows = benchmark.warm_restart(size=50, length=2000, universe=500)
+        requests = {row["start"]: row["memory_requests"] for row in rows}
+        self.assertLess(requests["restored LRU"], requests["cold LRU"])
+        self.assertEqual(requests["reopened DiskLRU"],
+                         requests["restored LRU"])
+
+
+class TestCasePrefetch(unittest.TestCase):
+
+    def setUp(self):
+        self.data = utilities.sample_data(size=1000)
+
+    def test_patterns(self):
+        cases = [([10, 11, 12], "sequential", [13, 14, 15, 16]),
+                 ([100, 96, 92], "strided", [88, 84, 80, 76]),
+                 ([0, 1, 5, 6, 10], "delta", [11, 15, 16, 20])]
+        for accesses, pattern, predicted in cases:
+            detector = StreamDetector(degree=4)
+            for address in accesses[:-1]:
+                self.assertIsNone(detector.observe(address))
+            self.assertEqual(detector.observe(accesses[-1]),
+                             (pattern, predicted))
+
+    # Two interleaved runs are told apart, and each batch of
+    # predictions only covers addresses not handed out before.
+    def test_streams(self):
+        detector = StreamDetector(degree=4)
+        found = []
+        for i in range(8):
+            for prediction in (detector.observe(100 + i),
+                               detector.observe(900 - 10 * i)):
+                if prediction is not None:
+                    found.append(prediction)
+        self.assertEqual(found, [("sequential", [103, 104, 105, 106]),
+                                 ("strided", [870, 860, 850, 840]),
+                                 ("sequential", [107, 108]),
+                                 ("strided", [830, 820]),
+                                 ("sequential", [109, 110]),
+                                 ("strided", [810, 800])])
+
+    # Whatever the strategy behind it, the prefetcher returns the
+    # right values, turns most misses on streams into hits and keeps
+    # its counters consistent.
+    def test_strategies(self):
+        trace = traces.streams(3000, 1000, seed=2)
+        for cls in (Cache, CyclicCache, LRUCache, LFUCache, ARCCache,
+                    ClockCache, TinyLFUCache):
+            impl = PrefetchingCache(self.data, 50, cls, buffer_size=32)
+            plain = cls(self.data, 82)
+            for address in trace:
+                self.assertEqual(impl.lookup(address), self.data[address])
+                plain.lookup(address)
+            name = impl.name()
+            self.assertLess(impl.get_demand_miss_count(),
+                            (3000 - plain.get_cache_hit_count()) // 2, name)
+            self.assertEqual(impl.get_prefetch_count(),
+                             impl.get_prefetch_hit_count()
+                             + impl.get_wasted_prefetch_count()
+                             + len(impl.buffer), name)
+            self.assertEqual(impl.get_cache_hit_count()
+                             + impl.get_demand_miss_count(), 3000, name)
+            self.assertEqual(sum(impl.get_pattern_counts().values()),
+                             impl.get_prefetch_count(), name)
+            self.assertGreater(impl.get_prefetch_accuracy(), 0.5, name)
+            self.assertGreater(impl.get_prefetch_coverage(), 0.5, name)
+
+    # Wrong predictions are dropped from the buffer without evicting
+    # anything from the main cache.
+    def test_low_priority(self):
+        impl = PrefetchingCache(self.data, 10, buffer_size=8, window=16,
+                                degree=4)
+        hot = [500, 530, 545, 610, 700, 702, 850]
+        for address in hot:
+            impl.lookup(address)
+        for start in (0, 100, 200, 300):
+            for address in range(start, start + 3):
+                impl.lookup(address)
+                impl.remove(address)
+        for address in hot:
+            self.assertTrue(impl.main.contains(address))
+        self.assertEqual(impl.get_prefetch_hit_count(), 0)
+        self.assertEqual(impl.get_wasted_prefetch_count(), 8)
+        self.assertEqual(len(impl.buffer), 8)
+        self.assertEqual(impl.get_occupancy(), 15)
+        self.assertEqual(impl.evict(), 203)
+        self.assertEqual(impl.get_wasted_prefetch_count(), 9)
+
+    def test_writes(self):
+        data = list(self.data)
+        impl = PrefetchingCache(data, 10, write_back=True, degree=4)
+        for address in (0, 1, 2):
+            impl.lookup(address)
+        self.assertIn(4, impl.buffer)
+        impl.store(4, "x")
+        self.assertNotIn(4, impl.buffer)
+        self.assertEqual(impl.get_dirty_count(), 1)
+        self.assertEqual(impl.lookup(4), "x")
+        impl.flush()
+        self.assertEqual(data[4], "x")
+        impl = PrefetchingCache(data, 10, degree=4)
+        for address in (0, 1, 2):
+            impl.lookup(address)
+        impl.store(5, "y")
+        self.assertEqual(data[5], "y")
+        self.assertEqual(impl.lookup(5), "y")
+        self.assertTrue(impl.get_cache_hit_flag())
+
+    def test_report(self):
+        rows = benchmark.prefetch_comparison(kinds=["scan"],
+                                             strategies=["LRU"], size=20,
+                                             length=500, universe=1000)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["misses"], 500)
+        self.assertLess(rows[0]["prefetch_misses"], 10)
+
+
+class TestCaseMemoize(unittest.TestCase):
+
+    def test_calls(self):
+        calls = []
+
+        @cached(size=4)
+        def add(a, b=0):
+            calls.append((a, b))
+            return a + b
+
+        self.assertEqual(add(1), 1)
+        self.assertEqual(add(1), 1)
+        self.assertEqual(add(1, b=2), 3)
+        self.assertEqual(add(b=2, a=1), 3)
+        self.assertEqual(add(a=1, b=2), 3)
+        self.assertEqual(calls, [(1, 0), (1, 2), (1, 2)])
+        self.assertEqual(add.cache_info(), (2, 3, 4, 3))
+        self.assertEqual(add.__name__, "add")
+        self.assertEqual(add.__wrapped__(5), 5)
+        add.cache_clear()
+        self.assertEqual(add.cache_info(), (0, 0, 4, 0))
+        with self.assertRaises(TypeError):
+            add([1])
+        with self.assertRaises(ValueError):
+            cached(add, strategy="OPT")
+
+    # Each strategy gives the right results and one call per miss; LRU
+    # hits exactly when functools.lru_cache does.
+    def test_strategies(self):
+        trace = traces.zipf(2000, 200, seed=5)
+        reference = functools.lru_cache(20)(lambda x: x * x)
+        for x in trace:
+            reference(x)
+        for strategy in memoize.STRATEGIES:
+            calls = []
+
+            def square(x):
+                calls.append(x)
+                return x * x
+
+            wrapper = cached(square, strategy=strategy, size=20)
+            for x in trace:
+                self.assertEqual(wrapper(x), x * x)
+            info = wrapper.cache_info()
+            self.assertEqual(info.misses, len(calls), strategy)
+            self.assertEqual(info.hits + info.misses, len(trace), strategy)
+            self.assertLessEqual(info.currsize, 20, strategy)
+            if strategy == "LRU":
+                self.assertEqual(info.hits, reference.cache_info().hits)
+
+    def test_typed(self):
+        name = cached(typed=True)(lambda x: type(x).__name__)
+        self.assertEqual([name(3), name(3.0), name(3)],
+                         ["int", "float", "int"])
+        self.assertEqual(name.cache_info().misses, 2)
+        loose = cached(lambda x: type(x).__name__)
+        self.assertEqual([loose(3), loose(3.0)], ["int", "int"])
+
+    # Results expire after ttl seconds under every strategy, and the
+    # fresh result replaces the old one.
+    def test_ttl(self):
+        calls = {strategy: [] for strategy in memoize.STRATEGIES}
+
+        # Returns the number of calls so far
+        def counter(calls):
+            return lambda x: calls.append(x) or len(calls)
+
+        wrappers = {strategy: cached(counter(calls[strategy]),
+                                     strategy=strategy, size=8, ttl=0.05)
+                    for strategy in memoize.STRATEGIES}
+        for wrapper in wrappers.values():
+            wrapper(1)
+            wrapper(2)
+            wrapper(1)
+        time.sleep(0.1)
+        for strategy, wrapper in wrappers.items():
+            self.assertEqual(wrapper(1), 3, strategy)
+            self.assertEqual(wrapper(1), 3, strategy)
+            self.assertEqual(calls[strategy], [1, 2, 1], strategy)
+            self.assertEqual(wrapper.cache_info().hits, 2, strategy)
+
+    # With ttl set, the deadlines kept are only those of the resident
+    # results, whether keys come back often (ARC's ghost hits) or
+    # hardly ever.
+    def test_ttl_bounded(self):
+        rng = random.Random(7)
+        for strategy in memoize.STRATEGIES:
+            for keys in (100, 100000):
+                cache = memoize.build(strategy, 10, ttl=3600)
+                cache.memory = memoize.FunctionMemory(lambda x: -x)
+                for _ in range(5000):
+                    key = (rng.randrange(keys),)
+                    self.assertEqual(cache.lookup(key), -key[0])
+                self.assertEqual(len(cache.deadlines),
+                                 cache.get_occupancy(), strategy)
+                self.assertEqual(len(cache.weights),
+                                 cache.get_occupancy(), strategy)
+
+    # Concurrent callers with the same arguments share one call, and
+    # its exception.
+    def test_single_flight(self):
+        started = threading.Event()
+        calls = []
+
+        @cached
+        def slow(x):
+            calls.append(x)
+            started.set()
+            time.sleep(0.1)
+            if x < 0:
+                raise KeyError(x)
+            return x
+
+        for x, outcome in ((1, 1), (-1, KeyError)):
+            results = []
+
+            def call():
+                try:
+                    results.append(slow(x))
+                except KeyError as error:
+                    results.append(type(error))
+
+            started.clear()
+            first = threading.Thread(target=call)
+            first.start()
+            started.wait()
+            others = [threading.Thread(target=call) for _ in range(7)]
+            for thread in others:
+                thread.start()
+            for thread in [first] + others:
+                thread.join()
+            self.assertEqual(results, [outcome] * 8)
+        self.assertEqual(calls, [1, -1])
+        self.assertEqual(slow.cache_info(), (14, 2, 128, 1))
+
+    def test_report(self):
+        rows = benchmark.memoize_comparison(strategies=["LRU"],
+                                            sizes=[10], length=500,
+                                            universe=50)
+        self.assertEqual([row["strategy"] for row in rows],
+                         ["functools", "LRU"])
+        self.assertEqual(rows[0]["hit_ratio"], rows[1]["hit_ratio"])
+
+
+class TestCaseData(unittest.TestCase):
+
+    def reference(self, size):
+        return [hashlib.md5(str(n ^ 3).encode()).hexdigest()[:8]
+                for n in range(size)]
+
+    # Every way of generating the data gives exactly mangle's values.
+    def test_identical(self):
+        expected = self.reference(3000)
+        joined = "".join(expected).encode()
+        self.assertEqual(utilities.sample_data(3000), expected)
+        self.assertEqual(utilities.sample_data(10), expected[:10])
+        self.assertEqual(utilities.mangle(2999), expected[2999])
+        self.assertEqual(utilities.mangle(10 ** 9), hashlib.md5(
+            str(10 ** 9 ^ 3).encode()).hexdigest()[:8])
+        self.assertEqual(utilities.generate(3000, chunk=256), joined)
+        self.assertEqual(utilities.generate(3000, processes=2, chunk=512),
+                         joined)
+        self.assertEqual(utilities.generate(0), b"")
+        if utilities.np is not None:
+            values = utilities.generate_array(3000)
+            self.assertEqual(values.dtype.itemsize, utilities.WIDTH)
+            self.assertEqual(values.tobytes(), joined)
+
+    def test_dataset(self):
+        expected = self.reference(1000)
+        with tempfile.TemporaryDirectory() as directory:
+            data = utilities.dataset(1000, directory)
+            self.assertEqual(os.listdir(directory), ["mangle-1000.dat"])
+            self.assertEqual(len(data), 1000)
+            self.assertEqual(list(data), expected)
+            self.assertEqual(data[-1], expected[-1])
+            with self.assertRaises(IndexError):
+                data[1000]
+            memory = Memory(data)
+            self.assertEqual(memory.lookup_many([3, 999]),
+                             [expected[3], expected[999]])
+            cache = LRUCache(utilities.dataset(1000, directory), 10)
+            self.assertEqual(cache.lookup(7), expected[7])
+            path = os.path.join(directory, "mangle-1000.dat")
+            with open(path, "r+b") as output:
+                output.truncate(100)
+            with self.assertRaises(ValueError):
+                utilities.open_dataset(path)
+
+    # Values past the memo are hashed as before.
+    def test_memo_limit(self):
+        limit = utilities.MEMO_SIZE
+        try:
+            utilities.MEMO_SIZE = 1000
+            utilities._memo = b""
+            self.assertEqual(utilities.sample_data(3000),
+                             self.reference(3000))
+            self.assertEqual(len(utilities._memo), 1000 * utilities.WIDTH)
+            self.assertEqual(utilities.mangle(999), self.reference(1000)[-1])
+        finally:
+            utilities.MEMO_SIZE = limit
+
+    # The report runs every method in order; it checks that they all
+    # give the same bytes itself.
+    def test_report(self):
+        rows = benchmark.data_generation(2000, processes=2)
+        self.assertEqual([row["method"] for row in rows],
+                         ["sample_data", "sample_data again", "generate",
+                          "generate pool", "write dataset",
+                          "open dataset"])
+
+
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(TestCaseNull('test_default_cache'))
@@ -293,6 +2321,130 @@ def suite():
     suite.addTest(TestCaseMultipleLookup('test_lru'))
     suite.addTest(TestCaseMultipleLookup('test_mru'))
     suite.addTest(TestCaseMultipleLookup('test_lfu'))
+    suite.addTest(TestCaseLFUTieBreak('test_lfu_tie_break'))
+    suite.addTest(TestCaseLFUTieBreak('test_lfu_flag_reset'))
+    suite.addTest(TestCaseCyclicSlots('test_cyclic_rotation'))
+    suite.addTest(TestCaseLookupMany('test_default_cache'))
+    suite.addTest(TestCaseLookupMany('test_cyclic'))
+    suite.addTest(TestCaseLookupMany('test_lru'))
+    suite.addTest(TestCaseLookupMany('test_mru'))
+    suite.addTest(TestCaseLookupMany('test_lfu'))
+    suite.addTest(TestCaseLookupMany('test_compact_lru'))
+    suite.addTest(TestCaseLookupMany('test_compact_mru'))
+    suite.addTest(TestCaseLookupMany('test_arc'))
+    suite.addTest(TestCaseLookupMany('test_slru'))
+    suite.addTest(TestCaseLookupMany('test_2q'))
+    suite.addTest(TestCaseLookupMany('test_clock'))
+    suite.addTest(TestCaseLookupMany('test_clock_pro'))
+    suite.addTest(TestCaseBatchedMisses('test_default_cache'))
+    suite.addTest(TestCaseBatchedMisses('test_cyclic'))
+    suite.addTest(TestCaseBatchedMisses('test_lru'))
+    suite.addTest(TestCaseBatchedMisses('test_mru'))
+    suite.addTest(TestCaseBatchedMisses('test_lfu'))
+    suite.addTest(TestCaseBatchedMisses('test_failed_fetch'))
+    suite.addTest(TestCaseAsync('test_lru'))
+    suite.addTest(TestCaseAsync('test_lfu'))
+    suite.addTest(TestCaseAsync('test_cyclic'))
+    suite.addTest(TestCaseAsync('test_fetch_error'))
+    suite.addTest(TestCaseAsync('test_default_memory'))
+    suite.addTest(TestCaseAsync('test_leader_cancelled'))
+    suite.addTest(TestCaseAsync('test_write_back'))
+    suite.addTest(TestCaseSharded('test_lru'))
+    suite.addTest(TestCaseSharded('test_mru'))
+    suite.addTest(TestCaseSharded('test_split_and_batch'))
+    suite.addTest(TestCaseSharded('test_write_through_strategies'))
+    suite.addTest(TestCaseSharded('test_thread_flags'))
+    suite.addTest(TestCaseSharedMemory('test_matches_lru'))
+    suite.addTest(TestCaseSharedMemory('test_processes'))
+    suite.addTest(TestCaseSharedMemory('test_store'))
+    suite.addTest(TestCaseCompact('test_lru'))
+    suite.addTest(TestCaseCompact('test_mru'))
+    suite.addTest(TestCaseCompact('test_remove'))
+    suite.addTest(TestCaseCompact('test_slot_reuse'))
+    suite.addTest(TestCaseTraces('test_generators'))
+    suite.addTest(TestCaseTraces('test_zipf_skew'))
+    suite.addTest(TestCaseTraces('test_suite_report'))
+    suite.addTest(TestCaseTraceFormats('test_text_chunks'))
+    suite.addTest(TestCaseTraceFormats('test_binary_round_trip'))
+    suite.addTest(TestCaseTraceFormats('test_partial_entry'))
+    suite.addTest(TestCaseARC('test_beats_lru_on_scans'))
+    suite.addTest(TestCaseARC('test_invariants'))
+    suite.addTest(TestCaseARC('test_flag'))
+    suite.addTest(TestCaseTinyLFU('test_zipf'))
+    suite.addTest(TestCaseTinyLFU('test_one_hit_wonders'))
+    suite.addTest(TestCaseTinyLFU('test_sketch'))
+    suite.addTest(TestCaseTinyLFU('test_flag'))
+    suite.addTest(TestCaseScanResistance('test_lru_flushed'))
+    suite.addTest(TestCaseScanResistance('test_slru'))
+    suite.addTest(TestCaseScanResistance('test_2q'))
+    suite.addTest(TestCaseScanResistance('test_limits'))
+    suite.addTest(TestCaseClock('test_second_chance'))
+    suite.addTest(TestCaseClock('test_clock_pro_victim'))
+    suite.addTest(TestCaseClock('test_matches_cyclic_without_hits'))
+    suite.addTest(TestCaseClock('test_hit_ratio'))
+    suite.addTest(TestCaseClock('test_clock_pro_limits'))
+    suite.addTest(TestCaseExpiry('test_lazy_expiry'))
+    suite.addTest(TestCaseExpiry('test_sweep'))
+    suite.addTest(TestCaseExpiry('test_sweep_earlier_deadline'))
+    suite.addTest(TestCaseExpiry('test_weighted_capacity'))
+    suite.addTest(TestCaseExpiry('test_policy_drops'))
+    suite.addTest(TestCaseExpiry('test_oversized'))
+    suite.addTest(TestCaseExpiry('test_remove_and_evict'))
+    suite.addTest(TestCaseWrites('test_write_through'))
+    suite.addTest(TestCaseWrites('test_write_back'))
+    suite.addTest(TestCaseWrites('test_consistency'))
+    suite.addTest(TestCaseWrites('test_traffic'))
+    suite.addTest(TestCaseWrites('test_sharded'))
+    suite.addTest(TestCaseMissRatioCurve('test_stack_distances'))
+    suite.addTest(TestCaseMissRatioCurve('test_matches_lru'))
+    suite.addTest(TestCaseMissRatioCurve('test_histogram_totals'))
+    suite.addTest(TestCaseMissRatioCurve('test_sampled'))
+    suite.addTest(TestCaseSimulate('test_lru'))
+    suite.addTest(TestCaseSimulate('test_lru_chunks'))
+    suite.addTest(TestCaseSimulate('test_cyclic'))
+    suite.addTest(TestCaseSimulate('test_cyclic_vector'))
+    suite.addTest(TestCaseSimulate('test_distances'))
+    suite.addTest(TestCaseOPT('test_matches_brute_force'))
+    suite.addTest(TestCaseOPT('test_upper_bound'))
+    suite.addTest(TestCaseOPT('test_out_of_order'))
+    suite.addTest(TestCaseOPT('test_report_gap'))
+    suite.addTest(TestCaseMetrics('test_counters'))
+    suite.addTest(TestCaseMetrics('test_inserts_match_misses'))
+    suite.addTest(TestCaseMetrics('test_hierarchy'))
+    suite.addTest(TestCaseMetrics('test_reasons'))
+    suite.addTest(TestCaseMetrics('test_sampling'))
+    suite.addTest(TestCaseMetrics('test_detach'))
+    suite.addTest(TestCaseMetrics('test_histogram'))
+    suite.addTest(TestCaseMetrics('test_prometheus'))
+    suite.addTest(TestCaseHierarchy('test_inclusive'))
+    suite.addTest(TestCaseHierarchy('test_write_through_levels'))
+    suite.addTest(TestCaseHierarchy('test_exclusive'))
+    suite.addTest(TestCaseHierarchy('test_demotion'))
+    suite.addTest(TestCaseHierarchy('test_level_stats'))
+    suite.addTest(TestCaseHierarchy('test_stacked'))
+    suite.addTest(TestCaseHierarchy('test_compact_remove'))
+    suite.addTest(TestCaseDisk('test_reopen'))
+    suite.addTest(TestCaseDisk('test_snapshot'))
+    suite.addTest(TestCaseDisk('test_snapshot_errors'))
+    suite.addTest(TestCaseDisk('test_warm_restart_report'))
+    suite.addTest(TestCaseDisk('test_store'))
+    suite.addTest(TestCasePrefetch('test_patterns'))
+    suite.addTest(TestCasePrefetch('test_streams'))
+    suite.addTest(TestCasePrefetch('test_strategies'))
+    suite.addTest(TestCasePrefetch('test_low_priority'))
+    suite.addTest(TestCasePrefetch('test_writes'))
+    suite.addTest(TestCasePrefetch('test_report'))
+    suite.addTest(TestCaseMemoize('test_calls'))
+    suite.addTest(TestCaseMemoize('test_strategies'))
+    suite.addTest(TestCaseMemoize('test_typed'))
+    suite.addTest(TestCaseMemoize('test_ttl'))
+    suite.addTest(TestCaseMemoize('test_ttl_bounded'))
+    suite.addTest(TestCaseMemoize('test_single_flight'))
+    suite.addTest(TestCaseMemoize('test_report'))
+    suite.addTest(TestCaseData('test_identical'))
+    suite.addTest(TestCaseData('test_dataset'))
+    suite.addTest(TestCaseData('test_memo_limit'))
+    suite.addTest(TestCaseData('test_report'))
     return suite
 
 
@@ -0,0 +1,241 @@
+from collections import OrderedDict
+from cache import Cache, LRUCache, FetchedMemory
+
+# Odd 64 bit constants for multiplicative hashing, one per sketch row
+# and one per doorkeeper probe.
+_SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+          0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53,
+          0x94D049BB133111EB, 0xBF58476D1CE4E5B9)
+_MASK = (1 << 64) - 1
+
+
+def _power_of_two_bits(count):
+    bits = 0
+    while (1 << (bits + 1)) <= count:
+        bits += 1
+    return bits
+
+
+# Count-min sketch of 8 bit saturating counters, depth rows of 2**k
+# counters each, taking at most max_bytes. The estimate for a key is
+# its smallest counter across rows. halve() ages every counter.
+class CountMinSketch:
+    def __init__(self, max_bytes, depth=4, limit=15):
+        if depth > len(_SEEDS):
+            raise ValueError(f"depth must be at most {len(_SEEDS)}")
+        self.bits = _power_of_two_bits(max(max_bytes // depth, 1))
+        self.width = 1 << self.bits
+        self.depth = depth
+        self.limit = limit
+        self.table = bytearray(self.width * depth)
+
+    def _indexes(self, key):
+        h = hash(key)
+        shift = 64 - self.bits
+        width = self.width
+        return [row * width + (((h * _SEEDS[row]) & _MASK) >> shift)
+                for row in range(self.depth)]
+
+    def increment(self, key):
+        table = self.table
+        for i in self._indexes(key):
+            if table[i] < self.limit:
+                table[i] += 1
+
+    def estimate(self, key):
+        table = self.table
+        return min(table[i] for i in self._indexes(key))
+
+    def halve(self):
+        self.table = bytearray(count >> 1 for count in self.table)
+
+    def get_size_bytes(self):
+        return len(self.table)
+
+
+# Bloom filter that remembers keys seen once since the last reset, so
+# one-hit wonders never reach the sketch.
+class Doorkeeper:
+    def __init__(self, bits, probes=3):
+        self.bits = max(_power_of_two_bits(bits), 3)
+        self.probes = probes
+        self.table = bytearray((1 << self.bits) // 8)
+
+    def _positions(self, key):
+        h = hash(key)
+        shift = 64 - self.bits
+        return [((h * _SEEDS[-1 - probe]) & _MASK) >> shift
+                for probe in range(self.probes)]
+
+    def __contains__(self, key):
+        table = self.table
+        return all(table[p >> 3] >> (p & 7) & 1
+                   for p in self._positions(key))
+
+    # Returns True if key was already (probably) present.
+    def add(self, key):
+        table = self.table
+        present = True
+        for p in self._positions(key):
+            if not table[p >> 3] >> (p & 7) & 1:
+                present = False
+                table[p >> 3] |= 1 << (p & 7)
+        return present
+
+    def clear(self):
+        self.table = bytearray(len(self.table))
+
+    def get_size_bytes(self):
+        return len(self.table)
+
+
+# W-TinyLFU: a small LRU window in front of any other strategy, with
+# admission to that strategy decided by estimated access frequency.
+#
+# New entries go into the window. When the window overflows, its least
+# recently used entry becomes a candidate for the main cache. If the
+# main cache is full, the candidate is admitted only if its estimated
+# frequency is higher than that of the entry the main strategy would
+# evict; otherwise the candidate is dropped.
+#
+# Frequencies come from a count-min sketch plus a doorkeeper Bloom
+# filter, covering keys whether or not they are resident. After
+# sample_factor * size accesses every counter is halved and the
+# doorkeeper cleared, so old popularity fades. sketch_bytes and
+# doorkeeper_bits bound their memory; both default to 16 per entry.
+class TinyLFUCache(Cache):
+    def name(self):
+        return "TinyLFU" + self.main.name()
+
+    def __init__(self, data, size=5, strategy=LRUCache, window=0.01,
+                 sketch_bytes=None, depth=4, sample_factor=10,
+                 doorkeeper_bits=None):
+        super().__init__(data)
+        self.size = size
+        self.window_size = min(max(int(size * window), 1), size)
+        self.main = strategy(data, size - self.window_size)
+        self.fetched = FetchedMemory()
+        self.main.memory = self.fetched
+        self.window = OrderedDict()
+        if sketch_bytes is None:
+            sketch_bytes = max(16 * size, 64)
+        self.sketch = CountMinSketch(sketch_bytes, depth)
+        if doorkeeper_bits is None:
+            doorkeeper_bits = 16 * max(size, 8)
+        self.doorkeeper = Doorkeeper(doorkeeper_bits)
+        self.sample_size = sample_factor * max(size, 1)
+        self.samples = 0
+        self.admitted_count = 0
+        self.rejected_count = 0
+
+    def get_admitted_count(self):
+        return self.admitted_count
+
+    def get_rejected_count(self):
+        return self.rejected_count
+
+    # Bytes used by the frequency sketch and doorkeeper together.
+    def get_sketch_size_bytes(self):
+        return self.sketch.get_size_bytes() + \
+            self.doorkeeper.get_size_bytes()
+
+    def contains(self, address):
+        return address in self.window or self.main.contains(address)
+
+    def get_occupancy(self):
+        return len(self.window) + self.main.get_occupancy()
+
+    # The address the next miss would drop: the window's oldest entry
+    # if it would lose the admission check, otherwise the main cache's
+    # victim.
+    def victim(self):
+        if self.size <= 0 or len(self.window) < self.window_size:
+            return None
+        candidate = next(iter(self.window))
+        if self.main.size <= 0:
+            return candidate
+        victim = self.main.victim()
+        if victim is None or \
+                self.frequency(candidate) > self.frequency(victim):
+            return victim
+        return candidate
+
+    def remove(self, address):
+        if address in self.window:
+            del self.window[address]
+            self._write_back(address)
+            return True
+        return self.main.remove(address)
+
+    # The same contest as admission: the window's oldest entry goes
+    # unless the main cache's victim is less frequent.
+    def evict(self):
+        if self.window:
+            candidate = next(iter(self.window))
+            victim = self.main.victim()
+            if victim is None or \
+                    self.frequency(candidate) <= self.frequency(victim):
+                self.remove(candidate)
+                return candidate
+        return self.main.evict()
+
+    def frequency(self, address):
+        estimate = self.sketch.estimate(address)
+        if address in self.doorkeeper:
+            estimate += 1
+        return estimate
+
+    def _record(self, address):
+        if self.doorkeeper.add(address):
+            self.sketch.increment(address)
+        self.samples += 1
+        if self.samples >= self.sample_size:
+            self.samples = 0
+            self.sketch.halve()
+            self.doorkeeper.clear()
+
+    def _admit(self, address, data):
+        victim = self.main.victim()
+        if victim is not None and \
+                self.frequency(address) <= self.frequency(victim):
+            self.rejected_count += 1
+            self._write_back(address)
+            return
+        self.admitted_count += 1
+        self.fetched.value = data
+        self.main.lookup(address)
+        self.fetched.value = None
+
+    def lookup(self, address):
+        self._record(address)
+        if address in self.window:
+            self.window.move_to_end(address)
+            self.cache_hit_count += 1
+            self.cache_hit_flag = True
+            return self.window[address]
+        if self.main.contains(address):
+            self.cache_hit_count += 1
+            self.cache_hit_flag = True
+            return self.main.lookup(address)
+
+        data = super().lookup(address)
+        self.cache_hit_flag = False
+        if self.size <= 0:
+            return data
+        self.window[address] = data
+        if len(self.window) > self.window_size:
+            candidate, candidate_data = self.window.popitem(last=False)
+            if self.main.size > 0:
+                self._admit(candidate, candidate_data)
+            else:
+                self._write_back(candidate)
+        return data
+
+    def _set(self, address, value):
+        if address in self.window:
+            self.window[address] = value
+        else:
+            self.main._set(address, value)
+
+    def lookup_many(self, addresses):
+        return self._lookup_each(addresses)
@@ -0,0 +1,107 @@
+import os
+import sys
+import mmap
+import argparse
+from array import array
+
+# Readers for address traces, and a converter from the text format
+# (one integer per line, as read by harness.py) to a packed binary
+# format: a bare sequence of fixed-width little-endian unsigned ints,
+# 4 or 8 bytes each, with no header.
+
+CHUNK_BYTES = 1 << 20
+_CODES = {4: "I", 8: "Q"}
+
+
+def _code(width):
+    code = _CODES.get(width)
+    if code is None or array(code).itemsize != width:
+        raise ValueError(f"Unsupported trace width: {width}")
+    return code
+
+
+# Yield lists of addresses from a binary text stream, reading
+# CHUNK_BYTES at a time. A line split across two chunks is carried
+# over to the next one.
+def iter_text(stream, chunk_bytes=CHUNK_BYTES):
+    carry = b""
+    while True:
+        chunk = stream.read(chunk_bytes)
+        if not chunk:
+            break
+        lines = (carry + chunk).split(b"\n")
+        carry = lines.pop()
+        yield [int(line) for line in lines if line.strip()]
+    if carry.strip():
+        yield [int(carry)]
+
+
+# Yield arrays of addresses from a binary trace stream.
+def iter_binary(stream, width=4, chunk_bytes=CHUNK_BYTES):
+    code = _code(width)
+    chunk_bytes -= chunk_bytes % width
+    carry = b""
+    while True:
+        chunk = stream.read(chunk_bytes)
+        if not chunk:
+            break
+        chunk = carry + chunk
+        usable = len(chunk) - len(chunk) % width
+        carry = chunk[usable:]
+        addresses = array(code)
+        addresses.frombytes(chunk[:usable])
+        if sys.byteorder != "little":
+            addresses.byteswap()
+        yield addresses
+    if carry:
+        raise ValueError("Trailing partial entry in binary trace")
+
+
+# Map a binary trace file into memory and return it as a sequence of
+# ints without copying (except on big-endian hosts, where it has to be
+# byte swapped).
+def map_binary(path, width=4):
+    code = _code(width)
+    with open(path, "rb") as trace_file:
+        size = os.fstat(trace_file.fileno()).st_size
+        if size % width:
+            raise ValueError("Trailing partial entry in binary trace")
+        if size == 0:
+            return array(code)
+        mapped = mmap.mmap(trace_file.fileno(), 0, access=mmap.ACCESS_READ)
+    if sys.byteorder != "little":
+        addresses = array(code, mapped)
+        addresses.byteswap()
+        mapped.close()
+        return addresses
+    return memoryview(mapped).cast(code)
+
+
+# Convert a text trace to binary, chunk by chunk. Returns the number of
+# addresses written.
+def convert(source, destination, width=4):
+    code = _code(width)
+    count = 0
+    for addresses in iter_text(source):
+        packed = array(code, addresses)
+        if sys.byteorder != "little":
+            packed.byteswap()
+        destination.write(packed.tobytes())
+        count += len(packed)
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert a text trace to the packed binary format')
+    parser.add_argument('input', help='text trace, one address per line')
+    parser.add_argument('output', help='binary trace to write')
+    parser.add_argument('-w', '--width', type=int, default=4,
+                        choices=sorted(_CODES),
+                        help='bytes per address')
+    args = parser.parse_args()
+
+    with open(args.input, 'rb') as source, \
+            open(args.output, 'wb') as destination:
+        count = convert(source, destination, width=args.width)
+    print(f"{count} addresses written to {args.output}")
@@ -0,0 +1,108 @@
+import random
+import argparse
+import itertools
+
+# Synthetic address traces for benchmarking. Every generator takes the
+# number of accesses n and a seed, and returns a list of addresses in
+# range(universe) so the trace can be replayed against a Memory built
+# from utilities.sample_data(size=universe).
+
+
+# Every address equally likely.
+def uniform(n, universe, seed=0):
+    rng = random.Random(seed)
+    return [rng.randrange(universe) for _ in range(n)]
+
+
+# Address k is drawn with probability proportional to 1 / (k + 1) **
+# skew, so low addresses are hot. skew=0 is uniform; around 1 is
+# typical of web and storage workloads.
+def zipf(n, universe, skew=1.0, seed=0):
+    rng = random.Random(seed)
+    weights = [1.0 / (k + 1) ** skew for k in range(universe)]
+    cumulative = list(itertools.accumulate(weights))
+    return rng.choices(range(universe), cum_weights=cumulative, k=n)
+
+
+# One pass over consecutive addresses, wrapping if n > universe.
+def scan(n, universe, start=0, seed=0):
+    return [(start + i) % universe for i in range(n)]
+
+
+# Repeatedly walk the same loop_size addresses in order.
+def loop(n, universe, loop_size=None, seed=0):
+    if loop_size is None:
+        loop_size = max(universe // 10, 1)
+    return [i % loop_size for i in range(n)]
+
+
+# Uniform accesses over a window of working_set addresses that moves
+# along by shift every phase accesses.
+def shifting(n, universe, working_set=None, phase=1000, shift=None,
+             seed=0):
+    rng = random.Random(seed)
+    if working_set is None:
+        working_set = max(universe // 10, 1)
+    if shift is None:
+        shift = max(working_set // 2, 1)
+    trace = []
+    for i in range(n):
+        base = (i // phase) * shift
+        trace.append((base + rng.randrange(working_set)) % universe)
+    return trace
+
+
+# Interleaved walks like those over arrays and matrices. Each access
+# moves one of streams streams, picked at random, on by the next step
+# of its own cycle: 1, a constant stride of 2 to 16, or a cycle such
+# as +1, +1, +stride (a few elements of each row). A stream starts
+# again at a random address after run accesses, and a noise fraction
+# of the accesses are uniform instead.
+def streams(n, universe, streams=4, run=64, noise=0.1, seed=0):
+    rng = random.Random(seed)
+
+    def start():
+        stride = rng.randint(2, 16)
+        cycle = rng.choice([(1,), (stride,), (1, 1, stride)])
+        return [rng.randrange(universe), cycle, 0]
+
+    walks = [start() for _ in range(streams)]
+    trace = []
+    for _ in range(n):
+        if rng.random() < noise:
+            trace.append(rng.randrange(universe))
+            continue
+        walk = walks[rng.randrange(streams)]
+        address, cycle, step = walk
+        trace.append(address)
+        if step + 1 >= run:
+            walk[:] = start()
+        else:
+            walk[:] = [(address + cycle[step % len(cycle)]) % universe,
+                       cycle, step + 1]
+    return trace
+
+
+GENERATORS = {
+    "uniform": uniform,
+    "zipf": zipf,
+    "scan": scan,
+    "loop": loop,
+    "shifting": shifting,
+    "streams": streams,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('kind', choices=sorted(GENERATORS))
+    parser.add_argument('-n', '--length', type=int, default=1000,
+                        help='number of accesses')
+    parser.add_argument('-u', '--universe', type=int, default=100,
+                        help='number of distinct addresses')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for address in GENERATORS[args.kind](args.length, args.universe,
+                                         seed=args.seed):
+        print(address)
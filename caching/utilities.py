@@ -1,14 +1,173 @@
+import os
+import mmap
 import hashlib
+import operator
 import argparse
+import tempfile
+import multiprocessing
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Every value mangle returns is WIDTH ASCII characters (the start of an
+# MD5 hex digest), so a run of them can be held as one fixed-width
+# buffer: value n is bytes WIDTH * n up to WIDTH * (n + 1).
+WIDTH = 8
+
+# Values generated per call of mangle_range when generating in chunks.
+CHUNK = 1 << 16
+
+# The first values sample_data has generated, kept as one buffer so
+# later calls for the same data (or less) only slice it. At most
+# MEMO_SIZE values (8 MiB) are kept; values beyond it are hashed each
+# time.
+MEMO_SIZE = 1 << 20
+_memo = b""
 
 
 def mangle(n):
+    if 0 <= n < len(_memo) // WIDTH:
+        return _memo[WIDTH * n:WIDTH * (n + 1)].decode()
     string = str(n ^ 3).encode()
     return hashlib.md5(string).hexdigest()[:8]
 
 
 def sample_data(size=100):
-    return [mangle(n) for n in range(0, size)]
+    global _memo
+    memoized = min(size, MEMO_SIZE)
+    if len(_memo) < WIDTH * memoized:
+        _memo += mangle_range(len(_memo) // WIDTH, memoized)
+    text = _memo[:WIDTH * memoized].decode()
+    values = [text[i:i + WIDTH] for i in range(0, len(text), WIDTH)]
+    values.extend(mangle(n) for n in range(memoized, size))
+    return values
+
+
+# mangle(n) for every n in range(start, stop), as one ASCII bytes
+# buffer. The hex of the first four bytes of a digest is the start of
+# its hex digest, so the digests are joined and hexed in one go.
+def mangle_range(start, stop):
+    md5 = hashlib.md5
+    return b"".join([md5(b"%d" % (n ^ 3)).digest()[:4]
+                     for n in range(start, stop)]).hex().encode()
+
+
+def _mangle_chunk(bounds):
+    return mangle_range(*bounds)
+
+
+# mangle_range over range(size), chunk values at a time, in order.
+# With processes other than 1 the chunks are shared out over a pool of
+# that many worker processes (one per CPU if None).
+def iter_chunks(size, processes=1, chunk=CHUNK):
+    chunks = [(start, min(start + chunk, size))
+              for start in range(0, size, chunk)]
+    if processes == 1 or len(chunks) < 2:
+        for bounds in chunks:
+            yield _mangle_chunk(bounds)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap(_mangle_chunk, chunks)
+
+
+# The values of sample_data(size) as one bytes buffer, WIDTH bytes per
+# value, byte for byte the same as mangle(n).encode() for each n.
+def generate(size, processes=1, chunk=CHUNK):
+    return b"".join(iter_chunks(size, processes, chunk))
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("NumPy arrays of data need NumPy")
+
+
+# The same values as a NumPy array of WIDTH byte strings (dtype S8).
+def generate_array(size, processes=1, chunk=CHUNK):
+    _require_numpy()
+    return np.frombuffer(generate(size, processes, chunk),
+                         dtype=f"S{WIDTH}")
+
+
+# Read-only sequence of the strings held in a fixed-width buffer
+# (bytes, or a memoryview of a mapped file), for use as the data behind
+# a Memory in place of a list: 8 bytes per value rather than a string
+# object each.
+class FixedWidthData:
+    def __init__(self, buffer, width=WIDTH):
+        self.buffer = buffer
+        self.width = width
+        self.size = len(buffer) // width
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        index = operator.index(index)
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("FixedWidthData index out of range")
+        start = self.width * index
+        return bytes(self.buffer[start:start + self.width]).decode()
+
+    # The values as a NumPy array of byte strings, sharing the buffer.
+    def array(self):
+        _require_numpy()
+        return np.frombuffer(self.buffer, dtype=f"S{self.width}")
+
+
+# Datasets: generated data saved to a file that can be mapped straight
+# back into memory instead of being generated again.
+#
+#   header  int64[4]   magic, size, width, 0
+#   values  bytes[size * width]
+_DATASET_MAGIC = int.from_bytes(b"PYCDATA1", "little")
+_DATASET_HEADER = 32
+
+
+# Write the values of sample_data(size) to path as a dataset, a chunk
+# at a time. The file only appears at path once it is complete.
+def write_dataset(path, size, processes=1, chunk=CHUNK):
+    partial = f"{path}.{os.getpid()}.partial"
+    try:
+        with open(partial, "wb") as output:
+            array("q", [_DATASET_MAGIC, size, WIDTH, 0]).tofile(output)
+            for values in iter_chunks(size, processes, chunk):
+                output.write(values)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+# The data saved at path, mapped read-only; pages are read from the
+# file as they are first used.
+def open_dataset(path):
+    with open(path, "rb") as source:
+        mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    header = array("q", mapped[:_DATASET_HEADER])
+    magic, size, width = header[:3]
+    if magic != _DATASET_MAGIC or \
+            len(mapped) != _DATASET_HEADER + size * width:
+        mapped.close()
+        raise ValueError(f"{path} is not a complete dataset")
+    return FixedWidthData(memoryview(mapped)[_DATASET_HEADER:], width)
+
+
+# sample_data(size) as a mapped dataset, from its file in directory (a
+# folder in the system temporary directory by default), writing the
+# file first if it isn't there yet.
+def dataset(size, directory=None, processes=None):
+    if directory is None:
+        directory = os.path.join(tempfile.gettempdir(), "caching-data")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"mangle-{size}.dat")
+    if not os.path.exists(path):
+        write_dataset(path, size, processes)
+    return open_dataset(path)
 
 
 if __name__ == '__main__':
@@ -20,8 +179,20 @@ if __name__ == '__main__':
     parser.add_argument('-o', '--output',
                         help='output file',
                         default="data.txt")
+    parser.add_argument('-d', '--dataset', action='store_true',
+                        help='write a dataset that can be mapped back '
+                        'in, rather than text')
+    parser.add_argument('-j', '--processes', type=int, default=1,
+                        help='worker processes to generate with (0 for '
+                        'one per CPU)')
 
     args = parser.parse_args()
-    with open(args.output, 'w') as output_file:
-        for datum in sample_data(size=args.size):
-            output_file.write("{}\n".format(datum))
+    processes = args.processes or None
+    if args.dataset:
+        write_dataset(args.output, args.size, processes)
+    else:
+        with open(args.output, 'w') as output_file:
+            for values in iter_chunks(args.size, processes):
+                text = values.decode()
+                for i in range(0, len(text), WIDTH):
+                    output_file.write("{}\n".format(text[i:i + WIDTH]))